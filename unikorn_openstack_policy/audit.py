@@ -0,0 +1,278 @@
+# Copyright 2024 the Unikorn Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Opt-in audit log of decisions on the rules we override.
+
+The enforcement path only appends a record, with a snapshot of the
+credentials and a copy of the target, to a fixed size ring buffer.  A
+background thread drains it periodically, digesting credentials and targets
+and appending a batch of JSON lines to the log, each of:
+
+    [timestamp, namespace, rule, credentials digest, target digest, result]
+
+When decisions outpace flushing the oldest records are overwritten, and the
+number lost is logged as {"dropped": count}, so gaps are never silent.
+"""
+
+# pylint: disable=line-too-long
+
+import atexit
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+from unikorn_openstack_policy import credentials
+from unikorn_openstack_policy import instrumentation
+
+# When set, decisions on our rules are appended to this file.
+AUDIT_ENV = 'UNIKORN_POLICY_AUDIT'
+
+# How many records are buffered between flushes.
+AUDIT_CAPACITY_ENV = 'UNIKORN_POLICY_AUDIT_CAPACITY'
+
+# How often, in seconds, to flush the buffer.
+AUDIT_INTERVAL_ENV = 'UNIKORN_POLICY_AUDIT_INTERVAL'
+
+LOG = logging.getLogger(__name__)
+
+
+class Ring:
+    """
+    A fixed size buffer of records, overwriting the oldest when full.
+    """
+
+    def __init__(self, capacity):
+        self.lock = threading.Lock()
+        self.slots = [None] * capacity
+        self.capacity = capacity
+        # Absolute positions of the oldest unread and next written records.
+        self.head = 0
+        self.tail = 0
+        self.dropped = 0
+
+    def push(self, record):
+        """Append a record, overwriting the oldest if full"""
+
+        with self.lock:
+            if self.tail - self.head == self.capacity:
+                self.head += 1
+                self.dropped += 1
+
+            self.slots[self.tail % self.capacity] = record
+            self.tail += 1
+
+    def lose(self, count):
+        """Count records lost after being drained"""
+
+        with self.lock:
+            self.dropped += count
+
+    def drain(self):
+        """Remove and return every buffered record, oldest first, and the drops since the last drain"""
+
+        with self.lock:
+            records = [self.slots[index % self.capacity] for index in range(self.head, self.tail)]
+            dropped = self.dropped
+
+            for index in range(self.head, self.tail):
+                self.slots[index % self.capacity] = None
+
+            self.head = self.tail
+            self.dropped = 0
+
+        return records, dropped
+
+
+def _digest(value):
+    """Returns a short digest of a target, so decisions can be correlated without recording it"""
+
+    return hashlib.sha256(json.dumps(value, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+class Log:
+    """
+    Buffers decision records and appends them to a file in batches.
+    """
+
+    def __init__(self, path, capacity=65536):
+        self.path = path
+        self.ring = Ring(capacity)
+        # Flushes from the background thread and exit are serialized.
+        self.flush_lock = threading.Lock()
+        self.recorded = 0
+        self.dropped = 0
+
+    def record(self, namespace, rule, creds, target, result):
+        """Buffer a single decision, this is all the enforcement path pays for"""
+
+        # pylint: disable=too-many-arguments,too-many-positional-arguments
+
+        # Credentials are frozen now, bypassing the cached views of contexts,
+        # so they are logged as they were when the decision was made.
+        self.ring.push((time.time(), namespace, rule, credentials.snapshot(creds), dict(target), result))
+
+    def flush(self):
+        """
+        Append buffered records, and any drops, to the file.  If the file
+        can't be written the drained records are counted as dropped, so are
+        accounted for by the next flush, and the error is raised.
+        """
+
+        with self.flush_lock:
+            records, dropped = self.ring.drain()
+
+            if not records and not dropped:
+                return
+
+            lines = []
+
+            for timestamp, namespace, rule, signature, target, result in records:
+                try:
+                    lines.append(json.dumps([timestamp, namespace, rule, credentials.digest(signature), _digest(target), result]))
+                except (TypeError, ValueError):
+                    # Targets that can't be digested, e.g. with mixed key
+                    # types, are lost alone.
+                    dropped += 1
+
+            recorded = len(lines)
+
+            if dropped:
+                lines.insert(0, json.dumps({'dropped': dropped}))
+
+            try:
+                with open(self.path, 'a', encoding='utf-8') as out:
+                    out.write('\n'.join(lines) + '\n')
+            except Exception:
+                self.ring.lose(recorded + dropped)
+                raise
+
+            self.recorded += recorded
+            self.dropped += dropped
+
+    def stats(self):
+        """Returns the records written and dropped so far"""
+
+        return {'recorded': self.recorded, 'dropped': self.dropped}
+
+    def start(self, interval):
+        """Flush periodically from a background thread"""
+
+        def flush():
+            while True:
+                time.sleep(interval)
+
+                # Failures are retried next interval, never end flushing.
+                try:
+                    self.flush()
+                except Exception:  # pylint: disable=broad-exception-caught
+                    LOG.exception('failed to flush audit log %s', self.path)
+
+        threading.Thread(target=flush, daemon=True).start()
+
+
+# The global log, None when auditing is disabled.
+_log = None  # pylint: disable=invalid-name
+
+
+def enable(path, capacity=65536, interval=1.0):
+    """
+    Enable auditing of enforcers created from now on, flushing to a file
+    periodically and on exit.
+    """
+
+    global _log  # pylint: disable=global-statement
+
+    if _log is not None:
+        return _log
+
+    _log = Log(path, capacity)
+    _log.start(interval)
+
+    atexit.register(_log.flush)
+
+    return _log
+
+
+def log():
+    """Returns the global log, or None if disabled"""
+
+    return _log
+
+
+def observer(namespace, rules, audit_log=None):
+    """
+    Returns an observer recording decisions on the named rules to the given
+    log, or the global one, if enabled, otherwise None.
+    """
+
+    target_log = audit_log or _log
+
+    if target_log is None:
+        return None
+
+    names = frozenset(rules)
+    record = target_log.record
+
+    def observe(decision):
+        if decision.rule in names:
+            record(namespace, decision.rule, decision.creds, decision.target, decision.result)
+
+    return observe
+
+
+def benchmark(enforcer, rule, target, creds, decisions=100000):
+    """
+    Returns the mean cost, in microseconds, of a decision unaudited and
+    audited, of buffering its record alone, which is the overhead on the
+    enforcement path, and of flushing it in the background.
+    """
+
+    plain = enforcer.enforce
+
+    benchmark_log = Log(os.devnull, decisions)
+    audited = instrumentation.instrument(enforcer, [observer('benchmark', [rule], benchmark_log)]).enforce
+
+    def mean(function, *args):
+        start = time.perf_counter()
+        for _ in range(decisions):
+            function(*args)
+        return (time.perf_counter() - start) / decisions * 1e6
+
+    try:
+        report = {
+            'decisions': decisions,
+            'plain_us': mean(plain, rule, target, creds),
+            'audited_us': mean(audited, rule, target, creds),
+        }
+    finally:
+        enforcer.enforce = plain
+
+    # The audited decisions are flushed before the record cost is measured,
+    # so it never overwrites.
+    start = time.perf_counter()
+    benchmark_log.flush()
+    report['flush_us'] = (time.perf_counter() - start) / decisions * 1e6
+
+    report['record_us'] = mean(benchmark_log.record, 'benchmark', rule, creds, target, True)
+
+    return report
+
+if os.environ.get(AUDIT_ENV):
+    enable(os.environ[AUDIT_ENV], int(os.environ.get(AUDIT_CAPACITY_ENV, '65536')), float(os.environ.get(AUDIT_INTERVAL_ENV, '1')))
+
+# vi: ts=4 et:
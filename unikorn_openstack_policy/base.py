@@ -22,6 +22,7 @@ import itertools
 import re
 
 from oslo_policy import policy
+from unikorn_openstack_policy import profiling
 
 rules = [
     # The domain manager has the role 'manager', as defined by
@@ -54,6 +55,7 @@ class MissingRuleException(Exception):
     """
 
 
+@profiling.traced
 def _find_rule(name, rule_list):
     """Return a named rule if it exists or None"""
 
@@ -74,12 +76,17 @@ def _wrap_check_str(tokens):
     return tokens
 
 
+@profiling.traced
 def _recurse_build_check_str(check_str, rule_list):
     """
     Given a check string, this does macro expansion of rule:roo strings
     removing and inlining them.
     """
 
+    # Oslo treats an empty check string as always true.
+    if not check_str.strip():
+        return ['@']
+
     out = []
 
     for token in re.split(r'\s+', check_str):
@@ -112,6 +119,7 @@ def _recurse_build_check_str(check_str, rule_list):
     return out
 
 
+@profiling.traced
 def _build_check_str(check_str, rule_list):
     """
     Given a check string, this does macro expansion of rule:roo strings
@@ -124,27 +132,39 @@ def _build_check_str(check_str, rule_list):
     return check_str
 
 
-def inherit_rules(mine, theirs):
+def _expand_rules(mine, theirs):
     """
-    Given my rules, add any from openstack so we can use that as a source of truth.
+    Lazily expand each of my rules against the matching one from openstack,
+    skipping any that don't exist.
     """
 
-    expanded = []
-
     for rule in mine:
-        try:
-            inherited_rule = _find_rule(rule.name, theirs)
+        expanded = None
+
+        with profiling.span(profiling.RULE_PREFIX + rule.name):
+            try:
+                inherited_rule = _find_rule(rule.name, theirs)
+
+                check_str = _build_check_str(inherited_rule.check_str, theirs)
 
-            check_str = _build_check_str(inherited_rule.check_str, theirs)
+                expanded = policy.RuleDefault(
+                    name=rule.name,
+                    check_str=f'{rule.check_str} or ({check_str})',
+                    description=rule.description,
+                )
+            except MissingRuleException:
+                pass
 
-            expanded.append(policy.RuleDefault(
-                name=rule.name,
-                check_str=f'{rule.check_str} or ({check_str})',
-                description=rule.description,
-            ))
-        except MissingRuleException:
-            pass
+        if expanded is not None:
+            yield expanded
+
+
+def inherit_rules(mine, theirs):
+    """
+    Given my rules, add any from openstack so we can use that as a source of truth.
+    Expansion is performed as the result is consumed.
+    """
 
-    return itertools.chain(rules, expanded)
+    return itertools.chain(rules, _expand_rules(mine, theirs))
 
 # vi: ts=4 et:
@@ -16,41 +16,36 @@
 Defines Oslo Policy Rules.
 """
 
-# pylint: disable=line-too-long
+# pylint: disable=line-too-long,duplicate-code
 
-from cinder import policies
-from cinder.policies import quotas
-from oslo_config import cfg
 from oslo_policy import policy
-from unikorn_openstack_policy import base
+from unikorn_openstack_policy import registry
+
+# The oslo.policy namespace these rules are exposed as.
+NAMESPACE = 'unikorn_openstack_policy_blockstorage'
+
+# The distribution the upstream rules are inherited from.
+UPSTREAM = 'cinder'
 
 rules = [
     # The domain manager needs to be able to alter the default quotas
     # or it won't we able to fulfill any cluster creation requests.
     policy.RuleDefault(
-        name=quotas.UPDATE_POLICY,
+        name='volume_extension:quotas:update',
         check_str='rule:is_project_manager',
         description='Update the block storage quotas',
     )
 ]
 
 
-def list_rules():
-    """Implements the "oslo.policy.policies" entry point"""
-
-    # For every defined rule, look for a corresponding one sourced directly
-    # from nova, this means we can augment the exact rule defined for a
-    # specific version of nova,
-    return base.inherit_rules(rules, list(policies.list_rules()))
-
-
-def get_enforcer():
-    """Implements the "oslo.policy.enforcer" entry point"""
-
-    enforcer = policy.Enforcer(conf=cfg.CONF)
-    enforcer.register_defaults(list_rules())
+# Inherits the rules from this upstream module, imported on first use.
+SERVICE = registry.Service(NAMESPACE, UPSTREAM, 'cinder.policies', rules)
 
-    return enforcer
+list_upstream_rules = SERVICE.list_upstream_rules
+expand_rules = SERVICE.expand_rules
+list_rules = SERVICE.list_rules
+get_enforcer = SERVICE.get_enforcer
+get_compiled_enforcer = SERVICE.get_compiled_enforcer
 
 
 # vi: ts=4 et:
@@ -0,0 +1,212 @@
+# Copyright 2024 the Unikorn Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Bulk authorization of a credential set across many projects.
+
+Reconciling a managed domain checks the same rules, for the same
+credentials, against every project in it.  Each rule is partially evaluated
+once for the credentials: rule references are inlined, and every check that
+substitutes nothing from the target, such as a role, is decided up front,
+leaving only a residual, typically project_id:%(project_id)s, or a constant.
+Only residuals are then evaluated per project, and results are streamed so
+project lists of any size can be swept.
+
+Decisions are made directly against an enforcer's loaded rules, so bypass
+any instrumentation of its enforce method, other than auditing, which is
+recorded when the namespace is given.
+"""
+
+# pylint: disable=line-too-long
+
+from oslo_policy import _checks
+from unikorn_openstack_policy import audit
+from unikorn_openstack_policy import credentials
+from unikorn_openstack_policy import registry
+
+
+def _junction(enforcer, check, creds, resolving):
+    """Partially evaluate an and or an or"""
+
+    # An and is decided by any false child, an or by any true one.
+    decisive = isinstance(check, _checks.OrCheck)
+    remainder = []
+
+    for rule in check.rules:
+        partial = _residual(enforcer, rule, creds, resolving)
+
+        if partial is decisive:
+            return decisive
+
+        # The other constant has no effect on the result.
+        if not isinstance(partial, bool):
+            remainder.append(partial)
+
+    if not remainder:
+        return not decisive
+
+    return remainder[0] if len(remainder) == 1 else type(check)(remainder)
+
+
+def _negation(enforcer, check, creds, resolving):
+    """Partially evaluate a not"""
+
+    partial = _residual(enforcer, check.rule, creds, resolving)
+
+    if isinstance(partial, bool):
+        return not partial
+
+    return _checks.NotCheck(partial)
+
+
+def _reference(enforcer, check, creds, resolving):
+    """Partially evaluate a rule reference"""
+
+    # Cycles are left for Oslo.
+    if check.match in resolving:
+        return check
+
+    # Missing rules fall back to the default rule, or fail closed, as
+    # RuleCheck does.
+    try:
+        rule = enforcer.rules[check.match]
+    except KeyError:
+        return False
+
+    return _residual(enforcer, rule, creds, resolving | {check.match})
+
+
+def _residual(enforcer, check, creds, resolving):
+    """
+    Returns a check partially evaluated for the credentials, either a
+    constant or the part that depends on the target.
+    """
+
+    if isinstance(check, (_checks.TrueCheck, _checks.FalseCheck)):
+        return isinstance(check, _checks.TrueCheck)
+
+    if isinstance(check, (_checks.AndCheck, _checks.OrCheck)):
+        return _junction(enforcer, check, creds, resolving)
+
+    if isinstance(check, _checks.NotCheck):
+        return _negation(enforcer, check, creds, resolving)
+
+    if isinstance(check, _checks.RuleCheck):
+        return _reference(enforcer, check, creds, resolving)
+
+    # Checks that substitute nothing from the target are decided now.
+    if isinstance(check, (_checks.RoleCheck, _checks.GenericCheck)) and '%(' not in check.match:
+        return bool(check({}, creds, enforcer))
+
+    return check
+
+
+def residual(enforcer, rule, creds):
+    """
+    Returns a named rule partially evaluated for the credentials, either a
+    constant or a check of the target.  The enforcer's rules must be loaded.
+    """
+
+    creds = credentials.view(creds)
+
+    # Resolved and scoped as Enforcer.enforce does, scope only depends on
+    # the credentials so a mismatch always denies.
+    if not enforcer.rules:
+        return False
+
+    try:
+        check = enforcer.rules[rule]
+    except KeyError:
+        return False
+
+    registered = enforcer.registered_rules.get(rule)
+    if registered and not enforcer._enforce_scope(creds, registered, do_raise=False):  # pylint: disable=protected-access
+        return False
+
+    return _residual(enforcer, check, creds, frozenset([rule]))
+
+
+def _audited(namespace, rules):
+    """
+    Returns the audit log and the rules whose decisions it records, as the
+    service's audited enforcer would, or None if there is nothing to record.
+    """
+
+    audit_log = audit.log()
+
+    if audit_log is None or namespace is None:
+        return None, frozenset()
+
+    return audit_log, frozenset(rule.name for rule in registry.load(namespace).rules) & frozenset(rules)
+
+
+def _split(enforcer, rules, creds):
+    """
+    Returns the rules decided for the credentials, and the residual checks of
+    the rest.
+    """
+
+    residuals = {rule: residual(enforcer, rule, creds) for rule in rules}
+
+    constant = {rule: value for rule, value in residuals.items() if isinstance(value, bool)}
+    remaining = [(rule, value) for rule, value in residuals.items() if not isinstance(value, bool)]
+
+    return constant, remaining
+
+
+def sweep(enforcer, rules, creds, project_ids, target=None, namespace=None):
+    """
+    Yields each project ID with a dictionary of whether each rule is allowed
+    for the credentials in that project, consuming project IDs lazily.  The
+    target for each project is the optional base target with the project ID.
+    If auditing is enabled, decisions on the rules a namespace overrides are
+    recorded, as its enforcer would.
+    """
+
+    # pylint: disable=too-many-arguments,too-many-positional-arguments
+
+    enforcer.load_rules()
+
+    creds = credentials.view(creds)
+    constant, remaining = _split(enforcer, rules, creds)
+
+    audit_log, audited = _audited(namespace, rules)
+
+    for project_id in project_ids:
+        if not remaining and not audited:
+            yield project_id, dict(constant)
+            continue
+
+        project_target = {**(target or {}), 'project_id': project_id}
+
+        results = dict(constant)
+
+        for rule, check in remaining:
+            results[rule] = bool(check(project_target, creds, enforcer, rule))
+
+        for rule in audited:
+            audit_log.record(namespace, rule, creds, project_target, results[rule])
+
+        yield project_id, results
+
+
+def authorize(enforcer, rule, creds, project_ids, target=None, namespace=None):
+    """Yields each project ID with whether a single rule is allowed in it"""
+
+    # pylint: disable=too-many-arguments,too-many-positional-arguments
+
+    for project_id, results in sweep(enforcer, [rule], creds, project_ids, target, namespace):
+        yield project_id, results[rule]
+
+# vi: ts=4 et:
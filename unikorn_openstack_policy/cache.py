@@ -0,0 +1,161 @@
+# Copyright 2024 the Unikorn Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+On disk cache of expanded and compiled rules.
+
+Entries are plain JSON, so loading one never executes anything, and are
+keyed on the upstream distribution's version and a hash of our own rules, so
+any change to either is a cache miss.
+"""
+
+# pylint: disable=line-too-long
+
+import hashlib
+import importlib.metadata
+import json
+import os
+
+from oslo_policy import policy
+from unikorn_openstack_policy import base
+from unikorn_openstack_policy import compiler
+from unikorn_openstack_policy import files
+from unikorn_openstack_policy import prune
+from unikorn_openstack_policy import reorder
+
+# When set, expanded and compiled rules are cached in this directory.
+CACHE_DIR_ENV = 'UNIKORN_POLICY_CACHE_DIR'
+
+# Bump this when the cache or IR format changes.
+FORMAT_VERSION = 1
+
+
+def _version(distribution):
+    """Return the version of an installed distribution, or None"""
+
+    try:
+        return importlib.metadata.version(distribution)
+    except importlib.metadata.PackageNotFoundError:
+        return None
+
+
+def key(namespace, upstream, mine):
+    """
+    Returns the cache key for our rules expanded against an upstream
+    distribution, or None if the upstream version cannot be determined.
+    """
+
+    upstream_version = _version(upstream)
+    if upstream_version is None:
+        return None
+
+    data = {
+        'format': FORMAT_VERSION,
+        'package': _version('python-unikorn-openstack-policy'),
+        'upstream': [upstream, upstream_version],
+        'rules': [[rule.name, rule.check_str, rule.description] for rule in [*base.rules, *mine]],
+        'ordering': reorder.load(namespace),
+        'profile': os.environ.get(prune.PROFILE_ENV),
+    }
+
+    return hashlib.sha256(json.dumps(data, sort_keys=True).encode()).hexdigest()
+
+
+def _path(namespace):
+    """Returns the cache file for a namespace, or None if caching is disabled"""
+
+    directory = os.environ.get(CACHE_DIR_ENV)
+    if not directory:
+        return None
+
+    return os.path.join(directory, namespace + '.json')
+
+
+def load(namespace, cache_key):
+    """Returns the cached rule definitions for a namespace, or None"""
+
+    path = _path(namespace)
+    if path is None or cache_key is None:
+        return None
+
+    try:
+        with open(path, encoding='utf-8') as data:
+            entry = json.load(data)
+    except (OSError, ValueError):
+        return None
+
+    if not isinstance(entry, dict) or entry.get('format') != FORMAT_VERSION or entry.get('key') != cache_key:
+        return None
+
+    return entry['rules']
+
+
+def store(namespace, cache_key, rules):
+    """
+    Atomically store rule definitions for a namespace.  The cache is only an
+    optimization, so failures are ignored and the next load simply misses.
+    """
+
+    path = _path(namespace)
+    if path is None or cache_key is None:
+        return
+
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        with files.atomic_write(path) as out:
+            json.dump({'format': FORMAT_VERSION, 'key': cache_key, 'rules': rules}, out)
+    except OSError:
+        pass
+
+
+def _definitions(namespace, upstream, mine, build):
+    """Returns cached rule definitions, building and storing them on a miss"""
+
+    cache_key = key(namespace, upstream, mine)
+
+    definitions = load(namespace, cache_key)
+    if definitions is None:
+        definitions = {rule.name: compiler.definition(rule) for rule in build()}
+        store(namespace, cache_key, definitions)
+
+    return definitions
+
+
+def list_rules(namespace, upstream, mine, build):
+    """
+    Returns our rules expanded against the upstream distribution, from the
+    cache if possible.  The build function performs the expansion on a miss.
+    """
+
+    if _path(namespace) is None:
+        return build()
+
+    definitions = _definitions(namespace, upstream, mine, build)
+
+    return [policy.RuleDefault(name=name, check_str=rule['check_str'], description=rule['description'], scope_types=rule['scope_types']) for name, rule in definitions.items()]
+
+
+def get_compiled_enforcer(namespace, upstream, mine, build):
+    """
+    Returns a compiled enforcer for our rules expanded against the upstream
+    distribution.  On a cache hit, this avoids both expansion and parsing.
+    """
+
+    if _path(namespace) is None:
+        return compiler.CompiledEnforcer.from_rules(build())
+
+    return compiler.CompiledEnforcer(_definitions(namespace, upstream, mine, build))
+
+# vi: ts=4 et:
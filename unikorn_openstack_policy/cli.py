@@ -0,0 +1,364 @@
+# Copyright 2024 the Unikorn Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Command line tooling.
+"""
+
+# pylint: disable=line-too-long
+
+import argparse
+import json
+import os
+import pathlib
+import signal
+import sys
+
+from oslo_config import cfg
+from unikorn_openstack_policy import audit
+from unikorn_openstack_policy import base
+from unikorn_openstack_policy import config
+from unikorn_openstack_policy import fuzz
+from unikorn_openstack_policy import generator
+from unikorn_openstack_policy import personas
+from unikorn_openstack_policy import minimal
+from unikorn_openstack_policy import profiling
+from unikorn_openstack_policy import prune
+from unikorn_openstack_policy import registry
+from unikorn_openstack_policy import reorder
+from unikorn_openstack_policy import sidecar
+from unikorn_openstack_policy import snapshots
+from unikorn_openstack_policy import warmup
+
+
+def _warmup(args):
+    """Warm every requested namespace and optionally signal readiness"""
+
+    timings = warmup.warm_up(args.namespace or None)
+
+    if args.json:
+        print(json.dumps(timings, indent=2, sort_keys=True))
+    else:
+        for name, phases in timings.items():
+            print(name + ' ' + ' '.join(f'{phase}={value:.3f}s' for phase, value in phases.items()))
+
+    if args.ready_file:
+        pathlib.Path(args.ready_file).touch()
+
+
+def _profile(args):
+    """Profile loading the rules for a single namespace"""
+
+    profile = profiling.start()
+
+    try:
+        with profiling.span(profiling.NAMESPACE_PREFIX + args.namespace):
+            with profiling.span('import'):
+                list_rules = registry.load(args.namespace).list_rules
+
+            with profiling.span('list_rules'):
+                list(list_rules())
+    finally:
+        profiling.stop()
+
+    if args.flamegraph:
+        with open(args.flamegraph, 'w', encoding='utf-8') as out:
+            out.write(profile.collapsed())
+
+    summary = {
+        'namespaces': profile.namespaces(),
+        'rules': {f'{namespace} {rule}': seconds for (namespace, rule), seconds in profile.rules().items()},
+        'functions': {name: {'calls': calls, 'seconds': seconds} for name, (calls, seconds) in profile.functions().items()},
+    }
+
+    print(json.dumps(summary, indent=2, sort_keys=True))
+
+
+def _minimal_rules(module):
+    """Returns the minimal rules for a namespace, verified against the full set"""
+
+    theirs = module.list_upstream_rules()
+    full = list(module.list_rules())
+    rules = minimal.minimal_rules(module.rules, theirs)
+
+    mismatches = minimal.verify(module.rules, theirs, full, rules)
+    if mismatches:
+        for rule, persona, target in mismatches:
+            print(f'minimal rule {rule} differs for {persona} against {target}', file=sys.stderr)
+
+        sys.exit(1)
+
+    return rules
+
+
+def _generate(args):
+    """Stream the rules for a namespace to a policy file"""
+
+    module = registry.load(args.namespace)
+
+    if args.minimal:
+        rules = _minimal_rules(module)
+    else:
+        rules = module.list_rules()
+
+    if not args.output_file:
+        generator.write(rules, sys.stdout, args.format, not args.no_descriptions)
+        return
+
+    with open(args.output_file, 'w', encoding='utf-8') as out:
+        generator.write(rules, out, args.format, not args.no_descriptions)
+
+
+def _prune(args):
+    """Report what would be pruned from a namespace's rules for a profile"""
+
+    module = registry.load(args.namespace)
+
+    report = {}
+
+    for _ in prune.prune_rules(base.inherit_rules(module.rules, module.list_upstream_rules()), args.profile, report):
+        pass
+
+    print(json.dumps(report, indent=2, sort_keys=True))
+
+
+def _reorder(args):
+    """Derive a persisted branch ordering from recorded metrics"""
+
+    with open(args.metrics, encoding='utf-8') as data:
+        ordering = reorder.ordering_from_metrics(json.load(data))
+
+    with open(args.output_file, 'w', encoding='utf-8') as out:
+        json.dump(ordering, out, indent=2, sort_keys=True)
+        out.write('\n')
+
+
+def _fuzz(args):
+    """Fuzz rule expansion, reporting shrunk failing cases"""
+
+    results = fuzz.fuzz(range(args.start, args.start + args.seeds), args.workers)
+
+    report = [
+        {
+            'seed': case['seed'],
+            'rules': {name: fuzz.render(node) for name, node in case['rules'].items()},
+            'checks': case['checks'],
+            'failures': [description for _, _, description in failures],
+        }
+        for case, failures in results
+    ]
+
+    print(json.dumps(report, indent=2))
+
+    if report:
+        sys.exit(1)
+
+
+def _snapshot_capture(args):
+    """Snapshot the installed upstream rules for a release"""
+
+    for name in args.namespace or registry.namespaces():
+        print(snapshots.capture(args.store, args.release, registry.load(name)))
+
+
+def _snapshot_build(args):
+    """Generate policy files for every stored release in parallel"""
+
+    modules = {name: module_name for name, module_name in registry.SERVICES.items() if not args.namespace or name in args.namespace}
+
+    for path in snapshots.build(args.store, args.output_dir, modules, args.release, args.format, args.workers):
+        print(path)
+
+
+def _serve(args):
+    """Serve decisions from warm enforcers until terminated"""
+
+    enforcers = sidecar.load_enforcers(args.namespace or None, args.compiled)
+
+    # Exit cleanly, removing the socket, when asked to stop.
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+
+    with sidecar.Server(args.socket, enforcers, args.socket_mode) as server:
+        if args.ready_file:
+            pathlib.Path(args.ready_file).touch()
+
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+
+def _loadtest(args):
+    """Load test a running sidecar with every persona against every rule"""
+
+    with sidecar.Client(args.socket) as client:
+        rules = client.rules()
+
+    decisions = [{'namespace': namespace, 'rule': rule} for namespace, names in sorted(rules.items()) for rule in names]
+    if not decisions:
+        sys.exit('sidecar has no rules')
+
+    persona_targets = personas.targets('d1', 'p1')
+
+    batches = [
+        {
+            'credentials': dict(context.to_policy_values().items()),
+            'target': target,
+            'decisions': decisions[offset:offset + args.batch],
+        }
+        for context in personas.contexts('d1', 'p1').values()
+        for target in persona_targets.values()
+        for offset in range(0, len(decisions), args.batch)
+    ]
+
+    report = sidecar.load_test(args.socket, batches, args.connections, args.requests, args.pipeline)
+
+    print(json.dumps(report, indent=2, sort_keys=True))
+
+
+def _benchmark_config(args):
+    """Benchmark building enforcers against global and isolated configuration"""
+
+    rules = list(registry.load(args.namespace).list_rules())
+
+    print(json.dumps(config.benchmark(rules, args.threads, args.builds), indent=2, sort_keys=True))
+
+
+def _benchmark_audit(args):
+    """Benchmark the per decision cost of auditing a namespace's first rule"""
+
+    module = registry.load(args.namespace)
+
+    enforcer = module.get_enforcer(config.isolated())
+    enforcer.load_rules()
+
+    context = personas.contexts('d1', 'p1')['project_manager']
+    target = personas.targets('d1', 'p1')['target']
+
+    print(json.dumps(audit.benchmark(enforcer, module.rules[0].name, target, context, args.decisions), indent=2, sort_keys=True))
+
+
+def _add_benchmark_parsers(subparsers):
+    """Add the benchmark subcommand and its own subcommands"""
+
+    benchmark_parser = subparsers.add_parser('benchmark', help='Benchmark enforcement internals')
+    benchmark_subparsers = benchmark_parser.add_subparsers(dest='benchmark_command', required=True)
+
+    config_parser = benchmark_subparsers.add_parser('config', help='Compare concurrent enforcer construction against global and isolated configuration')
+    config_parser.add_argument('--namespace', required=True, choices=registry.namespaces(), help='Namespace whose rules to build')
+    config_parser.add_argument('--threads', type=int, default=4, help='Threads to build from')
+    config_parser.add_argument('--builds', type=int, default=200, help='Enforcers to build per configuration')
+    config_parser.set_defaults(func=_benchmark_config)
+
+    audit_parser = benchmark_subparsers.add_parser('audit', help='Measure the per decision cost of auditing')
+    audit_parser.add_argument('--namespace', required=True, choices=registry.namespaces(), help='Namespace whose first rule to decide')
+    audit_parser.add_argument('--decisions', type=int, default=100000, help='Decisions to make, audited and not')
+    audit_parser.set_defaults(func=_benchmark_audit)
+
+
+def _add_snapshot_parsers(subparsers):
+    """Add the snapshot subcommand and its own subcommands"""
+
+    snapshot_parser = subparsers.add_parser('snapshot', help='Manage snapshots of upstream rules for multiple releases')
+    snapshot_subparsers = snapshot_parser.add_subparsers(dest='snapshot_command', required=True)
+
+    capture_parser = snapshot_subparsers.add_parser('capture', help='Snapshot the installed upstream rules as a release')
+    capture_parser.add_argument('--store', default=os.environ.get(snapshots.SNAPSHOTS_ENV), required=not os.environ.get(snapshots.SNAPSHOTS_ENV), help='Snapshot store directory')
+    capture_parser.add_argument('--release', required=True, help='Release name, e.g. 2024.1')
+    capture_parser.add_argument('--namespace', action='append', choices=registry.namespaces(), help='Namespace whose upstream to capture, may be repeated, defaults to all')
+    capture_parser.set_defaults(func=_snapshot_capture)
+
+    build_parser = snapshot_subparsers.add_parser('build', help='Generate policy files for stored releases, without the upstream services installed')
+    build_parser.add_argument('--store', default=os.environ.get(snapshots.SNAPSHOTS_ENV), required=not os.environ.get(snapshots.SNAPSHOTS_ENV), help='Snapshot store directory')
+    build_parser.add_argument('--output-dir', required=True, help='Directory to write <release>/<namespace> policy files to')
+    build_parser.add_argument('--release', action='append', help='Release to build, may be repeated, defaults to all')
+    build_parser.add_argument('--namespace', action='append', choices=registry.namespaces(), help='Namespace to build, may be repeated, defaults to all')
+    build_parser.add_argument('--format', default='yaml', choices=generator.FORMATS, help='Output format')
+    build_parser.add_argument('--workers', type=int, help='Processes to build across, defaults to all cores')
+    build_parser.set_defaults(func=_snapshot_build)
+
+
+def _add_sidecar_parsers(subparsers):
+    """Add the sidecar's serve and loadtest subcommands"""
+
+    serve_parser = subparsers.add_parser('serve', help='Serve decisions from warm enforcers over a Unix socket')
+    serve_parser.add_argument('--socket', required=True, help='Unix socket path to listen on')
+    serve_parser.add_argument('--socket-mode', type=lambda value: int(value, 8), default=0o600, help='Octal permissions of the socket, defaults to 600')
+    serve_parser.add_argument('--namespace', action='append', choices=registry.namespaces(), help='Namespace to serve, may be repeated, defaults to all')
+    serve_parser.add_argument('--compiled', action='store_true', help='Use compiled enforcers, which ignore policy files')
+    serve_parser.add_argument('--ready-file', help='File to create once listening, for readiness probes')
+    serve_parser.set_defaults(func=_serve)
+
+    loadtest_parser = subparsers.add_parser('loadtest', help='Load test a running sidecar')
+    loadtest_parser.add_argument('--socket', required=True, help='Unix socket path of the sidecar')
+    loadtest_parser.add_argument('--connections', type=int, default=4, help='Concurrent connections')
+    loadtest_parser.add_argument('--requests', type=int, default=1000, help='Requests per connection')
+    loadtest_parser.add_argument('--batch', type=int, default=16, help='Decisions per request')
+    loadtest_parser.add_argument('--pipeline', type=int, default=8, help='Requests in flight per connection')
+    loadtest_parser.set_defaults(func=_loadtest)
+
+
+def main(argv=None):
+    """Implements the "unikorn-openstack-policy" command"""
+
+    parser = argparse.ArgumentParser(prog='unikorn-openstack-policy')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    warmup_parser = subparsers.add_parser('warmup', help='Pre-build and load enforcers')
+    warmup_parser.add_argument('--namespace', action='append', choices=registry.namespaces(), help='Namespace to warm, may be repeated, defaults to all')
+    warmup_parser.add_argument('--json', action='store_true', help='Emit timings as JSON')
+    warmup_parser.add_argument('--ready-file', help='File to create once warm, for readiness probes')
+    warmup_parser.set_defaults(func=_warmup)
+
+    profile_parser = subparsers.add_parser('profile', help='Profile loading the rules for a namespace')
+    profile_parser.add_argument('--namespace', required=True, choices=registry.namespaces(), help='Namespace to profile')
+    profile_parser.add_argument('--flamegraph', help='File to write collapsed stacks to, for flame graph generation')
+    profile_parser.set_defaults(func=_profile)
+
+    generate_parser = subparsers.add_parser('generate', help='Generate a policy file for a namespace')
+    generate_parser.add_argument('--namespace', required=True, choices=registry.namespaces(), help='Namespace to generate')
+    generate_parser.add_argument('--format', default='yaml', choices=generator.FORMATS, help='Output format')
+    generate_parser.add_argument('--output-file', help='File to write to, defaults to standard output')
+    generate_parser.add_argument('--minimal', action='store_true', help='Only emit overridden rules and the helpers they need, verified against the full policy')
+    generate_parser.add_argument('--no-descriptions', action='store_true', help='Omit rule descriptions from YAML output')
+    generate_parser.set_defaults(func=_generate)
+
+    prune_parser = subparsers.add_parser('prune', help='Report dead and redundant branches removed for a deployment profile')
+    prune_parser.add_argument('--namespace', required=True, choices=registry.namespaces(), help='Namespace to analyze')
+    prune_parser.add_argument('--profile', required=True, choices=sorted(prune.PROFILES), help='Deployment profile')
+    prune_parser.set_defaults(func=_prune)
+
+    reorder_parser = subparsers.add_parser('reorder', help='Derive a branch ordering from JSON metrics with branch statistics')
+    reorder_parser.add_argument('--metrics', required=True, help='JSON metrics file to read')
+    reorder_parser.add_argument('--output-file', required=True, help='Ordering file to write')
+    reorder_parser.set_defaults(func=_reorder)
+
+    fuzz_parser = subparsers.add_parser('fuzz', help='Check rule expansion is equivalent to rule resolution for random rules')
+    fuzz_parser.add_argument('--seeds', type=int, default=10000, help='Number of random cases')
+    fuzz_parser.add_argument('--start', type=int, default=0, help='First seed, so runs can be split or reproduced')
+    fuzz_parser.add_argument('--workers', type=int, help='Processes to run cases across, defaults to all cores')
+    fuzz_parser.set_defaults(func=_fuzz)
+
+    _add_snapshot_parsers(subparsers)
+    _add_benchmark_parsers(subparsers)
+    _add_sidecar_parsers(subparsers)
+
+    args = parser.parse_args(argv)
+
+    # Setup the configuration, which is required for policy file loading...
+    cfg.CONF(args=[])
+
+    args.func(args)
+
+# vi: ts=4 et:
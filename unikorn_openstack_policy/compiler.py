@@ -0,0 +1,571 @@
+# Copyright 2024 the Unikorn Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Compiles Oslo Policy Rules into closures.
+
+Parsed check trees are first lowered into a JSON serializable intermediate
+representation (IR) of nested lists, then compiled into closures that avoid
+the per node overhead of the Oslo check classes.  The IR can be stored and
+reloaded without parsing a single check string.
+
+Compiled nodes live in a content addressed pool shared by every enforcer in
+the process, so helpers common to all namespaces are compiled and stored
+once, and their results are shared by all enforcers within a request.
+"""
+
+# pylint: disable=line-too-long
+
+import ast
+import hashlib
+import json
+import re
+import threading
+
+from oslo_policy import _checks
+from oslo_policy import _parser
+from oslo_policy import policy
+from unikorn_openstack_policy import credentials
+
+# IR node types.
+TRUE = '@'
+FALSE = '!'
+AND = 'and'
+OR = 'or'
+NOT = 'not'
+RULE = 'rule'
+ROLE = 'role'
+GENERIC = 'generic'
+OPAQUE = 'check'
+
+# A match that is just a single string substitution from the target.
+_SINGLE_SUBSTITUTION = re.compile(r'%\(([^)]+)\)s')
+
+
+def to_ir(check):
+    """Lower a parsed check tree into IR"""
+
+    # pylint: disable=too-many-return-statements,unidiomatic-typecheck
+
+    if isinstance(check, _checks.TrueCheck):
+        return [TRUE]
+
+    if isinstance(check, _checks.FalseCheck):
+        return [FALSE]
+
+    if isinstance(check, _checks.AndCheck):
+        return [AND] + [to_ir(rule) for rule in check.rules]
+
+    if isinstance(check, _checks.OrCheck):
+        return [OR] + [to_ir(rule) for rule in check.rules]
+
+    if isinstance(check, _checks.NotCheck):
+        return [NOT, to_ir(check.rule)]
+
+    # Exact type checks, subclasses may alter behaviour so are kept opaque.
+    if type(check) is _checks.RuleCheck:
+        return [RULE, check.match]
+
+    if type(check) is _checks.RoleCheck:
+        return [ROLE, check.match]
+
+    if type(check) is _checks.GenericCheck:
+        return [GENERIC, check.kind, check.match]
+
+    return [OPAQUE, str(check)]
+
+
+def to_check_str(ir):
+    """Raise IR back into a check string"""
+
+    kind = ir[0]
+
+    if kind in (TRUE, FALSE):
+        return kind
+
+    if kind in (AND, OR):
+        return '(' + f' {kind} '.join(to_check_str(child) for child in ir[1:]) + ')'
+
+    if kind == NOT:
+        return 'not ' + to_check_str(ir[1])
+
+    if kind == GENERIC:
+        return f'{ir[1]}:{ir[2]}'
+
+    if kind == OPAQUE:
+        return ir[1]
+
+    return f'{kind}:{ir[1]}'
+
+
+class Substitutions(dict):
+    """
+    Target values as they would be substituted into a match, looked up and
+    converted at most once per evaluation, or None if the target doesn't have
+    the key.  Also holds the results of pooled nodes for the credentials it
+    is bound to, so may be passed to multiple enforcers for a single request.
+    """
+
+    __slots__ = ('target', 'creds', 'results')
+
+    def __init__(self, target):
+        super().__init__()
+        self.target = target
+        self.creds = None
+        self.results = {}
+
+    def bind(self, creds):
+        """Bind to credentials, discarding results for any others"""
+
+        if self.creds is not creds:
+            self.creds = creds
+            self.results = {}
+
+    def __missing__(self, key):
+        try:
+            value = str(self.target[key])
+        except KeyError:
+            value = None
+
+        self[key] = value
+
+        return value
+
+
+def _interpolator(match):
+    """
+    Returns a function that substitutes the target into a match, or None if
+    the target doesn't have a referenced key.  Matches that are a constant
+    or a single substitution are resolved without string formatting.
+    """
+
+    if '%' not in match:
+        return lambda substitutions: match
+
+    single = _SINGLE_SUBSTITUTION.fullmatch(match)
+    if single:
+        key = single.group(1)
+        return lambda substitutions: substitutions[key]
+
+    def interpolate(substitutions):
+        try:
+            return match % substitutions.target
+        except KeyError:
+            return None
+
+    return interpolate
+
+
+def _compile_role(match):
+    """
+    Compile a role check against the interned roles of a credential view.
+    Roles not yet interned cannot be in any view, so never match.
+    """
+
+    if '%' not in match:
+        bit = credentials.ROLES.bit(match)
+
+        def constant_check(_, creds, __):
+            return bool(creds.roles_mask & bit)
+
+        return constant_check
+
+    interpolate = _interpolator(match)
+
+    def check(target, creds, _):
+        value = interpolate(target)
+        if value is None:
+            return False
+
+        bit = credentials.ROLES.bits.get(value.lower())
+
+        return bit is not None and bool(creds.roles_mask & bit)
+
+    return check
+
+
+def _compile_creds_lookup(path_segments):
+    """
+    Returns a function that checks whether a value matches the credentials at
+    a path, with the same semantics as GenericCheck.
+    """
+
+    if len(path_segments) > 1:
+        # pylint: disable=protected-access
+        return lambda creds, value: _checks.GenericCheck._find_in_dict(creds, path_segments, value)
+
+    key = path_segments[0]
+
+    def lookup(creds, value):
+        try:
+            test_value = creds[key]
+        except KeyError:
+            return False
+
+        if isinstance(test_value, list):
+            return any(value == str(item) for item in test_value)
+
+        return value == str(test_value)
+
+    return lookup
+
+
+def _compile_generic(kind, match):
+    """Compile a generic check, or return None if it cannot be"""
+
+    interpolate = _interpolator(match)
+
+    try:
+        literal = str(ast.literal_eval(kind))
+    except ValueError:
+        literal = None
+    except Exception:  # pylint: disable=broad-exception-caught
+        # Let Oslo raise whatever it raises at evaluation time.
+        return None
+
+    if literal is not None:
+        def literal_check(target, _creds, _):
+            value = interpolate(target)
+            return value is not None and value == literal
+
+        return literal_check
+
+    lookup = _compile_creds_lookup(kind.split('.'))
+
+    def check(target, creds, _):
+        value = interpolate(target)
+        return value is not None and lookup(creds, value)
+
+    return check
+
+
+def _compile(ir, children):
+    """Compile an IR node, given its compiled children if any"""
+
+    # pylint: disable=too-many-return-statements
+
+    kind = ir[0]
+
+    if kind == TRUE:
+        return lambda target, creds, resolve: True
+
+    if kind == FALSE:
+        return lambda target, creds, resolve: False
+
+    if kind == AND:
+        def and_check(target, creds, resolve):
+            for child in children:
+                if not child(target, creds, resolve):
+                    return False
+            return True
+
+        return and_check
+
+    if kind == OR:
+        def or_check(target, creds, resolve):
+            for child in children:
+                if child(target, creds, resolve):
+                    return True
+            return False
+
+        return or_check
+
+    if kind == NOT:
+        child = children[0]
+        return lambda target, creds, resolve: not child(target, creds, resolve)
+
+    if kind == RULE:
+        name = ir[1]
+        return lambda target, creds, resolve: resolve(name, target, creds)
+
+    if kind == ROLE:
+        return _compile_role(ir[1])
+
+    if kind == GENERIC:
+        check = _compile_generic(ir[1], ir[2])
+        if check is not None:
+            return check
+
+    # Anything else is deferred to Oslo, though we don't expect anything
+    # that needs an enforcer.
+    opaque_check = _parser.parse_rule(to_check_str(ir))
+
+    def opaque(target, creds, _):
+        return _checks._check(opaque_check, target.target, creds, None, None)  # pylint: disable=protected-access
+
+    return opaque
+
+
+def _compound(ir):
+    """Returns whether an IR node has IR children"""
+
+    return ir[0] in (AND, OR, NOT)
+
+
+def compile_ir(ir):
+    """
+    Compile IR into a function taking target substitutions, credentials and a
+    resolver for named rules.
+    """
+
+    children = [compile_ir(child) for child in ir[1:]] if _compound(ir) else None
+
+    return _compile(ir, children)
+
+
+def _digest(data):
+    """Returns the content address of JSON serializable data"""
+
+    return hashlib.sha256(json.dumps(data).encode()).hexdigest()
+
+
+def _memoize(digest, check):
+    """Record the result of a pooled node in the request's substitutions"""
+
+    def memoized(target, creds, resolve):
+        results = target.results
+
+        result = results.get(digest)
+        if result is None:
+            result = results[digest] = check(target, creds, resolve)
+
+        return result
+
+    return memoized
+
+
+class _Linker:
+    """
+    Compiles a set of named rules into a pool.  Named rule references are
+    addressed by the content of the rule they refer to, and linked directly
+    to its compiled node.
+    """
+
+    # pylint: disable=too-few-public-methods
+
+    def __init__(self, nodes, rules, default_rule=None):
+        self.nodes = nodes
+        self.rules = rules
+        self.default_rule = default_rule
+        self.linked = {}
+        self.linking = set()
+
+    def rule(self, name):
+        """Returns the digest and compiled node of a named rule"""
+
+        if name in self.linked:
+            return self.linked[name]
+
+        if name not in self.rules:
+            # Missing rules fall back to the default rule, as Oslo's Rules
+            # do, or fail closed.
+            if self.default_rule in self.rules:
+                return self.rule(self.default_rule)
+
+            return self.node([FALSE])
+
+        if name in self.linking:
+            # Cycles cannot be content addressed, so are resolved by name,
+            # recursing just as Oslo would.
+            return None, _compile([RULE, name], None)
+
+        self.linking.add(name)
+
+        try:
+            linked = self.linked[name] = self.node(self.rules[name])
+        finally:
+            self.linking.discard(name)
+
+        return linked
+
+    def node(self, ir):
+        """Returns the digest and compiled node of IR, None if it's not pooled"""
+
+        if ir[0] == RULE:
+            return self.rule(ir[1])
+
+        if ir[0] == OPAQUE:
+            # May not be deterministic, so neither shared nor memoized.
+            return None, _compile(ir, None)
+
+        if not _compound(ir):
+            digest = _digest(ir)
+
+            check = self.nodes.get(digest)
+            if check is None:
+                check = self.nodes[digest] = _compile(ir, None)
+
+            return digest, check
+
+        linked = [self.node(child) for child in ir[1:]]
+        children = [check for _, check in linked]
+
+        if any(digest is None for digest, _ in linked):
+            return None, _compile(ir, children)
+
+        digest = _digest([ir[0]] + [digest for digest, _ in linked])
+
+        check = self.nodes.get(digest)
+        if check is None:
+            check = self.nodes[digest] = _memoize(digest, _compile(ir, children))
+
+        return digest, check
+
+
+class Pool:
+    """
+    Content addressed store of compiled nodes.  Identical subtrees, even from
+    rules in different namespaces, are compiled and stored once, and compound
+    nodes are evaluated at most once per request.
+    """
+
+    # pylint: disable=too-few-public-methods
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.nodes = {}
+
+    def link(self, rules, default_rule=None):
+        """
+        Compile a dictionary of rule names to IR into compiled rules, with
+        references to missing rules linked to the named default rule.
+        """
+
+        with self.lock:
+            linker = _Linker(self.nodes, rules, default_rule)
+
+            return {name: linker.rule(name)[1] for name in rules}
+
+
+# Shared by all enforcers by default.
+POOL = Pool()
+
+
+class CompiledEnforcer:
+    """
+    Evaluates compiled rules with the same semantics as policy.Enforcer.enforce
+    for named rules, but without policy file handling, rules are fixed at
+    construction time.
+    """
+
+    def __init__(self, rules, pool=None, default_rule='default'):
+        """
+        Create an enforcer from a dictionary of rule names to a dictionary
+        with the IR in "ir" and optional "scope_types".  Rules are compiled
+        into the shared pool unless another is given.  Missing rules fall
+        back to the named default rule, if defined, as Oslo's do with the
+        policy_default_rule option.
+        """
+
+        self.definitions = rules
+        self.rules = (pool or POOL).link({name: rule['ir'] for name, rule in rules.items()}, default_rule)
+        self.default = self.rules.get(default_rule)
+        self.scope_types = {name: rule['scope_types'] for name, rule in rules.items() if rule.get('scope_types')}
+
+    @classmethod
+    def from_rules(cls, rule_defaults, pool=None):
+        """Create an enforcer from policy.RuleDefault objects"""
+
+        return cls({rule.name: definition(rule) for rule in rule_defaults}, pool=pool)
+
+    @classmethod
+    def from_enforcer(cls, enforcer, pool=None):
+        """Create an enforcer from the rules loaded into a policy.Enforcer"""
+
+        enforcer.load_rules()
+
+        default_rule = enforcer.rules.default_rule
+
+        rules = {}
+
+        for name, check in enforcer.rules.items():
+            registered = enforcer.registered_rules.get(name)
+
+            rules[name] = {
+                'ir': to_ir(check),
+                'scope_types': registered.scope_types if registered else None,
+            }
+
+        return cls(rules, pool=pool, default_rule=default_rule if isinstance(default_rule, str) else None)
+
+    def _resolve(self, name, target, creds):
+        """
+        Evaluate a named rule, falling back to the default rule, or failing
+        closed, if it doesn't exist.
+        """
+
+        check = self.rules.get(name, self.default)
+        if check is None:
+            return False
+
+        return check(target, creds, self._resolve)
+
+    def enforce(self, rule, target, creds, do_raise=False, exc=None, *args, **kwargs):
+        """
+        Checks authorization of a named rule, see policy.Enforcer.enforce.
+        Results are shared with other enforcers when the target is passed as
+        the same Substitutions, with the same context or credential view.
+        """
+
+        # pylint: disable=keyword-arg-before-vararg
+
+        creds = credentials.view(creds)
+
+        substitutions = target if isinstance(target, Substitutions) else Substitutions(target)
+        substitutions.bind(creds)
+
+        result = self._enforce_scope(rule, creds, do_raise) and self._resolve(rule, substitutions, creds)
+
+        if do_raise and not result:
+            if exc:
+                raise exc(*args, **kwargs)
+
+            raise policy.PolicyNotAuthorized(rule, substitutions.target, creds)
+
+        return result
+
+    def _enforce_scope(self, rule, creds, do_raise):
+        """Check the token scope is valid for the rule, as Oslo does"""
+
+        scope_types = self.scope_types.get(rule)
+        if not scope_types:
+            return True
+
+        if creds.get('system'):
+            token_scope = 'system'
+        elif creds.get('domain_id'):
+            token_scope = 'domain'
+        else:
+            token_scope = 'project'
+
+        if token_scope in scope_types:
+            return True
+
+        if do_raise:
+            raise policy.InvalidScope(rule, scope_types, token_scope)
+
+        return False
+
+
+def definition(rule):
+    """Returns the JSON serializable definition of a policy.RuleDefault"""
+
+    return {
+        'check_str': rule.check_str,
+        'description': rule.description,
+        'scope_types': rule.scope_types,
+        'ir': to_ir(rule.check),
+    }
+
+# vi: ts=4 et:
@@ -0,0 +1,123 @@
+# Copyright 2024 the Unikorn Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Configuration enforcers are built against.
+
+By default this is the global oslo.config CONF, so the host service's policy
+file and options apply.  Tools, worker processes and tests may instead use
+isolated configurations, private to each enforcer and carrying only the
+oslo.policy options, which need no global parsing and can be built from many
+threads at once.
+"""
+
+# pylint: disable=line-too-long
+
+import concurrent.futures
+import os
+import time
+
+from oslo_config import cfg
+from oslo_policy import opts
+from oslo_policy import policy
+
+# When set, enforcers are built against isolated configurations.
+ISOLATED_ENV = 'UNIKORN_POLICY_ISOLATED_CONFIG'
+
+# The oslo.policy options, copied once, and shared read only by every
+# isolated configuration.
+_OPTIONS = opts.list_opts()
+
+
+class _PolicyOpts(cfg.ConfigOpts):
+    """
+    Configuration that is never parsed, so is cheap to build, and only finds
+    policy files and directories given as absolute paths.
+    """
+
+    def find_file(self, name):
+        """Returns an absolute path if it exists, there is nowhere to search"""
+
+        return name if os.path.isabs(name) and os.path.exists(name) else None
+
+
+def isolated(policy_file=None, policy_dirs=None):
+    """
+    Returns a private configuration with only the oslo.policy options,
+    reading no command line, configuration files or environment.  Policy
+    files and directories are only loaded when given explicitly.
+    """
+
+    conf = _PolicyOpts()
+
+    for group, options in _OPTIONS:
+        conf.register_opts(options, group=group)
+
+    if policy_file is not None:
+        conf.set_override('policy_file', os.path.abspath(policy_file), group='oslo_policy')
+
+    if policy_dirs is not None:
+        conf.set_override('policy_dirs', [os.path.abspath(path) for path in policy_dirs], group='oslo_policy')
+
+    return conf
+
+
+def get():
+    """Returns the configuration to build an enforcer against"""
+
+    if os.environ.get(ISOLATED_ENV):
+        return isolated()
+
+    return cfg.CONF
+
+
+def _build(rules, factory):
+    """Build and load an enforcer, returning the time it took"""
+
+    start = time.perf_counter()
+
+    enforcer = policy.Enforcer(conf=factory())
+    enforcer.register_defaults(rules)
+    enforcer.load_rules()
+
+    return time.perf_counter() - start
+
+
+def benchmark(rules, threads=4, builds=200):
+    """
+    Build and load enforcers for rules concurrently, against the global
+    configuration, then against isolated ones.  Returns throughput and
+    latency for each, the global configuration must already be parsed.
+    """
+
+    report = {}
+
+    for name, factory in (('global', lambda: cfg.CONF), ('isolated', isolated)):
+        with concurrent.futures.ThreadPoolExecutor(threads) as executor:
+            start = time.perf_counter()
+            latencies = sorted(executor.map(lambda _, factory=factory: _build(rules, factory), range(builds)))
+            seconds = time.perf_counter() - start
+
+        report[name] = {
+            'builds_per_second': builds / seconds,
+            'latency_ms': {
+                'p50': latencies[len(latencies) // 2] * 1000,
+                'p99': latencies[min(len(latencies) - 1, len(latencies) * 99 // 100)] * 1000,
+                'max': latencies[-1] * 1000,
+            },
+        }
+
+    return report
+
+# vi: ts=4 et:
@@ -0,0 +1,162 @@
+# Copyright 2024 the Unikorn Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Canonical credential views.
+
+Every enforcement converts a context to policy values, and every role check
+lower cases and searches the role list.  A view does that once per context,
+and interns roles into bitmasks shared by every compiled enforcer in the
+process, so a role check is a single bitwise and.
+
+Views of a context are snapshots, cached for the lifetime of the context,
+so contexts must not be altered once used for enforcement.
+"""
+
+import hashlib
+import threading
+import weakref
+
+from oslo_context import context
+
+
+class RoleTable:
+    """
+    Interns role names, case insensitively, into bits.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.bits = {}
+
+    def bit(self, role):
+        """Returns the bit for a role, allocating one if required"""
+
+        role = role.lower()
+
+        bit = self.bits.get(role)
+        if bit is not None:
+            return bit
+
+        with self.lock:
+            return self.bits.setdefault(role, 1 << len(self.bits))
+
+    def mask(self, roles):
+        """Returns the mask for a collection of roles"""
+
+        mask = 0
+
+        for role in roles:
+            mask |= self.bit(role)
+
+        return mask
+
+
+# Shared by all enforcers, so masks are comparable across namespaces.
+ROLES = RoleTable()
+
+
+def _freeze(value):
+    """Returns a hashable version of a credential value"""
+
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+
+    if isinstance(value, (list, tuple, set)):
+        return tuple(_freeze(v) for v in value)
+
+    return value
+
+
+class Credentials(dict):
+    """
+    Policy values, as Oslo would build them for enforcement, with the roles
+    interned as a mask.  The signature is a hashable identity for the values.
+    """
+
+    def __init__(self, values):
+        super().__init__(values)
+
+        # Oslo aliases the system scope, see policy.Enforcer.enforce.
+        if self.get('system_scope'):
+            self['system'] = self['system_scope']
+
+        self.roles_mask = ROLES.mask(self['roles']) if 'roles' in self else 0
+        self._signature = None
+
+    @property
+    def signature(self):
+        """Returns a hashable identity for the credentials"""
+
+        if self._signature is None:
+            self._signature = _freeze(self)
+
+        return self._signature
+
+
+def digest(frozen):
+    """Returns a short digest of a credential signature"""
+
+    return hashlib.sha256(repr(frozen).encode()).hexdigest()[:16]
+
+
+# Views of contexts, released along with the context.
+_views = weakref.WeakKeyDictionary()
+_views_lock = threading.Lock()
+
+
+def view(creds):
+    """
+    Returns the canonical view of a context or policy values.  Contexts are
+    converted once, policy values every time as they may be mutated.
+    """
+
+    if isinstance(creds, Credentials):
+        return creds
+
+    if not isinstance(creds, context.RequestContext):
+        return Credentials(creds)
+
+    credentials = _views.get(creds)
+    if credentials is None:
+        credentials = Credentials(creds.to_policy_values().items())
+
+        with _views_lock:
+            _views[creds] = credentials
+
+    return credentials
+
+
+def snapshot(creds):
+    """
+    Returns the signature of credentials as they are now.  Unlike a view,
+    contexts are converted every time, so a context modified since it was
+    first viewed is identified by its current values.
+    """
+
+    if isinstance(creds, context.RequestContext):
+        creds = creds.to_policy_values()
+
+    return view(creds).signature
+
+
+def signature(creds):
+    """
+    Returns a short digest identifying credentials, so decisions can be
+    correlated without recording identities.
+    """
+
+    return digest(view(creds).signature)
+
+# vi: ts=4 et:
@@ -0,0 +1,52 @@
+# Copyright 2024 the Unikorn Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Atomic file writes.
+"""
+
+# pylint: disable=line-too-long
+
+import contextlib
+import os
+import tempfile
+
+
+@contextlib.contextmanager
+def atomic_write(path, mode='w', permissions=0o644):
+    """
+    Open a uniquely named temporary file beside a path for writing, and
+    replace the path with it once written, so readers never see a partial
+    file and concurrent writers, in any thread or process, never collide.
+    The temporary file is removed on failure.  It's created private, so is
+    given the permissions before replacing anything, the process umask
+    isn't applied as reading it means changing it for every thread.
+    """
+
+    fd, temp = tempfile.mkstemp(dir=os.path.dirname(path) or '.', prefix=os.path.basename(path) + '.', suffix='.tmp')
+
+    try:
+        with os.fdopen(fd, mode, encoding=None if 'b' in mode else 'utf-8') as out:
+            os.fchmod(out.fileno(), permissions)
+
+            yield out
+
+        os.replace(temp, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(temp)
+
+        raise
+
+# vi: ts=4 et:
@@ -0,0 +1,301 @@
+# Copyright 2024 the Unikorn Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Equivalence fuzzing of rule expansion.
+
+Random, acyclic rule graphs are rendered into check strings with redundant
+and glued parentheses, negations and rule references, then every rule is
+expanded as inherit_rules does.  Each rule must get the same decision from
+Oslo's own rule resolution and from its expansion, for random credentials and
+targets, and expansions must not reference any rule.
+
+Failing cases are shrunk, by discarding unreferenced rules and replacing
+subtrees with their children or constants, until no smaller case fails.
+Seeds are spread across a process pool, and a case is reproduced from its
+seed alone.
+"""
+
+# pylint: disable=line-too-long
+
+import concurrent.futures
+import os
+import random
+
+from oslo_policy import policy
+from unikorn_openstack_policy import base
+from unikorn_openstack_policy import config
+
+# Leaf checks, covering constants, roles, target substitutions and literals.
+LEAVES = (
+    '@',
+    '!',
+    'role:admin',
+    'role:member',
+    'role:manager',
+    'project_id:%(project_id)s',
+    'domain_id:%(domain_id)s',
+    "'p1':%(project_id)s",
+)
+
+# Credential and target values.
+ROLES = ('admin', 'member', 'manager', 'reader')
+IDS = ('p1', 'p2', None)
+
+
+def _node(rng, depth, references):
+    """Returns a random expression tree, referencing the given rules"""
+
+    if depth == 0 or rng.random() < 0.3:
+        if references and rng.random() < 0.4:
+            return ['leaf', 'rule:' + rng.choice(references)]
+
+        return ['leaf', rng.choice(LEAVES)]
+
+    kind = rng.choice(('and', 'or', 'or', 'not', 'paren'))
+
+    if kind in ('not', 'paren'):
+        return [kind, _node(rng, depth - 1, references)]
+
+    children = []
+
+    for _ in range(rng.randint(2, 3)):
+        child = _node(rng, depth - 1, references)
+
+        # Usually, but not always, keep junctions apart.
+        if child[0] in ('and', 'or') and rng.random() < 0.8:
+            child = ['paren', child]
+
+        children.append(child)
+
+    return [kind] + children
+
+
+def render(node):
+    """Render an expression tree as a check string"""
+
+    kind = node[0]
+
+    if kind == 'leaf':
+        return node[1]
+
+    if kind == 'not':
+        return 'not ' + render(node[1])
+
+    if kind == 'paren':
+        return '(' + render(node[1]) + ')'
+
+    return f' {kind} '.join(render(child) for child in node[1:])
+
+
+def generate(seed, size=6, depth=4, checks=16):
+    """
+    Returns a random case for a seed, a dictionary of rule names to trees,
+    where rules only reference later ones, and credential and target pairs.
+    """
+
+    rng = random.Random(seed)
+
+    names = [f'rule_{index}' for index in range(rng.randint(1, size))]
+
+    # Empty check strings are always true, so have to expand to something.
+    rules = {name: ['leaf', ''] if rng.random() < 0.05 else _node(rng, rng.randint(0, depth), names[index + 1:]) for index, name in enumerate(names)}
+
+    pairs = []
+
+    for _ in range(checks):
+        creds = {
+            'roles': [role for role in ROLES if rng.random() < 0.4],
+            'project_id': rng.choice(IDS),
+            'domain_id': rng.choice(IDS),
+        }
+
+        target = {key: value for key, value in (('project_id', rng.choice(IDS)), ('domain_id', rng.choice(IDS))) if value is not None}
+
+        pairs.append([creds, target])
+
+    return {'seed': seed, 'rules': rules, 'checks': pairs}
+
+
+def _enforcer(checks):
+    """Returns an enforcer with only the given parsed checks"""
+
+    enforcer = policy.Enforcer(conf=config.isolated())
+    enforcer.set_rules(policy.Rules(checks))
+
+    return enforcer
+
+
+def failures(case):
+    """
+    Returns a list of failures for a case, as tuples of rule name, check
+    index and a description.
+    """
+
+    defaults = [policy.RuleDefault(name=name, check_str=render(node)) for name, node in case['rules'].items()]
+
+    found = []
+    expanded = {}
+
+    for rule in defaults:
+        try:
+            expanded[rule.name] = base._build_check_str(rule.check_str, defaults)  # pylint: disable=protected-access
+        except Exception as exc:  # pylint: disable=broad-exception-caught
+            found.append((rule.name, None, f'expansion raised {type(exc).__name__}: {exc}'))
+            continue
+
+        if 'rule:' in expanded[rule.name]:
+            found.append((rule.name, None, f'expansion {expanded[rule.name]!r} references a rule'))
+
+    resolving = _enforcer({rule.name: rule.check for rule in defaults})
+    inlined = _enforcer({name: policy.RuleDefault(name=name, check_str=check_str).check for name, check_str in expanded.items()})
+
+    for name, check_str in expanded.items():
+        for index, (creds, target) in enumerate(case['checks']):
+            expected = bool(resolving.enforce(name, dict(target), dict(creds)))
+            actual = bool(inlined.enforce(name, dict(target), dict(creds)))
+
+            if actual != expected:
+                found.append((name, index, f'expansion {check_str!r} gave {actual}, resolution gave {expected}'))
+
+    return found
+
+
+def _references(node):
+    """Yields the rule names referenced by a tree"""
+
+    if node[0] == 'leaf':
+        if node[1].startswith('rule:'):
+            yield node[1][len('rule:'):]
+        return
+
+    for child in node[1:]:
+        yield from _references(child)
+
+
+def _reachable(rules, name):
+    """Returns the rules reachable from a named rule"""
+
+    seen = {}
+    pending = [name]
+
+    while pending:
+        current = pending.pop()
+        if current in seen:
+            continue
+
+        seen[current] = rules[current]
+        pending.extend(_references(rules[current]))
+
+    return {key: node for key, node in rules.items() if key in seen}
+
+
+def _simplifications(node):
+    """Yields strictly simpler versions of a tree"""
+
+    if node[0] == 'leaf':
+        if node[1] not in ('@', '!'):
+            yield ['leaf', '@']
+            yield ['leaf', '!']
+        return
+
+    children = node[1:]
+
+    # Replace the whole subtree with a constant or one of its children.
+    yield ['leaf', '@']
+    yield ['leaf', '!']
+    yield from children
+
+    # Drop a child from a junction.
+    if len(children) > 2:
+        for index in range(len(children)):
+            yield [node[0]] + children[:index] + children[index + 1:]
+
+    # Simplify a single child.
+    for index, child in enumerate(children):
+        for simpler in _simplifications(child):
+            yield [node[0]] + children[:index] + [simpler] + children[index + 1:]
+
+
+def _candidates(case, name, index):
+    """Yields smaller cases that may still fail"""
+
+    # A single check, and only the rules reachable from the failing one.
+    yield {**case, 'rules': _reachable(case['rules'], name), 'checks': [case['checks'][index]] if index is not None else case['checks'][:1]}
+
+    for rule_name, node in case['rules'].items():
+        for simpler in _simplifications(node):
+            yield {**case, 'rules': {**case['rules'], rule_name: simpler}}
+
+
+def _size(case):
+    """Returns the size of a case, shrinking always reduces this"""
+
+    return sum(len(render(node)) for node in case['rules'].values()) + len(case['rules']) + len(case['checks'])
+
+
+def shrink(case):
+    """Returns the smallest failing case found from a failing case"""
+
+    current = case
+    current_failures = failures(current)
+
+    shrunk = True
+
+    while shrunk:
+        shrunk = False
+        name, index, _ = current_failures[0]
+
+        for candidate in _candidates(current, name, index):
+            if _size(candidate) >= _size(current):
+                continue
+
+            candidate_failures = failures(candidate)
+            if candidate_failures:
+                current, current_failures = candidate, candidate_failures
+                shrunk = True
+                break
+
+    return current, current_failures
+
+
+def check_seed(seed):
+    """Returns None if a seed's case passes, otherwise the shrunk case and its failures"""
+
+    case = generate(seed)
+
+    if not failures(case):
+        return None
+
+    return shrink(case)
+
+
+def fuzz(seeds, workers=None):
+    """
+    Check every seed, across a process pool, returning the shrunk failing
+    cases and their failures.
+    """
+
+    if workers is None:
+        workers = os.cpu_count()
+
+    if workers <= 1:
+        results = map(check_seed, seeds)
+        return [result for result in results if result is not None]
+
+    with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+        results = executor.map(check_seed, seeds, chunksize=16)
+        return [result for result in results if result is not None]
+
+# vi: ts=4 et:
@@ -0,0 +1,73 @@
+# Copyright 2024 the Unikorn Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Streaming policy file generation.
+
+Rules are consumed one at a time from whatever iterable list_rules() returns
+and written out immediately, so memory use doesn't grow with the policy.
+Output follows the order of the rule lists, with keys and values quoted by
+the JSON encoder, so it is byte for byte stable for the same inputs.
+"""
+
+import json
+
+# Supported output formats.
+FORMATS = ('yaml', 'json')
+
+
+def _quote(value):
+    """
+    Quote a string.  JSON strings are also valid YAML double quoted scalars,
+    so this works for both formats.
+    """
+
+    return json.dumps(value)
+
+
+def yaml_chunks(rules, descriptions=True):
+    """Generate a YAML policy document, one rule at a time"""
+
+    for rule in rules:
+        if descriptions and rule.description:
+            for line in rule.description.splitlines():
+                yield f'# {line}'.rstrip() + '\n'
+
+        yield f'{_quote(rule.name)}: {_quote(rule.check_str)}\n\n'
+
+
+def json_chunks(rules):
+    """Generate a JSON policy document, one rule at a time"""
+
+    separator = '{\n'
+
+    for rule in rules:
+        yield f'{separator}    {_quote(rule.name)}: {_quote(rule.check_str)}'
+        separator = ',\n'
+
+    yield '{}\n' if separator == '{\n' else '\n}\n'
+
+
+def write(rules, out, output_format='yaml', descriptions=True):
+    """Stream rules to a file like object in the requested format"""
+
+    if output_format == 'json':
+        chunks = json_chunks(rules)
+    else:
+        chunks = yaml_chunks(rules, descriptions)
+
+    for chunk in chunks:
+        out.write(chunk)
+
+# vi: ts=4 et:
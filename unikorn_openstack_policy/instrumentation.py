@@ -0,0 +1,87 @@
+# Copyright 2024 the Unikorn Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Observation of enforcement decisions.
+
+Metrics, shadow evaluation and auditing each observe decisions on named
+rules.  An enforcer is wrapped once for every enabled observer, so decisions
+are attributed, timed and treated on failure the same way for all of them.
+"""
+
+# pylint: disable=line-too-long
+
+import time
+
+
+class Decision:
+    """
+    A decision on a named rule, as observed.  The result is false if the
+    enforcer raised, and the cache hit is whether the rules were already
+    loaded.
+    """
+
+    # pylint: disable=too-few-public-methods,too-many-arguments,too-many-positional-arguments
+
+    __slots__ = ('rule', 'target', 'creds', 'result', 'seconds', 'cache_hit')
+
+    def __init__(self, rule, target, creds, result, seconds, cache_hit):
+        self.rule = rule
+        self.target = target
+        self.creds = creds
+        self.result = result
+        self.seconds = seconds
+        self.cache_hit = cache_hit
+
+
+def instrument(enforcer, observers):
+    """
+    Returns the enforcer with every decision on a named rule passed to each
+    observer, those that are None being disabled.  If none are enabled the
+    enforcer is returned unaltered so there is no overhead.
+    """
+
+    observers = [observer for observer in observers if observer is not None]
+
+    if not observers:
+        return enforcer
+
+    enforce = enforcer.enforce
+
+    def instrumented_enforce(rule, target, creds, *args, **kwargs):
+        # Check trees passed directly are not attributable to a rule.
+        if not isinstance(rule, str):
+            return enforce(rule, target, creds, *args, **kwargs)
+
+        rules = enforcer.rules
+        result = False
+        start = time.perf_counter()
+
+        try:
+            result = enforce(rule, target, creds, *args, **kwargs)
+        finally:
+            # Anything raised, a denial requested with do_raise or otherwise,
+            # is observed as a denial, then raised.
+            decision = Decision(rule, target, creds, bool(result), time.perf_counter() - start, enforcer.rules is rules)
+
+            for observer in observers:
+                observer(decision)
+
+        return result
+
+    enforcer.enforce = instrumented_enforce
+
+    return enforcer
+
+# vi: ts=4 et:
@@ -0,0 +1,303 @@
+# Copyright 2024 the Unikorn Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Opt-in enforcement instrumentation.
+"""
+
+# pylint: disable=line-too-long
+
+import atexit
+import bisect
+import collections
+import json
+import logging
+import os
+import threading
+
+from oslo_policy import _checks
+from unikorn_openstack_policy import credentials
+from unikorn_openstack_policy import files
+from unikorn_openstack_policy import reorder
+
+# When set, enforcers are instrumented and metrics are written to this file.
+# Files ending in .json are written as JSON, anything else as Prometheus text.
+METRICS_ENV = 'UNIKORN_POLICY_METRICS'
+
+# How often, in seconds, to rewrite the metrics file.
+METRICS_INTERVAL_ENV = 'UNIKORN_POLICY_METRICS_INTERVAL'
+
+# When set, also record which rule branches decide each result.  This
+# evaluates every branch so is considerably more expensive.
+METRICS_BRANCHES_ENV = 'UNIKORN_POLICY_METRICS_BRANCHES'
+
+LOG = logging.getLogger(__name__)
+
+# Latency histogram bucket upper bounds, in seconds.
+BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01)
+
+
+def _depth(enforcer, check, resolving=frozenset()):
+    """
+    Returns the depth of a parsed check tree, with rule references resolved
+    through the enforcer's rules as they are when enforced.
+    """
+
+    if isinstance(check, (_checks.AndCheck, _checks.OrCheck)):
+        return 1 + max((_depth(enforcer, rule, resolving) for rule in check.rules), default=0)
+
+    if isinstance(check, _checks.NotCheck):
+        return 1 + _depth(enforcer, check.rule, resolving)
+
+    # References are replaced by the rule they name, cycles and missing
+    # rules are leaves.
+    if isinstance(check, _checks.RuleCheck) and check.match not in resolving:
+        rule = enforcer.rules.get(check.match)
+
+        if rule is not None:
+            return _depth(enforcer, rule, resolving | {check.match})
+
+    return 1
+
+
+class RuleMetrics:
+    """
+    Accumulated metrics for a single rule.
+    """
+
+    # pylint: disable=too-few-public-methods
+
+    def __init__(self, depth):
+        self.allowed = 0
+        self.denied = 0
+        self.cache_hits = 0
+        self.depth = depth
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.seconds = 0.0
+        self.branches = collections.Counter()
+
+    def observe(self, result, seconds, cache_hit):
+        """Record a single decision"""
+
+        if result:
+            self.allowed += 1
+        else:
+            self.denied += 1
+
+        if cache_hit:
+            self.cache_hits += 1
+
+        self.buckets[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.seconds += seconds
+
+
+class Registry:
+    """
+    Metrics for all instrumented enforcers, keyed by namespace and rule.
+    """
+
+    def __init__(self, branches=False):
+        self.lock = threading.Lock()
+        self.rules = {}
+        self.branches = branches
+        self.stopped = threading.Event()
+
+    def rule(self, namespace, name, check, enforcer):
+        """
+        Returns the metrics for a rule, creating them if required, the check's
+        references are resolved through the enforcer.  The caller must hold
+        the lock.
+        """
+
+        key = (namespace, name)
+
+        metrics = self.rules.get(key)
+        if metrics is None:
+            metrics = self.rules[key] = RuleMetrics(_depth(enforcer, check, frozenset([name])) if check else 0)
+
+        return metrics
+
+    def to_dict(self):
+        """Returns metrics as a JSON serializable dictionary"""
+
+        with self.lock:
+            return {
+                namespace: {
+                    rule: {
+                        'calls': metrics.allowed + metrics.denied,
+                        'allowed': metrics.allowed,
+                        'denied': metrics.denied,
+                        'cache_hits': metrics.cache_hits,
+                        'depth': metrics.depth,
+                        'seconds': metrics.seconds,
+                        'buckets': dict(zip([str(b) for b in BUCKETS] + ['+Inf'], metrics.buckets)),
+                        'branches': dict(sorted(metrics.branches.items())),
+                    } for (ns, rule), metrics in sorted(self.rules.items()) if ns == namespace
+                } for namespace in sorted({ns for ns, _ in self.rules})
+            }
+
+    def to_prometheus(self):
+        """Returns metrics in the Prometheus text exposition format"""
+
+        def labels(namespace, rule, **extra):
+            pairs = {'namespace': namespace, 'rule': rule, **extra}
+            escaped = (v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for v in pairs.values())
+            return '{' + ','.join(f'{k}="{v}"' for k, v in zip(pairs, escaped)) + '}'
+
+        lines = [
+            '# HELP unikorn_policy_checks_total Policy decisions made.',
+            '# TYPE unikorn_policy_checks_total counter',
+        ]
+
+        with self.lock:
+            items = sorted(self.rules.items())
+
+            for (namespace, rule), metrics in items:
+                lines.append(f'unikorn_policy_checks_total{labels(namespace, rule, result="allow")} {metrics.allowed}')
+                lines.append(f'unikorn_policy_checks_total{labels(namespace, rule, result="deny")} {metrics.denied}')
+
+            lines.append('# HELP unikorn_policy_cache_hits_total Policy decisions made against already loaded rules.')
+            lines.append('# TYPE unikorn_policy_cache_hits_total counter')
+
+            for (namespace, rule), metrics in items:
+                lines.append(f'unikorn_policy_cache_hits_total{labels(namespace, rule)} {metrics.cache_hits}')
+
+            lines.append('# HELP unikorn_policy_rule_depth Depth of the parsed rule tree, with rule references resolved.')
+            lines.append('# TYPE unikorn_policy_rule_depth gauge')
+
+            for (namespace, rule), metrics in items:
+                lines.append(f'unikorn_policy_rule_depth{labels(namespace, rule)} {metrics.depth}')
+
+            lines.append('# HELP unikorn_policy_check_seconds Policy decision latency.')
+            lines.append('# TYPE unikorn_policy_check_seconds histogram')
+
+            for (namespace, rule), metrics in items:
+                cumulative = 0
+                for bound, count in zip([str(b) for b in BUCKETS] + ['+Inf'], metrics.buckets):
+                    cumulative += count
+                    lines.append(f'unikorn_policy_check_seconds_bucket{labels(namespace, rule, le=bound)} {cumulative}')
+                lines.append(f'unikorn_policy_check_seconds_sum{labels(namespace, rule)} {metrics.seconds}')
+                lines.append(f'unikorn_policy_check_seconds_count{labels(namespace, rule)} {cumulative}')
+
+        return '\n'.join(lines) + '\n'
+
+    def dump(self, path):
+        """
+        Write metrics to a file, atomically so a scraper never sees a
+        partially written file.
+        """
+
+        if path.endswith('.json'):
+            data = json.dumps(self.to_dict(), indent=2)
+        else:
+            data = self.to_prometheus()
+
+        with files.atomic_write(path) as out:
+            out.write(data)
+
+    def start(self, path, interval):
+        """
+        Write metrics to a file periodically from a background thread, until
+        stopped.
+        """
+
+        def flush():
+            while not self.stopped.wait(interval):
+                # Failures are retried next interval, never end writing.
+                try:
+                    self.dump(path)
+                except Exception:  # pylint: disable=broad-exception-caught
+                    LOG.exception('failed to write metrics to %s', path)
+
+        threading.Thread(target=flush, daemon=True).start()
+
+    def stop(self):
+        """Stop writing metrics periodically"""
+
+        self.stopped.set()
+
+
+# The global registry, None when instrumentation is disabled.
+_registry = None  # pylint: disable=invalid-name
+
+
+def enable(path=None, interval=None, branches=False):
+    """
+    Enable instrumentation of enforcers created from now on.  If a path is
+    given, metrics are written there periodically and on exit.  Branch
+    statistics for reordering are optionally recorded.
+    """
+
+    global _registry  # pylint: disable=global-statement
+
+    if _registry is not None:
+        return _registry
+
+    _registry = Registry(branches)
+
+    if path:
+        atexit.register(_registry.dump, path)
+
+        if interval:
+            _registry.start(path, interval)
+
+    return _registry
+
+
+def registry():
+    """Returns the global registry, or None if disabled"""
+
+    return _registry
+
+
+def _branches(enforcer, check, target, creds):
+    """Returns the branch statistics for a single decision"""
+
+    creds = credentials.view(creds)
+
+    counts = collections.Counter()
+    reorder.observe(check, target, creds, enforcer, counts)
+
+    return counts
+
+
+def observer(enforcer, namespace):
+    """
+    Returns an observer recording metrics for decisions on the enforcer's
+    rules if enabled, otherwise None.
+    """
+
+    if _registry is None:
+        return None
+
+    target_registry = _registry
+
+    def observe(decision):
+        check = enforcer.rules.get(decision.rule)
+        branches = _branches(enforcer, check, decision.target, decision.creds) if target_registry.branches and check else None
+
+        with target_registry.lock:
+            rule_metrics = target_registry.rule(namespace, decision.rule, check, enforcer)
+            rule_metrics.observe(decision.result, decision.seconds, decision.cache_hit)
+
+            if branches:
+                rule_metrics.branches.update(branches)
+
+    return observe
+
+
+if os.environ.get(METRICS_ENV):
+    enable(os.environ[METRICS_ENV], float(os.environ.get(METRICS_INTERVAL_ENV, '10')), bool(os.environ.get(METRICS_BRANCHES_ENV)))
+
+# vi: ts=4 et:
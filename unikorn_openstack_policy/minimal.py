@@ -0,0 +1,124 @@
+# Copyright 2024 the Unikorn Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Minimal policy file generation.
+
+The services we generate policy for already register their own defaults, so
+the policy file only needs to carry the rules we override and the helpers
+they reference.  Rather than inlining upstream helper rules, the upstream
+check string is kept as is and resolved by the service, so there is far
+less for each worker to parse.
+"""
+
+# pylint: disable=line-too-long
+
+from oslo_config import cfg
+from oslo_policy import _checks
+from oslo_policy import policy
+from unikorn_openstack_policy import base
+from unikorn_openstack_policy import personas
+
+
+def _references(check):
+    """Yields the names of all rules a check tree references"""
+
+    if isinstance(check, (_checks.AndCheck, _checks.OrCheck)):
+        for rule in check.rules:
+            yield from _references(rule)
+    elif isinstance(check, _checks.NotCheck):
+        yield from _references(check.rule)
+    elif isinstance(check, _checks.RuleCheck):
+        yield check.match
+
+
+def minimal_rules(mine, theirs):
+    """
+    Given my rules, return the overrides for any that exist upstream along
+    with the closure of our helper rules they reference, omitting anything
+    the service already registers identically.
+    """
+
+    upstream = {rule.name: rule for rule in theirs}
+    helpers = {rule.name: rule for rule in base.rules}
+
+    overrides = [
+        policy.RuleDefault(
+            name=rule.name,
+            check_str=f'{rule.check_str} or ({upstream[rule.name].check_str})',
+            description=rule.description,
+        ) for rule in mine if rule.name in upstream
+    ]
+
+    required = set()
+    pending = [name for rule in overrides for name in _references(rule.check)]
+
+    while pending:
+        name = pending.pop()
+
+        if name in required or name not in helpers:
+            continue
+
+        if name in upstream and upstream[name].check_str == helpers[name].check_str:
+            continue
+
+        required.add(name)
+        pending.extend(_references(helpers[name].check))
+
+    return [rule for rule in base.rules if rule.name in required] + overrides
+
+
+def service_enforcer(theirs, overrides):
+    """
+    Returns an enforcer that behaves like a service with its own defaults
+    registered and the overrides loaded from a policy file.
+    """
+
+    conf = cfg.ConfigOpts()
+    conf(args=[], default_config_files=[])
+
+    enforcer = policy.Enforcer(conf=conf)
+    enforcer.register_defaults(theirs)
+
+    checks = {rule.name: rule.check for rule in theirs}
+    checks.update({rule.name: rule.check for rule in overrides})
+
+    enforcer.set_rules(policy.Rules(checks))
+
+    return enforcer
+
+
+def verify(mine, theirs, full, minimal):
+    """
+    Evaluates every one of my rules for the standard persona matrix with both
+    the full and minimal policy applied to the service.  Returns a list of
+    rule, persona and target name tuples where decisions differ.
+    """
+
+    full_enforcer = service_enforcer(theirs, full)
+    minimal_enforcer = service_enforcer(theirs, minimal)
+
+    mismatches = []
+
+    for persona, context, target_name, target in personas.matrix():
+        for rule in mine:
+            expected = bool(full_enforcer.enforce(rule.name, target, context))
+            actual = bool(minimal_enforcer.enforce(rule.name, target, context))
+
+            if actual != expected:
+                mismatches.append((rule.name, persona, target_name))
+
+    return mismatches
+
+# vi: ts=4 et:
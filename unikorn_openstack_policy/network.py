@@ -16,12 +16,16 @@
 Defines Oslo Policy Rules.
 """
 
-# pylint: disable=line-too-long
+# pylint: disable=line-too-long,duplicate-code
 
-from neutron.conf import policies
-from oslo_config import cfg
 from oslo_policy import policy
-from unikorn_openstack_policy import base
+from unikorn_openstack_policy import registry
+
+# The oslo.policy namespace these rules are exposed as.
+NAMESPACE = 'unikorn_openstack_policy_network'
+
+# The distribution the upstream rules are inherited from.
+UPSTREAM = 'neutron'
 
 rules = [
     # The domain manager can create and delete networks in its domain.
@@ -68,21 +72,14 @@ rules = [
 ]
 
 
-def list_rules():
-    """Implements the "oslo.policy.policies" entry point"""
-
-    # For every defined rule, look for a corresponding one sourced directly
-    # from neutron, this means we can augment the exact rule defined for a
-    # specific version of neutron,
-    return base.inherit_rules(rules, list(policies.list_rules()))
-
-
-def get_enforcer():
-    """Implements the "oslo.policy.enforcer" entry point"""
+# Inherits the rules from this upstream module, imported on first use.
+SERVICE = registry.Service(NAMESPACE, UPSTREAM, 'neutron.conf.policies', rules)
 
-    enforcer = policy.Enforcer(conf=cfg.CONF)
-    enforcer.register_defaults(list_rules())
+list_upstream_rules = SERVICE.list_upstream_rules
+expand_rules = SERVICE.expand_rules
+list_rules = SERVICE.list_rules
+get_enforcer = SERVICE.get_enforcer
+get_compiled_enforcer = SERVICE.get_compiled_enforcer
 
-    return enforcer
 
 # vi: ts=4 et:
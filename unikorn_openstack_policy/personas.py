@@ -0,0 +1,79 @@
+# Copyright 2024 the Unikorn Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Standard personas that policies are evaluated against.
+"""
+
+import uuid
+
+from oslo_context.context import RequestContext
+
+# Roles held by each persona, regardless of scope.
+ROLES = {
+    'admin': ['admin', 'member', 'reader'],
+    'manager': ['manager'],
+    'member': ['member', 'reader'],
+}
+
+
+def contexts(domain_id, project_id):
+    """
+    Returns a context for every role, scoped to both the project and domain,
+    keyed by e.g. "project_admin" or "domain_manager".
+    """
+
+    personas = {}
+
+    for name, roles in ROLES.items():
+        personas['project_' + name] = RequestContext(roles=list(roles), project_id=project_id)
+        personas['domain_' + name] = RequestContext(roles=list(roles), domain_id=domain_id)
+
+    return personas
+
+
+def targets(domain_id, project_id):
+    """
+    Returns a target that corresponds to the personas' scope, and an
+    alternate one that isn't in the personas' domain or project.
+    """
+
+    return {
+        'target': {
+            'domain_id': domain_id,
+            'project_id': project_id,
+        },
+        'alt_target': {
+            'domain_id': uuid.uuid4().hex,
+            'project_id': uuid.uuid4().hex,
+        },
+    }
+
+
+def matrix():
+    """
+    Yields every persona and target combination as tuples of persona name,
+    context, target name and target.
+    """
+
+    domain_id = uuid.uuid4().hex
+    project_id = uuid.uuid4().hex
+
+    persona_targets = targets(domain_id, project_id)
+
+    for persona, context in contexts(domain_id, project_id).items():
+        for target_name, target in persona_targets.items():
+            yield persona, context, target_name, target
+
+# vi: ts=4 et:
@@ -0,0 +1,192 @@
+# Copyright 2024 the Unikorn Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Timing spans for the rule inheritance pipeline.
+"""
+
+import collections
+import contextlib
+import functools
+import time
+
+# Span name prefixes used for aggregation.
+NAMESPACE_PREFIX = 'namespace:'
+RULE_PREFIX = 'rule:'
+
+
+class Profile:
+    """
+    Collects nested timing spans.  Each distinct stack of span names records
+    a call count, the time spent in the span itself and the time including
+    any nested spans.  This is not thread safe, it's intended to profile a
+    single entry point load.
+    """
+
+    def __init__(self):
+        self.names = []
+        self.frames = []
+        self.calls = collections.Counter()
+        self.self_seconds = collections.defaultdict(float)
+        self.total_seconds = collections.defaultdict(float)
+
+    def enter(self, name):
+        """Open a span"""
+
+        self.names.append(name)
+        self.frames.append([time.perf_counter(), 0.0])
+
+    def exit(self):
+        """Close the innermost span"""
+
+        began, children = self.frames.pop()
+        elapsed = time.perf_counter() - began
+
+        stack = tuple(self.names)
+        self.names.pop()
+
+        self.calls[stack] += 1
+        self.self_seconds[stack] += elapsed - children
+        self.total_seconds[stack] += elapsed
+
+        if self.frames:
+            self.frames[-1][1] += elapsed
+
+    def _aggregate(self, key):
+        """
+        Sum the inclusive time of the outermost span on each stack that the
+        key function selects.
+        """
+
+        totals = collections.defaultdict(float)
+
+        for stack, seconds in self.total_seconds.items():
+            selected = key(stack)
+            # Only count the outermost instance, recursion would double count.
+            if selected is not None and key(stack[:-1]) != selected:
+                totals[selected] += seconds
+
+        return dict(totals)
+
+    def namespaces(self):
+        """Returns the total time spent per namespace"""
+
+        def key(stack):
+            if stack and stack[0].startswith(NAMESPACE_PREFIX):
+                return stack[0][len(NAMESPACE_PREFIX):]
+            return None
+
+        return self._aggregate(key)
+
+    def rules(self):
+        """Returns the total time spent per namespace and inherited rule"""
+
+        def key(stack):
+            namespace = None
+            for name in stack:
+                if name.startswith(NAMESPACE_PREFIX):
+                    namespace = name[len(NAMESPACE_PREFIX):]
+                elif name.startswith(RULE_PREFIX):
+                    return (namespace, name[len(RULE_PREFIX):])
+            return None
+
+        return self._aggregate(key)
+
+    def functions(self):
+        """Returns the call count and self time per span name"""
+
+        functions = collections.defaultdict(lambda: [0, 0.0])
+
+        for stack, seconds in self.self_seconds.items():
+            functions[stack[-1]][0] += self.calls[stack]
+            functions[stack[-1]][1] += seconds
+
+        return {name: tuple(value) for name, value in functions.items()}
+
+    def collapsed(self):
+        """
+        Returns the profile in the collapsed stack format consumed by
+        flamegraph.pl and compatible tools, weighted in microseconds.
+        """
+
+        lines = []
+
+        for stack, seconds in sorted(self.self_seconds.items()):
+            lines.append(f'{";".join(stack)} {round(seconds * 1000000)}')
+
+        return '\n'.join(lines) + '\n'
+
+
+# The active profile, None when profiling is disabled.
+_profile = None  # pylint: disable=invalid-name
+
+
+def start():
+    """Start collecting spans into a new profile"""
+
+    global _profile  # pylint: disable=global-statement
+
+    _profile = Profile()
+
+    return _profile
+
+
+def stop():
+    """Stop collecting spans and return the profile"""
+
+    global _profile  # pylint: disable=global-statement
+
+    profile, _profile = _profile, None
+
+    return profile
+
+
+@contextlib.contextmanager
+def span(name):
+    """Time a block of code, if profiling"""
+
+    profile = _profile
+
+    if profile is None:
+        yield
+        return
+
+    profile.enter(name)
+
+    try:
+        yield
+    finally:
+        profile.exit()
+
+
+def traced(func):
+    """Time every call to a function, if profiling"""
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        profile = _profile
+
+        if profile is None:
+            return func(*args, **kwargs)
+
+        profile.enter(func.__name__)
+
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profile.exit()
+
+    return wrapper
+
+# vi: ts=4 et:
@@ -0,0 +1,236 @@
+# Copyright 2024 the Unikorn Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Dead and unreachable branch elimination.
+
+Once upstream helpers are inlined, rules can contain branches that can never
+be true, such as system scope checks when a deployment never issues system
+scoped tokens, or that are redundant, like "role:admin and role:admin".  This
+simplifies expanded rules for a deployment profile and reports what it
+removed.  Opaque checks are never assumed to be deterministic, so are never
+removed unless a sibling decides the result on its own.
+"""
+
+# pylint: disable=line-too-long
+
+import os
+
+from oslo_policy import policy
+from unikorn_openstack_policy import compiler
+from unikorn_openstack_policy import reorder
+
+# When set, rules are simplified for this deployment profile.
+PROFILE_ENV = 'UNIKORN_POLICY_PROFILE'
+
+# Deployment profiles, mapping to generic check kinds that are never true.
+PROFILES = {
+    # Only algebraic simplification.
+    'none': frozenset(),
+    # System scoped tokens are never issued.
+    'no-system-scope': frozenset(['system_scope', 'system']),
+}
+
+
+def _never(profile):
+    """Returns the check kinds never true for a profile, which must exist"""
+
+    if profile not in PROFILES:
+        raise ValueError(f'unknown profile {profile}, expected one of {", ".join(sorted(PROFILES))}')
+
+    return PROFILES[profile]
+
+
+def _key(ir):
+    """Returns a key identifying equivalent IR, or None if it's opaque"""
+
+    if reorder.opaque(ir):
+        return None
+
+    return reorder.canonical(ir)
+
+
+def _negation(ir):
+    """Returns the key of the negation of IR"""
+
+    if ir[0] == compiler.NOT:
+        return _key(ir[1])
+
+    key = _key(ir)
+
+    return None if key is None else 'not ' + key
+
+
+class Pruner:
+    """
+    Simplifies IR for a profile, recording what was removed.
+    """
+
+    # pylint: disable=too-few-public-methods
+
+    def __init__(self, profile):
+        self.never = _never(profile)
+        self.removed = []
+
+    def _remove(self, ir, reason):
+        """Record a removed subtree"""
+
+        self.removed.append(f'{reason}: {compiler.to_check_str(ir)}')
+
+    def simplify(self, ir):
+        """Returns simplified IR"""
+
+        kind = ir[0]
+
+        if kind == compiler.GENERIC and ir[1] in self.never:
+            self._remove(ir, 'never true for profile')
+            return [compiler.FALSE]
+
+        if kind == compiler.NOT:
+            return self._simplify_not(ir)
+
+        if kind in (compiler.AND, compiler.OR):
+            return self._simplify_junction(ir)
+
+        return ir
+
+    def _simplify_not(self, ir):
+        """Simplify a negation"""
+
+        child = self.simplify(ir[1])
+
+        if child[0] == compiler.TRUE:
+            return [compiler.FALSE]
+
+        if child[0] == compiler.FALSE:
+            return [compiler.TRUE]
+
+        if child[0] == compiler.NOT:
+            return child[1]
+
+        return [compiler.NOT, child]
+
+    def _simplify_junction(self, ir):
+        """Simplify an and/or"""
+
+        # pylint: disable=too-many-branches
+
+        kind = ir[0]
+
+        # The identity is dropped, the annihilator decides the result.
+        identity, annihilator = (compiler.TRUE, compiler.FALSE) if kind == compiler.AND else (compiler.FALSE, compiler.TRUE)
+        dual = compiler.OR if kind == compiler.AND else compiler.AND
+
+        children = []
+        seen = set()
+
+        for child in reorder.flatten_children(ir):
+            child = self.simplify(child)
+
+            if child[0] == kind:
+                candidates = child[1:]
+            else:
+                candidates = [child]
+
+            for candidate in candidates:
+                if candidate[0] == identity:
+                    continue
+
+                if candidate[0] == annihilator:
+                    self._remove(ir, 'decided by constant')
+                    return [annihilator]
+
+                key = _key(candidate)
+
+                if key is not None:
+                    if key in seen:
+                        self._remove(candidate, 'duplicate')
+                        continue
+
+                    seen.add(key)
+
+                children.append(candidate)
+
+        # Terms and their negations decide the result.
+        for child in children:
+            negation = _negation(child)
+            if negation is not None and negation in seen:
+                self._remove(ir, 'contradiction' if kind == compiler.AND else 'tautology')
+                return [annihilator]
+
+        # Absorption, a term absorbs any dual that contains it.
+        absorbed = []
+
+        for child in children:
+            if child[0] == dual and any(_key(grandchild) in seen for grandchild in child[1:]):
+                self._remove(child, 'subsumed')
+                continue
+
+            absorbed.append(child)
+
+        if not absorbed:
+            return [identity]
+
+        if len(absorbed) == 1:
+            return absorbed[0]
+
+        return [kind] + absorbed
+
+
+def prune_ir(ir, profile):
+    """Returns simplified IR and a list of what was removed"""
+
+    pruner = Pruner(profile)
+
+    return pruner.simplify(ir), pruner.removed
+
+
+def _prune_rules(rules, profile, report):
+    """Lazily simplify rules for the profile, if any"""
+
+    for rule in rules:
+        if profile:
+            ir, removed = prune_ir(compiler.to_ir(rule.check), profile)
+
+            if removed:
+                rule = policy.RuleDefault(
+                    name=rule.name,
+                    check_str=compiler.to_check_str(ir),
+                    description=rule.description,
+                    scope_types=rule.scope_types,
+                )
+
+                if report is not None:
+                    report[rule.name] = removed
+
+        yield rule
+
+
+def prune_rules(rules, profile=None, report=None):
+    """
+    Lazily simplify rules for the profile, by default the one configured in
+    the environment if any.  What was removed is added to the report
+    dictionary, keyed by rule name, if one is given.  Unknown profiles raise
+    a ValueError immediately, rather than when the rules are consumed.
+    """
+
+    if profile is None:
+        profile = os.environ.get(PROFILE_ENV)
+
+    if profile:
+        _never(profile)
+
+    return _prune_rules(rules, profile, report)
+
+# vi: ts=4 et:
@@ -0,0 +1,141 @@
+# Copyright 2024 the Unikorn Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Registry of service namespaces.
+
+Services are registered by the name of the module that defines them, so
+namespaces can be enumerated without importing anything.  A service module
+is only imported when its namespace is first requested, and its upstream
+rules only when they are first expanded, so tools touching one namespace
+don't pay for the others.
+
+A service module defines its namespace, upstream distribution and rules, and
+exposes the functions of a Service bound to them, e.g.:
+
+    SERVICE = registry.Service(NAMESPACE, UPSTREAM, 'nova.policies', rules)
+
+    list_rules = SERVICE.list_rules
+"""
+
+# pylint: disable=line-too-long
+
+import importlib
+import threading
+
+from oslo_policy import policy
+from unikorn_openstack_policy import audit
+from unikorn_openstack_policy import base
+from unikorn_openstack_policy import cache
+from unikorn_openstack_policy import config
+from unikorn_openstack_policy import instrumentation
+from unikorn_openstack_policy import metrics
+from unikorn_openstack_policy import prune
+from unikorn_openstack_policy import reorder
+from unikorn_openstack_policy import shadow
+
+# Service modules, keyed by namespace, these must match the entry points in
+# pyproject.toml.
+SERVICES = {
+    'unikorn_openstack_policy_blockstorage': 'unikorn_openstack_policy.blockstorage',
+    'unikorn_openstack_policy_compute': 'unikorn_openstack_policy.compute',
+    'unikorn_openstack_policy_network': 'unikorn_openstack_policy.network',
+}
+
+# Serializes first imports, so concurrent requests import a service once.
+_lock = threading.Lock()
+
+
+def namespaces():
+    """Returns every registered namespace, without importing any service"""
+
+    return sorted(SERVICES)
+
+
+def load(namespace):
+    """Returns the service module for a namespace, importing it on first use"""
+
+    with _lock:
+        return importlib.import_module(SERVICES[namespace])
+
+
+class Service:
+    """
+    A service's rules, expanded against its upstream ones on demand.
+    """
+
+    def __init__(self, namespace, upstream, source, rules):
+        """
+        Define a service, source is the upstream module whose list_rules()
+        returns the rules we inherit from.
+        """
+
+        self.namespace = namespace
+        self.upstream = upstream
+        self.source = source
+        self.rules = rules
+
+    def list_upstream_rules(self):
+        """Returns the upstream rules we inherit from"""
+
+        # Imported lazily so our rules can be expanded against snapshots of
+        # upstream rules without the upstream service installed.
+        return list(importlib.import_module(self.source).list_rules())
+
+    def expand_rules(self, theirs):
+        """
+        Expand our rules against the upstream ones, simplifying for the
+        deployment profile and applying any ordering.
+        """
+
+        return reorder.reorder_rules(self.namespace, prune.prune_rules(base.inherit_rules(self.rules, theirs)))
+
+    def _inherit_rules(self):
+        """Expand our rules against the installed upstream ones"""
+
+        return self.expand_rules(self.list_upstream_rules())
+
+    def list_rules(self):
+        """Implements the "oslo.policy.policies" entry point"""
+
+        # For every defined rule, look for a corresponding one sourced directly
+        # from upstream, this means we can augment the exact rule defined for a
+        # specific version of the service.
+        return cache.list_rules(self.namespace, self.upstream, self.rules, self._inherit_rules)
+
+    def get_enforcer(self, conf=None):
+        """
+        Implements the "oslo.policy.enforcer" entry point, building against
+        the given configuration, or the one selected by the environment.
+        """
+
+        if conf is None:
+            conf = config.get()
+
+        enforcer = policy.Enforcer(conf=conf)
+        enforcer.register_defaults(self.list_rules())
+
+        # Only decisions on the rules we override are audited.
+        return instrumentation.instrument(enforcer, [
+            metrics.observer(enforcer, self.namespace),
+            shadow.observer(enforcer, self.namespace),
+            audit.observer(self.namespace, [rule.name for rule in self.rules]),
+        ])
+
+    def get_compiled_enforcer(self):
+        """Returns a compiled enforcer for the default rules"""
+
+        return cache.get_compiled_enforcer(self.namespace, self.upstream, self.rules, self._inherit_rules)
+
+# vi: ts=4 et:
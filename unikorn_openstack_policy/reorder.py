@@ -0,0 +1,169 @@
+# Copyright 2024 the Unikorn Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Profile guided reordering of rule branches.
+
+Inherited rules always check our clause first, so the common upstream
+personas fail that before getting to the clause that decides for them.
+Branch statistics gathered by the metrics instrumentation count how often
+each child of an "or" is true, and each child of an "and" is false, i.e.
+how often it decides the result.  Children are then ordered most decisive
+first.  Checks have no side effects so this is semantically equivalent,
+though anything opaque is left alone to be safe.
+
+Children are identified by a canonical form of their check string, which is
+independent of ordering, so statistics gathered from a reordered rule still
+apply and the ordering is reproducible.
+"""
+
+# pylint: disable=line-too-long
+
+import json
+import os
+
+from oslo_policy import _checks
+from oslo_policy import policy
+from unikorn_openstack_policy import compiler
+
+# When set, rules are reordered according to this ordering file.
+ORDERING_ENV = 'UNIKORN_POLICY_ORDERING'
+
+
+def flatten_children(ir):
+    """Returns the children of an and/or node with nested ones of the same kind flattened"""
+
+    children = []
+
+    for child in ir[1:]:
+        if child[0] == ir[0]:
+            children.extend(flatten_children(child))
+        else:
+            children.append(child)
+
+    return children
+
+
+def canonical(ir):
+    """Returns a check string for IR that is independent of child ordering and nesting"""
+
+    kind = ir[0]
+
+    if kind in (compiler.AND, compiler.OR):
+        return '(' + f' {kind} '.join(sorted(canonical(child) for child in flatten_children(ir))) + ')'
+
+    if kind == compiler.NOT:
+        return 'not ' + canonical(ir[1])
+
+    return compiler.to_check_str(ir)
+
+
+def opaque(ir):
+    """Returns whether IR contains anything we don't understand"""
+
+    if ir[0] == compiler.OPAQUE:
+        return True
+
+    return any(opaque(child) for child in ir[1:] if isinstance(child, list))
+
+
+def observe(check, target, creds, enforcer, counts):
+    """
+    Count the children of and/or nodes in a parsed check tree that decide
+    the result for the given target and credentials.
+    """
+
+    if isinstance(check, (_checks.AndCheck, _checks.OrCheck)):
+        kind = compiler.OR if isinstance(check, _checks.OrCheck) else compiler.AND
+
+        for child in check.rules:
+            result = bool(_checks._check(child, target, creds, enforcer, None))  # pylint: disable=protected-access
+
+            if result == (kind == compiler.OR):
+                counts[f'{kind} {canonical(compiler.to_ir(child))}'] += 1
+
+            observe(child, target, creds, enforcer, counts)
+
+    elif isinstance(check, _checks.NotCheck):
+        observe(check.rule, target, creds, enforcer, counts)
+
+
+def reorder_ir(ir, scores):
+    """
+    Returns IR with and/or children sorted by descending score, nested nodes
+    of the same kind are flattened first.  Ties retain their order.
+    """
+
+    kind = ir[0]
+
+    if kind == compiler.NOT:
+        return [kind, reorder_ir(ir[1], scores)]
+
+    if kind not in (compiler.AND, compiler.OR) or opaque(ir):
+        return ir
+
+    children = [reorder_ir(child, scores) for child in flatten_children(ir)]
+    children.sort(key=lambda child: -scores.get(f'{kind} {canonical(child)}', 0))
+
+    return [kind] + children
+
+
+def ordering_from_metrics(metrics):
+    """
+    Returns an ordering, from the JSON metrics dump, as a dictionary of
+    namespace to rule to branch scores.
+    """
+
+    ordering = {}
+
+    for namespace, namespace_metrics in metrics.items():
+        for rule, rule_metrics in namespace_metrics.items():
+            if rule_metrics.get('branches'):
+                ordering.setdefault(namespace, {})[rule] = rule_metrics['branches']
+
+    return ordering
+
+
+def load(namespace):
+    """Returns the rule scores for a namespace from the ordering file, if set"""
+
+    path = os.environ.get(ORDERING_ENV)
+    if not path:
+        return {}
+
+    with open(path, encoding='utf-8') as data:
+        return json.load(data).get(namespace, {})
+
+
+def reorder_rules(namespace, rules):
+    """Lazily reorder rules according to the ordering file, if set"""
+
+    ordering = load(namespace)
+
+    for rule in rules:
+        scores = ordering.get(rule.name)
+
+        if scores:
+            check_str = compiler.to_check_str(reorder_ir(compiler.to_ir(rule.check), scores))
+
+            rule = policy.RuleDefault(
+                name=rule.name,
+                check_str=check_str,
+                description=rule.description,
+                scope_types=rule.scope_types,
+            )
+
+        yield rule
+
+# vi: ts=4 et:
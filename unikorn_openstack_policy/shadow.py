@@ -0,0 +1,204 @@
+# Copyright 2024 the Unikorn Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Opt-in shadow evaluation of optimized enforcers.
+
+A sampled fraction of decisions made by a stock enforcer are also made by a
+candidate, by default compiled from the stock enforcer's loaded rules, and
+any disagreement is recorded.  The stock decision is always the one
+returned, and the candidate is never allowed to raise.  Unsampled decisions
+cost a single random number, so overhead is bounded by the sampling rate.
+"""
+
+# pylint: disable=line-too-long
+
+import atexit
+import collections
+import json
+import os
+import random
+import threading
+import time
+
+from unikorn_openstack_policy import compiler
+from unikorn_openstack_policy import credentials
+from unikorn_openstack_policy import files
+
+# When set, enforcers are shadowed for this fraction of decisions.
+SHADOW_ENV = 'UNIKORN_POLICY_SHADOW'
+
+# When set, the shadow report is written to this JSON file on exit.
+SHADOW_REPORT_ENV = 'UNIKORN_POLICY_SHADOW_REPORT'
+
+# How many of the most recent mismatches are retained per namespace.
+MAX_MISMATCHES = 100
+
+
+class NamespaceReport:
+    """
+    Shadow results for a single namespace.
+    """
+
+    # pylint: disable=too-few-public-methods
+
+    def __init__(self):
+        self.samples = 0
+        self.mismatched = 0
+        self.stock_seconds = 0.0
+        self.candidate_seconds = 0.0
+        self.mismatches = collections.deque(maxlen=MAX_MISMATCHES)
+
+    def observe(self, rule, creds, stock, candidate, stock_seconds, candidate_seconds):
+        """Record a single shadowed decision"""
+
+        # pylint: disable=too-many-arguments,too-many-positional-arguments
+
+        self.samples += 1
+        self.stock_seconds += stock_seconds
+        self.candidate_seconds += candidate_seconds
+
+        if stock != candidate:
+            self.mismatched += 1
+            self.mismatches.append({
+                'rule': rule,
+                'signature': credentials.signature(creds),
+                'stock': stock,
+                'candidate': candidate,
+            })
+
+
+class Report:
+    """
+    Shadow results for all shadowed enforcers, keyed by namespace.
+    """
+
+    def __init__(self, rate):
+        self.lock = threading.Lock()
+        self.rate = rate
+        self.namespaces = {}
+
+    def namespace(self, name):
+        """
+        Returns the report for a namespace, creating it if required.  The
+        caller must hold the lock.
+        """
+
+        namespace_report = self.namespaces.get(name)
+        if namespace_report is None:
+            namespace_report = self.namespaces[name] = NamespaceReport()
+
+        return namespace_report
+
+    def to_dict(self):
+        """Returns the report as a JSON serializable dictionary"""
+
+        with self.lock:
+            return {
+                name: {
+                    'rate': self.rate,
+                    'samples': namespace_report.samples,
+                    'mismatched': namespace_report.mismatched,
+                    'stock_seconds': namespace_report.stock_seconds,
+                    'candidate_seconds': namespace_report.candidate_seconds,
+                    'mean_latency_delta_seconds': (namespace_report.candidate_seconds - namespace_report.stock_seconds) / namespace_report.samples if namespace_report.samples else 0.0,
+                    'mismatches': list(namespace_report.mismatches),
+                }
+                for name, namespace_report in self.namespaces.items()
+            }
+
+    def dump(self, path):
+        """Atomically write the report to a file as JSON"""
+
+        with files.atomic_write(path) as out:
+            json.dump(self.to_dict(), out, indent=2)
+
+
+# The global report, None when shadowing is disabled.
+_report = None  # pylint: disable=invalid-name
+
+
+def enable(rate, path=None):
+    """
+    Enable shadowing of enforcers created from now on, for the given
+    fraction of decisions.  If a path is given, the report is written there
+    on exit.
+    """
+
+    global _report  # pylint: disable=global-statement
+
+    if _report is not None:
+        return _report
+
+    _report = Report(rate)
+
+    if path:
+        atexit.register(_report.dump, path)
+
+    return _report
+
+
+def report():
+    """Returns the global report, or None if disabled"""
+
+    return _report
+
+
+def observer(enforcer, namespace, candidate=compiler.CompiledEnforcer.from_enforcer):
+    """
+    Returns an observer shadowing the enforcer's decisions with a candidate
+    if enabled, otherwise None.  The candidate factory is called with the
+    stock enforcer, and again whenever its rules reload.
+    """
+
+    if _report is None:
+        return None
+
+    target_report = _report
+    rate = target_report.rate
+
+    lock = threading.Lock()
+    state = {'rules': None, 'candidate': None}
+
+    def observe(decision):
+        if random.random() >= rate:
+            return
+
+        start = time.perf_counter()
+
+        try:
+            with lock:
+                if state['rules'] is not enforcer.rules:
+                    state['candidate'] = candidate(enforcer)
+                    state['rules'] = enforcer.rules
+
+                shadow = state['candidate']
+
+            start = time.perf_counter()
+            candidate_result = bool(shadow.enforce(decision.rule, decision.target, decision.creds))
+        except Exception as exc:  # pylint: disable=broad-exception-caught
+            candidate_result = f'{type(exc).__name__}: {exc}'
+
+        candidate_seconds = time.perf_counter() - start
+
+        with target_report.lock:
+            target_report.namespace(namespace).observe(decision.rule, decision.creds, decision.result, candidate_result, decision.seconds, candidate_seconds)
+
+    return observe
+
+
+if os.environ.get(SHADOW_ENV):
+    enable(float(os.environ[SHADOW_ENV]), os.environ.get(SHADOW_REPORT_ENV))
+
+# vi: ts=4 et:
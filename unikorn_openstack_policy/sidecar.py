@@ -0,0 +1,392 @@
+# Copyright 2024 the Unikorn Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Local policy decision sidecar.
+
+A long running daemon keeps enforcers warm and answers batches of decisions
+over a Unix domain socket, so callers don't pay for a cold start per check.
+
+Frames are a 4 byte big endian length, followed by that many bytes of JSON.
+A batch of decisions is requested with:
+
+    {"id": 1, "credentials": {...}, "target": {...},
+     "decisions": [{"namespace": "...", "rule": "...", "target": {...}}]}
+
+Credentials are Oslo policy values, as from RequestContext.to_policy_values,
+and a decision's target defaults to the batch's.  The response is:
+
+    {"id": 1, "results": [true, false], "errors": {"1": "..."}}
+
+Decisions that cannot be made are denied, with the reason in errors keyed by
+index.  Rule names for each namespace are requested with:
+
+    {"id": 2, "op": "rules"}
+
+Clients may pipeline requests, responses are sent in request order.
+"""
+
+# pylint: disable=line-too-long
+
+import errno
+import json
+import os
+import socket
+import socketserver
+import stat
+import struct
+import threading
+import time
+
+from unikorn_openstack_policy import compiler
+from unikorn_openstack_policy import credentials
+from unikorn_openstack_policy import registry
+from unikorn_openstack_policy import warmup
+
+# Frame length header.
+_HEADER = struct.Struct('!I')
+
+# Frames larger than this are rejected and the connection closed.
+MAX_FRAME = 16 * 1024 * 1024
+
+
+def read_frame(stream):
+    """Returns the next decoded frame, or None at the end of the stream"""
+
+    header = stream.read(_HEADER.size)
+    if not header:
+        return None
+
+    if len(header) < _HEADER.size:
+        raise EOFError('truncated frame header')
+
+    (length,) = _HEADER.unpack(header)
+    if length > MAX_FRAME:
+        raise ValueError(f'frame of {length} bytes exceeds {MAX_FRAME}')
+
+    data = stream.read(length)
+    if len(data) < length:
+        raise EOFError('truncated frame')
+
+    return json.loads(data)
+
+
+def write_frame(stream, message):
+    """Encode and write a frame"""
+
+    data = json.dumps(message, separators=(',', ':')).encode()
+
+    stream.write(_HEADER.pack(len(data)) + data)
+
+
+def load_enforcers(names=None, compiled=False):
+    """
+    Returns warm enforcers for every namespace, or just the ones named.
+    Compiled enforcers are faster, but do not consult policy files.
+    """
+
+    if not compiled:
+        return {name: warmup.get_enforcer(name) for name in warmup.warm_up(names)}
+
+    if names is None:
+        names = registry.namespaces()
+
+    return {name: registry.load(name).get_compiled_enforcer() for name in names}
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    """
+    Answers framed requests until the client disconnects.
+    """
+
+    def handle(self):
+        while True:
+            try:
+                request = read_frame(self.rfile)
+            except (EOFError, ValueError):
+                # Framing is lost, or a frame is too big or isn't JSON.
+                return
+
+            if request is None:
+                return
+
+            try:
+                response = self.server.respond(request)
+            except Exception as exc:  # pylint: disable=broad-exception-caught
+                # Never drop the client, or the requests pipelined behind it.
+                response = {'id': request.get('id') if isinstance(request, dict) else None, 'error': f'{type(exc).__name__}: {exc}'}
+
+            # Writes are unbuffered, so each response is sent immediately.
+            write_frame(self.wfile, response)
+
+
+def _listening(path):
+    """Returns whether a server is accepting connections on a Unix socket"""
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+        try:
+            probe.connect(path)
+        except ConnectionRefusedError:
+            return False
+
+    return True
+
+
+def _invalid_batch(request):
+    """Returns why a batch of decisions is malformed, or None"""
+
+    for field in ('credentials', 'target'):
+        if not isinstance(request.get(field) or {}, dict):
+            return f'{field} must be an object'
+
+    decisions = request.get('decisions') or []
+
+    if not isinstance(decisions, list) or not all(isinstance(decision, dict) for decision in decisions):
+        return 'decisions must be a list of objects'
+
+    return None
+
+
+class Server(socketserver.ThreadingUnixStreamServer):
+    """
+    Serves decisions from enforcers, keyed by namespace, on a Unix socket
+    with the given permissions, by default only accessible to our user.
+    Stale sockets from previous instances are replaced, but a socket another
+    server is listening on is refused.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, path, enforcers, mode=0o600):
+        self.path = path
+        self.enforcers = enforcers
+        self.mode = mode
+
+        try:
+            if stat.S_ISSOCK(os.stat(path).st_mode):
+                if _listening(path):
+                    raise OSError(errno.EADDRINUSE, os.strerror(errno.EADDRINUSE), path)
+
+                os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+        super().__init__(path, _Handler)
+
+    def server_bind(self):
+        super().server_bind()
+
+        os.chmod(self.path, self.mode)
+
+    def server_close(self):
+        super().server_close()
+
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+    def respond(self, request):
+        """Returns the response to a decoded request"""
+
+        if not isinstance(request, dict):
+            return {'id': None, 'error': 'request must be an object'}
+
+        op = request.get('op', 'decide')
+
+        if op == 'rules':
+            return {'id': request.get('id'), 'rules': {name: sorted(enforcer.rules) for name, enforcer in self.enforcers.items()}}
+
+        if op == 'decide':
+            error = _invalid_batch(request)
+            if error:
+                return {'id': request.get('id'), 'error': error}
+
+            return self.decide(request)
+
+        return {'id': request.get('id'), 'error': f'unknown op {op}'}
+
+    def decide(self, request):
+        """Returns the response to a batch of decisions"""
+
+        # Credentials and the batch's target are shared by compiled
+        # enforcers, so common subtrees are evaluated once per batch.
+        creds = credentials.view(request.get('credentials') or {})
+        target = request.get('target') or {}
+        substitutions = compiler.Substitutions(target)
+
+        results = []
+        errors = {}
+
+        for index, decision in enumerate(request.get('decisions') or []):
+            try:
+                enforcer = self.enforcers[decision['namespace']]
+
+                if 'target' in decision:
+                    decision_target = decision['target']
+                elif isinstance(enforcer, compiler.CompiledEnforcer):
+                    decision_target = substitutions
+                else:
+                    decision_target = target
+
+                results.append(bool(enforcer.enforce(decision['rule'], decision_target, creds)))
+            except Exception as exc:  # pylint: disable=broad-exception-caught
+                results.append(False)
+                errors[str(index)] = f'{type(exc).__name__}: {exc}'
+
+        response = {'id': request.get('id'), 'results': results}
+
+        if errors:
+            response['errors'] = errors
+
+        return response
+
+
+class Client:
+    """
+    Synchronous sidecar client.  Requests may be pipelined by sending several
+    before receiving their responses, which arrive in order.
+    """
+
+    def __init__(self, path):
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.connect(path)
+
+        self.rfile = self.socket.makefile('rb')
+        self.wfile = self.socket.makefile('wb')
+        self.next_id = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Close the connection"""
+
+        self.wfile.close()
+        self.rfile.close()
+        self.socket.close()
+
+    def send(self, request, flush=True):
+        """Send a request, returning its id"""
+
+        self.next_id += 1
+
+        write_frame(self.wfile, {**request, 'id': self.next_id})
+
+        if flush:
+            self.wfile.flush()
+
+        return self.next_id
+
+    def receive(self):
+        """Receive the next response"""
+
+        response = read_frame(self.rfile)
+        if response is None:
+            raise EOFError('connection closed by sidecar')
+
+        return response
+
+    def decide(self, creds, decisions, target=None):
+        """Returns the results of a batch of decisions, see the module documentation"""
+
+        self.send({'credentials': creds, 'target': target or {}, 'decisions': decisions})
+
+        return self.receive()
+
+    def rules(self):
+        """Returns the rule names for each namespace"""
+
+        self.send({'op': 'rules'})
+
+        return self.receive()['rules']
+
+
+def _percentile(ordered, fraction):
+    """Returns a percentile of ordered samples"""
+
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def load_test(path, batches, connections=4, requests=1000, pipeline=8):
+    """
+    Load test a running sidecar.  Each connection sends requests, cycling
+    through the batch request bodies, keeping up to pipeline in flight.
+    Returns throughput and latency statistics.
+    """
+
+    latencies = []
+    decisions = []
+    lock = threading.Lock()
+
+    def worker(offset):
+        local = []
+        count = 0
+
+        with Client(path) as client:
+            in_flight = []
+
+            for index in range(requests):
+                batch = batches[(offset + index) % len(batches)]
+
+                client.send(batch)
+                in_flight.append(time.perf_counter())
+                count += len(batch['decisions'])
+
+                if len(in_flight) >= pipeline:
+                    client.receive()
+                    local.append(time.perf_counter() - in_flight.pop(0))
+
+            while in_flight:
+                client.receive()
+                local.append(time.perf_counter() - in_flight.pop(0))
+
+        with lock:
+            latencies.extend(local)
+            decisions.append(count)
+
+    threads = [threading.Thread(target=worker, args=(offset,)) for offset in range(connections)]
+
+    start = time.perf_counter()
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    seconds = time.perf_counter() - start
+
+    latencies.sort()
+
+    return {
+        'connections': connections,
+        'pipeline': pipeline,
+        'requests': len(latencies),
+        'decisions': sum(decisions),
+        'seconds': seconds,
+        'requests_per_second': len(latencies) / seconds,
+        'decisions_per_second': sum(decisions) / seconds,
+        'latency_ms': {
+            'p50': _percentile(latencies, 0.5) * 1000,
+            'p90': _percentile(latencies, 0.9) * 1000,
+            'p99': _percentile(latencies, 0.99) * 1000,
+            'max': latencies[-1] * 1000,
+        },
+    }
+
+# vi: ts=4 et:
@@ -0,0 +1,152 @@
+# Copyright 2024 the Unikorn Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Snapshots of upstream default rules, per OpenStack release.
+
+Upstream rules are captured once, in an environment with that release's
+services installed, into a store laid out as <release>/<upstream>.json.gz.
+Our rules can then be expanded against any stored release, without importing
+the upstream service, and policy files for every release and namespace
+generated in parallel.
+"""
+
+# pylint: disable=line-too-long
+
+import concurrent.futures
+import gzip
+import importlib
+import importlib.metadata
+import json
+import os
+
+from oslo_policy import policy
+from unikorn_openstack_policy import files
+from unikorn_openstack_policy import generator
+
+# The default snapshot store directory.
+SNAPSHOTS_ENV = 'UNIKORN_POLICY_SNAPSHOTS'
+
+# Bump this when the snapshot format changes.
+FORMAT_VERSION = 1
+
+
+def _path(store, release, upstream):
+    """Returns the snapshot file for an upstream distribution's release"""
+
+    return os.path.join(store, release, upstream + '.json.gz')
+
+
+def capture(store, release, module):
+    """
+    Snapshot the installed upstream rules inherited by a service module, as
+    a named release.  Returns the snapshot file.
+    """
+
+    try:
+        version = importlib.metadata.version(module.UPSTREAM)
+    except importlib.metadata.PackageNotFoundError:
+        version = None
+
+    data = {
+        'format': FORMAT_VERSION,
+        'release': release,
+        'upstream': [module.UPSTREAM, version],
+        'rules': [[rule.name, rule.check_str, rule.description, rule.scope_types] for rule in module.list_upstream_rules()],
+    }
+
+    path = _path(store, release, module.UPSTREAM)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    # A fixed modification time, and no file name, keeps snapshots
+    # reproducible.
+    with files.atomic_write(path, 'wb') as raw:
+        with gzip.GzipFile(filename='', mode='wb', fileobj=raw, mtime=0) as out:
+            out.write(json.dumps(data, separators=(',', ':')).encode())
+
+    return path
+
+
+def releases(store):
+    """Returns every release in the store"""
+
+    if not os.path.isdir(store):
+        return []
+
+    return sorted(name for name in os.listdir(store) if os.path.isdir(os.path.join(store, name)))
+
+
+def has_snapshot(store, release, upstream):
+    """Returns whether the store has an upstream distribution's release"""
+
+    return os.path.exists(_path(store, release, upstream))
+
+
+def load(store, release, upstream):
+    """Returns the upstream rules for a release from the store"""
+
+    with gzip.open(_path(store, release, upstream), 'rb') as data:
+        snapshot = json.load(data)
+
+    if snapshot.get('format') != FORMAT_VERSION:
+        raise ValueError(f'unsupported snapshot format {snapshot.get("format")} for {upstream} {release}')
+
+    return [policy.RuleDefault(name=name, check_str=check_str, description=description, scope_types=scope_types) for name, check_str, description, scope_types in snapshot['rules']]
+
+
+def expand(store, release, module):
+    """Returns a service module's rules expanded against a stored release"""
+
+    return list(module.expand_rules(load(store, release, module.UPSTREAM)))
+
+
+def _build(store, release, module_name, path, output_format):
+    """Generate a single policy file, in a worker process"""
+
+    rules = expand(store, release, importlib.import_module(module_name))
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    with open(path, 'w', encoding='utf-8') as out:
+        generator.write(rules, out, output_format)
+
+    return path
+
+
+def build(store, output_dir, modules, names=None, output_format='yaml', workers=None):
+    """
+    Generate policy files for service modules, keyed by namespace, against
+    every stored release or just the ones named, across a process pool.
+    Files are written as <output_dir>/<release>/<namespace>.<format>, and
+    releases without a snapshot of a module's upstream are skipped.
+    Returns the files written.
+    """
+
+    # pylint: disable=too-many-arguments,too-many-positional-arguments
+
+    jobs = []
+
+    for release in names or releases(store):
+        for namespace, module_name in sorted(modules.items()):
+            if not has_snapshot(store, release, importlib.import_module(module_name).UPSTREAM):
+                continue
+
+            path = os.path.join(output_dir, release, f'{namespace}.{output_format}')
+            jobs.append((store, release, module_name, path, output_format))
+
+    with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+        return list(executor.map(_build, *zip(*jobs))) if jobs else []
+
+# vi: ts=4 et:
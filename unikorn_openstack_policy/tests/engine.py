@@ -0,0 +1,267 @@
+# Copyright 2024 the Unikorn Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Table driven policy test engine.
+
+Suites declare the expected decision for each rule, persona and target in a
+table, keyed by rule, then persona, then target, e.g.:
+
+    TABLE = {
+        'create_network': {
+            'project_manager': {'target': ALLOW, 'alt_target': DENY},
+        },
+    }
+
+Each service module's enforcer is built and loaded once per process, and
+cases may be sharded across a process pool.  Run directly to evaluate every
+table and report per case timings:
+
+    python -m unikorn_openstack_policy.tests.engine --workers 4 --timings
+"""
+
+# pylint: disable=line-too-long
+
+import argparse
+import collections
+import concurrent.futures
+import importlib
+import json
+import os
+import pkgutil
+import sys
+import time
+import unittest
+import uuid
+
+from oslo_policy import policy
+
+from unikorn_openstack_policy import config
+from unikorn_openstack_policy import personas
+
+# Expected decisions.
+ALLOW = True
+DENY = False
+
+# When set, table tests are sharded across this many processes.
+WORKERS_ENV = 'UNIKORN_POLICY_TEST_WORKERS'
+
+# A single expectation, the module is the service module's name so cases can
+# be sent to other processes.
+Case = collections.namedtuple('Case', ['module', 'rule', 'persona', 'target', 'expected'])
+
+
+class Result(collections.namedtuple('Result', ['case', 'allowed', 'error', 'seconds'])):
+    """
+    The outcome of evaluating a case.
+    """
+
+    __slots__ = ()
+
+    @property
+    def passed(self):
+        """Returns whether the case behaved as expected"""
+
+        return self.error is None and self.allowed == self.case.expected
+
+    def describe(self):
+        """Returns a description of the outcome"""
+
+        expected = 'allow' if self.case.expected else 'deny'
+
+        if self.error is not None:
+            return f'{self.case.persona} {self.case.rule} on {self.case.target}: expected {expected}, raised {self.error}'
+
+        actual = 'allow' if self.allowed else 'deny'
+
+        return f'{self.case.persona} {self.case.rule} on {self.case.target}: expected {expected}, got {actual}'
+
+
+def cases(module, table):
+    """Returns the cases in a table for a service module"""
+
+    return [
+        Case(module, rule, persona, target, expected)
+        for rule, persona_expectations in table.items()
+        for persona, target_expectations in persona_expectations.items()
+        for target, expected in target_expectations.items()
+    ]
+
+
+class _Fixtures:
+    """
+    Per process enforcers, personas and targets, shared by every case.
+    """
+
+    # pylint: disable=too-few-public-methods
+
+    def __init__(self):
+        domain_id = uuid.uuid4().hex
+        project_id = uuid.uuid4().hex
+
+        self.contexts = personas.contexts(domain_id, project_id)
+        self.targets = personas.targets(domain_id, project_id)
+        self.enforcers = {}
+
+    def enforcer(self, module):
+        """
+        Returns the loaded enforcer for a service module, building it once
+        against an isolated configuration.
+        """
+
+        enforcer = self.enforcers.get(module)
+        if enforcer is None:
+            enforcer = importlib.import_module(module).get_enforcer(config.isolated())
+            enforcer.load_rules()
+
+            self.enforcers[module] = enforcer
+
+        return enforcer
+
+
+_fixtures = None  # pylint: disable=invalid-name
+
+
+def fixtures():
+    """Returns this process's fixtures, creating them if required"""
+
+    global _fixtures  # pylint: disable=global-statement
+
+    if _fixtures is None:
+        _fixtures = _Fixtures()
+
+    return _fixtures
+
+
+def evaluate(case):
+    """Evaluate a single case, timing just the decision"""
+
+    shared = fixtures()
+
+    enforcer = shared.enforcer(case.module)
+    context = shared.contexts[case.persona]
+    target = shared.targets[case.target]
+    rule = policy.RuleCheck('rule', case.rule)
+
+    start = time.perf_counter()
+
+    try:
+        allowed = bool(enforcer.enforce(rule=rule, target=target, creds=context, do_raise=True))
+        error = None
+    except policy.PolicyNotAuthorized:
+        allowed = False
+        error = None
+    except Exception as exc:  # pylint: disable=broad-exception-caught
+        allowed = False
+        error = f'{type(exc).__name__}: {exc}'
+
+    return Result(case, allowed, error, time.perf_counter() - start)
+
+
+def _evaluate_shard(shard):
+    """Evaluate a shard of cases in a worker process"""
+
+    return [evaluate(case) for case in shard]
+
+
+def run(all_cases, workers=1):
+    """
+    Evaluate cases, in order, optionally sharded across a process pool.
+    Shards are contiguous runs of cases ordered by module, so each worker
+    builds as few enforcers as possible.
+    """
+
+    if workers <= 1:
+        return [evaluate(case) for case in all_cases]
+
+    ordered = sorted(all_cases, key=lambda case: case.module)
+    size = -(-len(ordered) // workers)
+    shards = [ordered[index:index + size] for index in range(0, len(ordered), size)]
+
+    with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+        results = {result.case: result for shard in executor.map(_evaluate_shard, shards) for result in shard}
+
+    return [results[case] for case in all_cases]
+
+
+class PolicyTableTests(unittest.TestCase):
+    """
+    Checks every case in a table, subclasses define the service module and
+    the table.
+    """
+
+    # The service module under test.
+    module = None
+    # Expected decisions, see the module documentation.
+    table = {}
+
+    def test_table(self):
+        """Every rule, persona and target gets the expected decision"""
+
+        if self.module is None:
+            self.skipTest('no table defined')
+
+        results = run(cases(self.module.__name__, self.table), int(os.environ.get(WORKERS_ENV, '1')))
+
+        for result in results:
+            with self.subTest(rule=result.case.rule, persona=result.case.persona, target=result.case.target):
+                self.assertTrue(result.passed, result.describe())
+
+
+def _tables():
+    """Returns the cases for every table in the test package"""
+
+    all_cases = []
+
+    for module_info in pkgutil.iter_modules(sys.modules[__package__].__path__):
+        if not module_info.name.startswith('test_'):
+            continue
+
+        module = importlib.import_module(f'{__package__}.{module_info.name}')
+
+        for value in vars(module).values():
+            if isinstance(value, type) and issubclass(value, PolicyTableTests) and value.module is not None:
+                all_cases.extend(cases(value.module.__name__, value.table))
+
+    return all_cases
+
+
+def main(argv=None):
+    """Evaluate every table, reporting failures and optionally timings"""
+
+    parser = argparse.ArgumentParser(prog='engine')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Processes to shard cases across')
+    parser.add_argument('--timings', action='store_true', help='Report per case timings as JSON, slowest first')
+    args = parser.parse_args(argv)
+
+    results = run(_tables(), args.workers)
+
+    if args.timings:
+        timings = [{**result.case._asdict(), 'seconds': result.seconds} for result in sorted(results, key=lambda result: -result.seconds)]
+        print(json.dumps(timings, indent=2))
+
+    failures = [result for result in results if not result.passed]
+
+    for result in failures:
+        print(result.describe(), file=sys.stderr)
+
+    print(f'{len(results) - len(failures)}/{len(results)} cases passed', file=sys.stderr)
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
+
+# vi: ts=4 et:
@@ -0,0 +1,174 @@
+# Copyright 2024 the Unikorn Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Unit tests for the decision audit log.
+"""
+
+# pylint: disable=line-too-long
+
+import json
+import os
+import tempfile
+import time
+import unittest
+
+from oslo_context.context import RequestContext
+from oslo_policy import policy
+
+from unikorn_openstack_policy import audit
+from unikorn_openstack_policy import base
+from unikorn_openstack_policy import config
+from unikorn_openstack_policy import credentials
+from unikorn_openstack_policy import instrumentation
+
+
+class RingTests(unittest.TestCase):
+    """
+    Checks the ring buffer overwrites and counts drops.
+    """
+
+    def test_drain(self):
+        """Records drain oldest first"""
+        ring = audit.Ring(4)
+
+        for record in range(3):
+            ring.push(record)
+
+        self.assertEqual(ring.drain(), ([0, 1, 2], 0))
+        self.assertEqual(ring.drain(), ([], 0))
+
+    def test_overflow(self):
+        """The oldest records are overwritten and counted"""
+        ring = audit.Ring(4)
+
+        for record in range(10):
+            ring.push(record)
+
+        self.assertEqual(ring.drain(), ([6, 7, 8, 9], 6))
+
+        ring.push(10)
+
+        self.assertEqual(ring.drain(), ([10], 0))
+
+
+class LogTests(unittest.TestCase):
+    """
+    Checks audited enforcers log decisions on named rules.
+    """
+
+    def setUp(self):
+        """Perform setup actions for all tests"""
+        self.directory = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.path = os.path.join(self.directory.name, 'audit.log')
+        self.log = audit.Log(self.path, 2)
+
+        enforcer = policy.Enforcer(conf=config.isolated())
+        enforcer.register_defaults(base.rules)
+
+        self.enforcer = instrumentation.instrument(enforcer, [audit.observer('test', ['is_project_manager'], self.log)])
+
+    def tearDown(self):
+        """Clean up after each test"""
+        self.directory.cleanup()
+
+    def lines(self):
+        """Returns the decoded log lines"""
+        with open(self.path, encoding='utf-8') as data:
+            return [json.loads(line) for line in data]
+
+    def test_records(self):
+        """Grants and denials of named rules are recorded, others are not"""
+        creds = {'roles': ['manager'], 'project_id': 'p1'}
+
+        self.assertTrue(self.enforcer.enforce('is_project_manager', {'project_id': 'p1'}, creds))
+        self.assertTrue(self.enforcer.enforce('is_manager', {}, creds))
+        self.assertRaises(
+                policy.PolicyNotAuthorized,
+                self.enforcer.enforce,
+                'is_project_manager', {'project_id': 'p2'}, creds, do_raise=True)
+
+        # Credentials are logged as they were when decided.
+        creds['roles'].append('admin')
+
+        self.log.flush()
+
+        lines = self.lines()
+        self.assertEqual([line[1:3] + line[5:] for line in lines], [['test', 'is_project_manager', True], ['test', 'is_project_manager', False]])
+        self.assertEqual(lines[0][3], credentials.signature({'roles': ['manager'], 'project_id': 'p1'}))
+        self.assertNotEqual(lines[0][4], lines[1][4])
+
+    def test_contexts(self):
+        """Contexts modified between decisions are logged with their current values"""
+        context = RequestContext(roles=['manager'], project_id='p1')
+
+        self.assertTrue(self.enforcer.enforce('is_project_manager', {'project_id': 'p1'}, context))
+
+        context.roles = ['member']
+
+        self.assertFalse(self.enforcer.enforce('is_project_manager', {'project_id': 'p1'}, context))
+
+        self.log.flush()
+
+        lines = self.lines()
+        self.assertEqual([line[5] for line in lines], [True, False])
+        self.assertNotEqual(lines[0][3], lines[1][3])
+        self.assertEqual(lines[1][3], credentials.signature(context.to_policy_values()))
+
+    def test_dropped(self):
+        """Lost records are logged and counted"""
+        for project_id in ('p1', 'p2', 'p3'):
+            self.enforcer.enforce('is_project_manager', {'project_id': project_id}, {'roles': ['manager'], 'project_id': 'p1'})
+
+        self.log.flush()
+
+        self.assertEqual(self.lines()[0], {'dropped': 1})
+        self.assertEqual(self.log.stats(), {'recorded': 2, 'dropped': 1})
+
+    def test_failures(self):
+        """Records that can't be written are counted as dropped, and flushing continues"""
+        path = self.path
+        self.log.path = os.path.join(self.directory.name, 'missing', 'audit.log')
+
+        self.enforcer.enforce('is_project_manager', {'project_id': 'p1'}, {'roles': ['manager'], 'project_id': 'p1'})
+        self.assertRaises(OSError, self.log.flush)
+        self.assertEqual(self.log.stats(), {'recorded': 0, 'dropped': 0})
+
+        self.log.start(0.01)
+
+        # Targets that can't be digested are dropped alone.
+        self.enforcer.enforce('is_project_manager', {'project_id': 'p1', 1: 'mixed'}, {'roles': ['manager'], 'project_id': 'p1'})
+        time.sleep(0.05)
+
+        self.log.path = path
+        self.enforcer.enforce('is_project_manager', {'project_id': 'p1'}, {'roles': ['manager'], 'project_id': 'p1'})
+
+        for _ in range(100):
+            if self.log.stats()['recorded']:
+                break
+
+            time.sleep(0.01)
+
+        lines = self.lines()
+        self.assertEqual(lines[0], {'dropped': 2})
+        self.assertEqual([line[2] for line in lines[1:]], ['is_project_manager'])
+        self.assertEqual(self.log.stats(), {'recorded': 1, 'dropped': 2})
+
+    def test_disabled(self):
+        """Enforcers are unaltered when auditing is disabled"""
+        enforcer = instrumentation.instrument(policy.Enforcer(conf=config.isolated()), [audit.observer('test', ['is_manager'])])
+
+        self.assertNotIn('enforce', vars(enforcer))
+
+# vi: ts=4 et:
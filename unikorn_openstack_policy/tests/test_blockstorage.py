@@ -16,119 +16,32 @@
 Unit tests for OpenStack policies.
 """
 
+# pylint: disable=duplicate-code
+
 from cinder.policies import quotas
-from oslo_policy import policy
 
 from unikorn_openstack_policy import blockstorage
-from unikorn_openstack_policy.tests import base
-
-class ProjectAdminBlockStoragePolicyTests(base.PolicyTestsBase):
-    """
-    Checks policy enforcement for project scoped admin role.
-    """
-
-    # Request context.
-    context = None
-
-    def setUp(self):
-        """Perform setup actions for all tests"""
-        self.setup(blockstorage.get_enforcer())
-        self.context = self.project_admin_context
-
-    def test_update_quota_sets(self):
-        """Admin can update quota sets"""
-        self.assertTrue(self.enforce(
-            quotas.UPDATE_POLICY, self.target, self.context))
-
-
-class DomainAdminBlockStoragePolicyTests(ProjectAdminBlockStoragePolicyTests):
-    """
-    Checks policy enforcement for domain scoped admin role
-    """
-
-    def setUp(self):
-        self.setup(blockstorage.get_enforcer())
-        self.context = self.domain_admin_context
-
-
-class ProjectManagerBlockStoragePolicyTests(base.PolicyTestsBase):
-    """
-    Checks policy enforcement for project scoped manager role
-    """
+from unikorn_openstack_policy.tests import engine
 
-    # Request context.
-    context = None
+# Expected decisions for every persona, in and out of their scope.
+TABLE = {
+    # Quotas can be updated by admins and project managers, in their project.
+    quotas.UPDATE_POLICY: {
+        'project_admin': {'target': engine.ALLOW},
+        'domain_admin': {'target': engine.ALLOW},
+        'project_manager': {'target': engine.ALLOW, 'alt_target': engine.DENY},
+        'domain_manager': {'target': engine.DENY, 'alt_target': engine.DENY},
+        'project_member': {'target': engine.DENY},
+        'domain_member': {'target': engine.DENY},
+    },
+}
 
-    def setUp(self):
-        """Perform setup actions for all tests"""
-        self.setup(blockstorage.get_enforcer())
-        self.context = self.project_manager_context
-
-    def test_update_quota_sets(self):
-        """Project manager can update quota sets"""
-        self.assertTrue(self.enforce(
-            quotas.UPDATE_POLICY, self.target, self.context))
-        self.assertRaises(
-                policy.PolicyNotAuthorized,
-                self.enforce,
-                quotas.UPDATE_POLICY, self.alt_target, self.context)
-
-
-class DomainManagerBlockStoragePolicyTests(base.PolicyTestsBase):
-    """
-    Checks policy enforcement for the manager role.
-    """
-
-    def setUp(self):
-        """Perform setup actions for all tests"""
-        self.setup(blockstorage.get_enforcer())
-        self.context = self.domain_manager_context
-
-    def test_update_quota_sets(self):
-        """Domain manager cannot update quota sets"""
-        self.assertRaises(
-                policy.PolicyNotAuthorized,
-                self.enforce,
-                quotas.UPDATE_POLICY, self.target, self.context)
-        self.assertRaises(
-                policy.PolicyNotAuthorized,
-                self.enforce,
-                quotas.UPDATE_POLICY, self.alt_target, self.context)
-
-
-class ProjectMemberBlockStoragePolicyTests(base.PolicyTestsBase):
-    """
-    Checks policy enforcement for the member role.
-    """
-
-    def setUp(self):
-        """Perform setup actions for all tests"""
-        self.setup(blockstorage.get_enforcer())
-        self.context = self.project_member_context
-
-    def test_update_quota_sets(self):
-        """Project member cannot create quota sets"""
-        self.assertRaises(
-                policy.PolicyNotAuthorized,
-                self.enforce,
-                quotas.UPDATE_POLICY, self.target, self.context)
-
-
-class DomainMemberBlockStoragePolicyTests(base.PolicyTestsBase):
+class BlockStoragePolicyTests(engine.PolicyTableTests):
     """
-    Checks policy enforcement for the member role.
+    Checks policy enforcement for every persona.
     """
 
-    def setUp(self):
-        """Perform setup actions for all tests"""
-        self.setup(blockstorage.get_enforcer())
-        self.context = self.domain_member_context
-
-    def test_update_quota_sets(self):
-        """Domain member cannot create quota sets"""
-        self.assertRaises(
-                policy.PolicyNotAuthorized,
-                self.enforce,
-                quotas.UPDATE_POLICY, self.target, self.context)
+    module = blockstorage
+    table = TABLE
 
 # vi: ts=4 et:
@@ -0,0 +1,148 @@
+# Copyright 2024 the Unikorn Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Unit tests for bulk authorization.
+"""
+
+# pylint: disable=line-too-long
+
+import json
+import os
+import random
+import tempfile
+import unittest
+from unittest import mock
+
+from oslo_policy import _checks
+from oslo_policy import policy
+
+from unikorn_openstack_policy import audit
+from unikorn_openstack_policy import base
+from unikorn_openstack_policy import bulk
+from unikorn_openstack_policy import config
+from unikorn_openstack_policy import fuzz
+from unikorn_openstack_policy import registry
+
+PROJECT_IDS = ['p1', 'p2', 'p3']
+
+# Scopes randomly given to fuzzed rules.
+SCOPE_TYPES = (None, ['project'], ['domain'], ['system'], ['project', 'domain'])
+
+# The rules this module overrides, acting as a service.
+rules = [
+    policy.RuleDefault(name='is_project_manager', check_str='rule:is_manager and project_id:%(project_id)s'),
+]
+
+
+def _enforcer(defaults):
+    """Returns a loaded enforcer for rules"""
+
+    enforcer = policy.Enforcer(conf=config.isolated())
+    enforcer.register_defaults(defaults)
+    enforcer.load_rules()
+
+    return enforcer
+
+
+class BulkTests(unittest.TestCase):
+    """
+    Checks bulk decisions match individual ones.
+    """
+
+    def test_residual(self):
+        """Only target dependent checks remain"""
+        enforcer = _enforcer(base.rules)
+
+        residual = bulk.residual(enforcer, 'is_project_manager', {'roles': ['Manager'], 'project_id': 'p1'})
+
+        self.assertIsInstance(residual, _checks.GenericCheck)
+        self.assertEqual(str(residual), 'project_id:%(project_id)s')
+        self.assertIs(bulk.residual(enforcer, 'is_project_manager', {'roles': ['member'], 'project_id': 'p1'}), False)
+        self.assertIs(bulk.residual(enforcer, 'missing', {'roles': ['manager']}), False)
+
+    def test_sweep(self):
+        """Projects are streamed with every rule decided"""
+        enforcer = _enforcer(base.rules)
+        creds = {'roles': ['manager'], 'project_id': 'p2'}
+
+        results = bulk.sweep(enforcer, ['is_manager', 'is_project_manager'], creds, iter(PROJECT_IDS))
+
+        self.assertEqual(next(results), ('p1', {'is_manager': True, 'is_project_manager': False}))
+        self.assertEqual(list(results), [
+            ('p2', {'is_manager': True, 'is_project_manager': True}),
+            ('p3', {'is_manager': True, 'is_project_manager': False}),
+        ])
+
+    def test_scope(self):
+        """Rules are denied outside their scope"""
+        enforcer = _enforcer([policy.RuleDefault(name='x', check_str='role:admin', scope_types=['project'])])
+        creds = {'roles': ['admin'], 'domain_id': 'd1'}
+
+        self.assertFalse(enforcer.enforce('x', {'project_id': 'p1'}, dict(creds)))
+        self.assertEqual(list(bulk.authorize(enforcer, 'x', creds, PROJECT_IDS)), [(project_id, False) for project_id in PROJECT_IDS])
+
+    def test_default_rule(self):
+        """Missing rules fall back to the default rule"""
+        enforcer = _enforcer([
+            policy.RuleDefault(name='default', check_str='role:admin'),
+            policy.RuleDefault(name='x', check_str='rule:missing'),
+        ])
+        creds = {'roles': ['admin']}
+
+        for rule in ('x', 'unknown'):
+            with self.subTest(rule=rule):
+                self.assertTrue(enforcer.enforce(rule, {'project_id': 'p1'}, dict(creds)))
+                self.assertEqual(list(bulk.authorize(enforcer, rule, creds, ['p1'])), [('p1', True)])
+
+    def test_audit(self):
+        """Decisions on overridden rules are audited when a namespace is given"""
+        with tempfile.TemporaryDirectory() as directory:
+            audit_log = audit.Log(os.path.join(directory, 'audit.log'))
+
+            with mock.patch.object(audit, '_log', audit_log), mock.patch.dict(registry.SERVICES, {'test': __name__}):
+                enforcer = _enforcer(base.rules)
+                creds = {'roles': ['manager'], 'project_id': 'p2'}
+
+                list(bulk.sweep(enforcer, ['is_manager', 'is_project_manager'], creds, PROJECT_IDS))
+                list(bulk.sweep(enforcer, ['is_manager', 'is_project_manager'], creds, PROJECT_IDS, namespace='test'))
+
+            audit_log.flush()
+
+            with open(audit_log.path, encoding='utf-8') as data:
+                lines = [json.loads(line) for line in data]
+
+        self.assertEqual([line[1:3] + line[5:] for line in lines], [['test', 'is_project_manager', project_id == 'p2'] for project_id in PROJECT_IDS])
+
+    def test_equivalence(self):
+        """Bulk decisions match enforcement for random rules"""
+        for seed in range(50):
+            case = fuzz.generate(seed)
+            rng = random.Random(seed)
+            enforcer = _enforcer([policy.RuleDefault(name=name, check_str=fuzz.render(node), scope_types=rng.choice(SCOPE_TYPES)) for name, node in case['rules'].items()])
+
+            mismatches = []
+
+            for creds, target in case['checks']:
+                base_target = {key: value for key, value in target.items() if key != 'project_id'}
+
+                for project_id, results in bulk.sweep(enforcer, list(case['rules']), creds, PROJECT_IDS, base_target):
+                    project_target = {**base_target, 'project_id': project_id}
+
+                    mismatches.extend((rule, creds, project_target) for rule, allowed in results.items() if allowed != bool(enforcer.enforce(rule, project_target, dict(creds))))
+
+            with self.subTest(seed=seed):
+                self.assertEqual(mismatches, [])
+
+# vi: ts=4 et:
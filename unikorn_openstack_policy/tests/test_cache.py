@@ -0,0 +1,116 @@
+# Copyright 2024 the Unikorn Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Unit tests for the rule cache.
+"""
+
+# pylint: disable=line-too-long
+
+import concurrent.futures
+import os
+import stat
+import tempfile
+import unittest
+from unittest import mock
+
+from oslo_policy import policy
+
+from unikorn_openstack_policy import base
+from unikorn_openstack_policy import cache
+
+# Our rules, oslo.policy stands in for the upstream distribution.
+MINE = [
+    policy.RuleDefault(name='create_network', check_str='rule:is_project_manager'),
+]
+
+
+def _build():
+    """Expand our rules"""
+
+    return base.inherit_rules(MINE, [policy.RuleDefault(name='create_network', check_str='role:admin')])
+
+
+class CacheTests(unittest.TestCase):
+    """
+    Checks expanded and compiled rules are cached, and the cache is safe to
+    populate concurrently.
+    """
+
+    def setUp(self):
+        """Perform setup actions for all tests"""
+        self.directory = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.environ = mock.patch.dict(os.environ, {cache.CACHE_DIR_ENV: self.directory.name})
+        self.environ.start()
+        self.builds = 0
+
+    def tearDown(self):
+        """Clean up after each test"""
+        self.environ.stop()
+        self.directory.cleanup()
+
+    def build(self):
+        """Expand our rules, counting how often we do so"""
+        self.builds += 1
+        return _build()
+
+    def test_disabled(self):
+        """Without a cache directory, rules are always built"""
+        with mock.patch.dict(os.environ, {cache.CACHE_DIR_ENV: ''}):
+            cache.list_rules('test', 'oslo.policy', MINE, self.build)
+            cache.list_rules('test', 'oslo.policy', MINE, self.build)
+
+        self.assertEqual(self.builds, 2)
+
+    def test_hit(self):
+        """Rules are built once then served from the cache"""
+        built = cache.list_rules('test', 'oslo.policy', MINE, self.build)
+        cached = cache.list_rules('test', 'oslo.policy', MINE, self.build)
+        compiled = cache.get_compiled_enforcer('test', 'oslo.policy', MINE, self.build)
+
+        self.assertEqual(self.builds, 1)
+        self.assertEqual([(rule.name, rule.check_str) for rule in built], [(rule.name, rule.check_str) for rule in cached])
+        self.assertTrue(compiled.enforce('create_network', {'project_id': 'p1'}, {'roles': ['manager'], 'project_id': 'p1'}))
+
+    def test_invalidation(self):
+        """Changing our rules is a cache miss"""
+        changed = [policy.RuleDefault(name='create_network', check_str='rule:is_manager')]
+
+        cache.list_rules('test', 'oslo.policy', MINE, self.build)
+        cache.list_rules('test', 'oslo.policy', changed, self.build)
+
+        self.assertEqual(self.builds, 2)
+
+    def test_concurrent(self):
+        """Concurrent cold cache loads all succeed and leave no temporary files"""
+        with concurrent.futures.ThreadPoolExecutor(16) as executor:
+            results = list(executor.map(lambda _: cache.list_rules('test', 'oslo.policy', MINE, _build), range(64)))
+
+        expected = [(rule.name, rule.check_str) for rule in _build()]
+
+        for rules in results:
+            self.assertEqual([(rule.name, rule.check_str) for rule in rules], expected)
+
+        self.assertEqual(os.listdir(self.directory.name), ['test.json'])
+        self.assertEqual(stat.S_IMODE(os.stat(os.path.join(self.directory.name, 'test.json')).st_mode), 0o644)
+
+    def test_store_failure(self):
+        """Failing to store is not fatal"""
+        with mock.patch('os.replace', side_effect=PermissionError):
+            rules = cache.list_rules('test', 'oslo.policy', MINE, _build)
+
+        self.assertEqual([rule.name for rule in rules], [rule.name for rule in _build()])
+        self.assertEqual(os.listdir(self.directory.name), [])
+
+# vi: ts=4 et:
@@ -0,0 +1,169 @@
+# Copyright 2024 the Unikorn Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Unit tests for rule compilation and pooling.
+"""
+
+# pylint: disable=line-too-long
+
+import unittest
+
+from oslo_config import cfg
+from oslo_context.context import RequestContext
+from oslo_policy import policy
+
+from unikorn_openstack_policy import base
+from unikorn_openstack_policy import compiler
+
+# Upstream style rules, exercising every check type we compile.
+THEIRS = [
+    policy.RuleDefault(name='admin', check_str='role:admin'),
+    policy.RuleDefault(name='create_network', check_str='rule:admin or (role:member and project_id:%(project_id)s)'),
+    policy.RuleDefault(name='update_quota', check_str='rule:admin or (not role:reader and domain_id:%(domain_id)s)'),
+    policy.RuleDefault(name='literal', check_str="'member':%(role.name)s or True:%(enabled)s or @"),
+    policy.RuleDefault(name='nested', check_str='user.name:%(name)s and !'),
+    policy.RuleDefault(name='substitutions', check_str="(tags:%(tag)s or project_id:p%(suffix)s or 'p1':%(project_id)s) and project_id:%(project_id)s"),
+    policy.RuleDefault(name='dotted', check_str='role:%(target.role.name)s'),
+]
+
+MINE = [
+    policy.RuleDefault(name='create_network', check_str='rule:is_project_manager'),
+    policy.RuleDefault(name='update_quota', check_str='rule:is_project_manager'),
+]
+
+class CompilerTests(unittest.TestCase):
+    """
+    Checks compiled enforcers agree with Oslo.
+    """
+
+    def setUp(self):
+        """Perform setup actions for all tests"""
+        cfg.CONF(args=[])
+
+        self.rules = list(base.inherit_rules(MINE, THEIRS)) + THEIRS[3:]
+
+        self.enforcer = policy.Enforcer(conf=cfg.CONF)
+        self.enforcer.register_defaults(self.rules)
+
+        self.contexts = [
+            RequestContext(roles=roles, project_id='p1', domain_id=domain_id)
+            for roles in (['admin'], ['manager'], ['member', 'reader'], ['reader'], [])
+            for domain_id in (None, 'd1')
+        ] + [
+            {'roles': ['member'], 'user': {'name': 'u1'}},
+            {'roles': ['Member'], 'project_id': '1', 'tags': ['a', 'b']},
+        ]
+
+        self.targets = [
+            {},
+            {'project_id': 'p1', 'domain_id': 'd1'},
+            {'project_id': 'p2', 'domain_id': 'd2', 'role.name': 'member', 'enabled': True, 'name': 'u1'},
+            {'project_id': 1, 'tag': 'b', 'suffix': '1', 'target.role.name': 'MEMBER'},
+        ]
+
+    def assertEquivalent(self, compiled):  # pylint: disable=invalid-name
+        """Every rule, context and target gets the same decision"""
+        for rule in self.rules:
+            for context in self.contexts:
+                for target in self.targets:
+                    with self.subTest(rule=rule.name, context=context, target=target):
+                        self.assertEqual(
+                                bool(compiled.enforce(rule.name, target, context)),
+                                bool(self.enforcer.enforce(rule.name, target, context)))
+
+    def test_from_rules(self):
+        """Compiled from rule defaults"""
+        self.assertEquivalent(compiler.CompiledEnforcer.from_rules(self.rules))
+
+    def test_from_enforcer(self):
+        """Compiled from a loaded enforcer"""
+        self.assertEquivalent(compiler.CompiledEnforcer.from_enforcer(self.enforcer))
+
+    def test_round_trip(self):
+        """IR raises back to an equivalent check string"""
+        for rule in self.rules:
+            ir = compiler.to_ir(rule.check)
+            self.assertEqual(compiler.to_ir(policy.RuleDefault(name='x', check_str=compiler.to_check_str(ir)).check), ir)
+
+    def test_missing_rule(self):
+        """Missing rules fail closed"""
+        compiled = compiler.CompiledEnforcer.from_rules(self.rules)
+        self.assertFalse(compiled.enforce('missing', {}, {'roles': ['admin']}))
+        self.assertRaises(
+                policy.PolicyNotAuthorized,
+                compiled.enforce,
+                'missing', {}, {'roles': ['admin']}, do_raise=True)
+
+    def test_default_rule(self):
+        """Missing rules fall back to the default rule, as Oslo's do"""
+        self.enforcer.register_defaults([
+            policy.RuleDefault(name='default', check_str='role:admin'),
+            policy.RuleDefault(name='dangling', check_str='rule:missing or role:member'),
+        ])
+
+        compiled = compiler.CompiledEnforcer.from_enforcer(self.enforcer)
+
+        for roles in (['admin'], ['member'], ['reader']):
+            for rule in ('missing', 'dangling'):
+                with self.subTest(roles=roles, rule=rule):
+                    self.assertEqual(
+                            bool(compiled.enforce(rule, {}, {'roles': roles})),
+                            bool(self.enforcer.enforce(rule, {}, {'roles': roles})))
+
+
+class PoolTests(unittest.TestCase):
+    """
+    Checks compiled nodes are shared between enforcers.
+    """
+
+    def setUp(self):
+        """Perform setup actions for all tests"""
+        self.pool = compiler.Pool()
+
+        self.first = compiler.CompiledEnforcer.from_rules(base.inherit_rules(MINE, THEIRS), pool=self.pool)
+        self.second = compiler.CompiledEnforcer.from_rules(base.inherit_rules(MINE, THEIRS[:2]), pool=self.pool)
+
+    def test_shared_nodes(self):
+        """Identical rules in different enforcers are stored once"""
+        self.assertIs(self.first.rules['is_project_manager'], self.second.rules['is_project_manager'])
+        self.assertIs(self.first.rules['create_network'], self.second.rules['create_network'])
+        self.assertNotIn('update_quota', self.second.rules)
+
+    def test_shared_results(self):
+        """Results are shared by enforcers within a request"""
+        context = RequestContext(roles=['manager'], project_id='p1')
+        target = compiler.Substitutions({'project_id': 'p1'})
+
+        self.assertTrue(self.first.enforce('is_project_manager', target, context))
+
+        # Poison the recorded results to prove they are reused.
+        target.results = dict.fromkeys(target.results, False)
+
+        self.assertFalse(self.second.enforce('is_project_manager', target, context))
+        self.assertTrue(self.second.enforce('is_project_manager', target, RequestContext(roles=['manager'], project_id='p1')))
+
+    def test_cycles(self):
+        """Cyclic rules are not pooled, and fail as Oslo does"""
+        rules = [
+            policy.RuleDefault(name='a', check_str='role:admin or rule:b'),
+            policy.RuleDefault(name='b', check_str='rule:a and role:member'),
+        ]
+
+        compiled = compiler.CompiledEnforcer.from_rules(rules, pool=self.pool)
+
+        self.assertTrue(compiled.enforce('a', {}, {'roles': ['admin', 'member']}))
+        self.assertRaises(RecursionError, compiled.enforce, 'a', {}, {'roles': []})
+
+# vi: ts=4 et:
@@ -16,118 +16,30 @@
 Unit tests for OpenStack policies.
 """
 
-from oslo_policy import policy
+# pylint: disable=duplicate-code
 
 from unikorn_openstack_policy import compute
-from unikorn_openstack_policy.tests import base
+from unikorn_openstack_policy.tests import engine
 
-class ProjectAdminComputePolicyTests(base.PolicyTestsBase):
-    """
-    Checks policy enforcement for project scoped admin role.
-    """
-
-    # Request context.
-    context = None
-
-    def setUp(self):
-        """Perform setup actions for all tests"""
-        self.setup(compute.get_enforcer())
-        self.context = self.project_admin_context
-
-    def test_update_quota_sets(self):
-        """Admin can update quota sets"""
-        self.assertTrue(self.enforce(
-            'os_compute_api:os-quota-sets:update', self.target, self.context))
-
-
-class DomainAdminComputePolicyTests(ProjectAdminComputePolicyTests):
-    """
-    Checks policy enforcement for domain scoped admin role
-    """
-
-    def setUp(self):
-        self.setup(compute.get_enforcer())
-        self.context = self.domain_admin_context
+# Expected decisions for every persona, in and out of their scope.
+TABLE = {
+    # Quotas can be updated by admins and project managers, in their project.
+    'os_compute_api:os-quota-sets:update': {
+        'project_admin': {'target': engine.ALLOW},
+        'domain_admin': {'target': engine.ALLOW},
+        'project_manager': {'target': engine.ALLOW, 'alt_target': engine.DENY},
+        'domain_manager': {'target': engine.DENY, 'alt_target': engine.DENY},
+        'project_member': {'target': engine.DENY},
+        'domain_member': {'target': engine.DENY},
+    },
+}
 
-
-class ProjectManagerComputePolicyTests(base.PolicyTestsBase):
+class ComputePolicyTests(engine.PolicyTableTests):
     """
-    Checks policy enforcement for project scoped manager role
+    Checks policy enforcement for every persona.
     """
 
-    # Request context.
-    context = None
-
-    def setUp(self):
-        """Perform setup actions for all tests"""
-        self.setup(compute.get_enforcer())
-        self.context = self.project_manager_context
-
-    def test_update_quota_sets(self):
-        """Project manager can update quota sets"""
-        self.assertTrue(self.enforce(
-            'os_compute_api:os-quota-sets:update', self.target, self.context))
-        self.assertRaises(
-                policy.PolicyNotAuthorized,
-                self.enforce,
-                'os_compute_api:os-quota-sets:update', self.alt_target, self.context)
-
-
-class DomainManagerComputePolicyTests(base.PolicyTestsBase):
-    """
-    Checks policy enforcement for the manager role.
-    """
-
-    def setUp(self):
-        """Perform setup actions for all tests"""
-        self.setup(compute.get_enforcer())
-        self.context = self.domain_manager_context
-
-    def test_update_quota_sets(self):
-        """Domain manager cannot update quota sets"""
-        self.assertRaises(
-                policy.PolicyNotAuthorized,
-                self.enforce,
-                'os_compute_api:os-quota-sets:update', self.target, self.context)
-        self.assertRaises(
-                policy.PolicyNotAuthorized,
-                self.enforce,
-                'os_compute_api:os-quota-sets:update', self.alt_target, self.context)
-
-
-class ProjectMemberComputePolicyTests(base.PolicyTestsBase):
-    """
-    Checks policy enforcement for the member role.
-    """
-
-    def setUp(self):
-        """Perform setup actions for all tests"""
-        self.setup(compute.get_enforcer())
-        self.context = self.project_member_context
-
-    def test_update_quota_sets(self):
-        """Project member cannot create quota sets"""
-        self.assertRaises(
-                policy.PolicyNotAuthorized,
-                self.enforce,
-                'os_compute_api:os-quota-sets:update', self.target, self.context)
-
-
-class DomainMemberComputePolicyTests(base.PolicyTestsBase):
-    """
-    Checks policy enforcement for the member role.
-    """
-
-    def setUp(self):
-        """Perform setup actions for all tests"""
-        self.setup(compute.get_enforcer())
-        self.context = self.domain_member_context
-
-    def test_update_quota_sets(self):
-        """Domain member cannot create quota sets"""
-        self.assertRaises(
-                policy.PolicyNotAuthorized,
-                self.enforce,
-                'os_compute_api:os-quota-sets:update', self.target, self.context)
+    module = compute
+    table = TABLE
 
 # vi: ts=4 et:
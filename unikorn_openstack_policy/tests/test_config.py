@@ -0,0 +1,81 @@
+# Copyright 2024 the Unikorn Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Unit tests for enforcer configuration.
+"""
+
+# pylint: disable=line-too-long
+
+import concurrent.futures
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from oslo_config import cfg
+from oslo_policy import policy
+
+from unikorn_openstack_policy import base
+from unikorn_openstack_policy import config
+
+
+def _enforce(conf):
+    """Build an enforcer for the base rules and make a decision"""
+
+    enforcer = policy.Enforcer(conf=conf)
+    enforcer.register_defaults(base.rules)
+
+    return enforcer.enforce('is_project_manager', {'project_id': 'p1'}, {'roles': ['manager'], 'project_id': 'p1'})
+
+
+class ConfigTests(unittest.TestCase):
+    """
+    Checks isolated configuration is private and minimal.
+    """
+
+    def test_isolated(self):
+        """Isolated configurations only carry the policy options"""
+        conf = config.isolated()
+
+        self.assertIsNot(conf, config.isolated())
+        self.assertIn('oslo_policy', conf)
+        self.assertEqual(conf.oslo_policy.policy_file, 'policy.yaml')
+
+    def test_concurrent(self):
+        """Enforcers can be built against isolated configurations from many threads"""
+        with concurrent.futures.ThreadPoolExecutor(8) as executor:
+            results = list(executor.map(lambda _: _enforce(config.isolated()), range(64)))
+
+        self.assertTrue(all(results))
+
+    def test_policy_file(self):
+        """Explicit policy files are loaded"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'policy.yaml')
+
+            with open(path, 'w', encoding='utf-8') as out:
+                out.write('"is_project_manager": "!"\n')
+
+            self.assertFalse(_enforce(config.isolated(policy_file=path)))
+
+    def test_get(self):
+        """The environment selects isolated configuration"""
+        with mock.patch.dict(os.environ, {config.ISOLATED_ENV: ''}):
+            self.assertIs(config.get(), cfg.CONF)
+
+        with mock.patch.dict(os.environ, {config.ISOLATED_ENV: '1'}):
+            self.assertIsNot(config.get(), cfg.CONF)
+
+# vi: ts=4 et:
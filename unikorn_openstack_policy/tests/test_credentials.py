@@ -0,0 +1,69 @@
+# Copyright 2024 the Unikorn Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Unit tests for canonical credential views.
+"""
+
+import unittest
+
+from oslo_context.context import RequestContext
+
+from unikorn_openstack_policy import credentials
+
+
+class CredentialsTests(unittest.TestCase):
+    """
+    Checks credential views are canonical and interned.
+    """
+
+    def test_context_view(self):
+        """Contexts are converted once"""
+        context = RequestContext(roles=['manager'], project_id='p1')
+
+        view = credentials.view(context)
+
+        self.assertIs(credentials.view(context), view)
+        self.assertIs(credentials.view(view), view)
+        self.assertEqual(view['project_id'], 'p1')
+
+    def test_dict_view(self):
+        """Policy values are converted every time, without mutation"""
+        creds = {'roles': ['member'], 'system_scope': 'all'}
+
+        view = credentials.view(creds)
+
+        self.assertIsNot(credentials.view(creds), view)
+        self.assertEqual(view['system'], 'all')
+        self.assertNotIn('system', creds)
+
+    def test_roles_mask(self):
+        """Roles are interned case insensitively"""
+        view = credentials.view({'roles': ['Manager', 'member']})
+
+        self.assertEqual(view.roles_mask, credentials.ROLES.mask(['manager', 'MEMBER']))
+        self.assertFalse(view.roles_mask & credentials.ROLES.bit('admin'))
+        self.assertEqual(credentials.view({}).roles_mask, 0)
+
+    def test_signature(self):
+        """Equal credentials have equal, hashable signatures"""
+        first = credentials.view(RequestContext(roles=['member'], project_id='p1'))
+        second = credentials.view(RequestContext(roles=['member'], project_id='p1'))
+        third = credentials.view(RequestContext(roles=['member'], project_id='p2'))
+
+        self.assertEqual(hash(first.signature), hash(second.signature))
+        self.assertEqual(first.signature, second.signature)
+        self.assertNotEqual(first.signature, third.signature)
+
+# vi: ts=4 et:
@@ -0,0 +1,95 @@
+# Copyright 2024 the Unikorn Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Unit tests for the policy test engine, using the base rules as a service.
+"""
+
+import sys
+import unittest
+
+from oslo_policy import policy
+
+from unikorn_openstack_policy import base
+from unikorn_openstack_policy.tests import engine
+
+# Expected decisions for the base rules.
+TABLE = {
+    'is_manager': {
+        'project_admin': {'target': engine.DENY},
+        'project_manager': {'target': engine.ALLOW, 'alt_target': engine.ALLOW},
+        'domain_manager': {'target': engine.ALLOW},
+    },
+    'is_project_manager': {
+        'project_manager': {'target': engine.ALLOW, 'alt_target': engine.DENY},
+        'domain_manager': {'target': engine.DENY},
+    },
+}
+
+
+def get_enforcer(conf):
+    """Returns an enforcer for the base rules, as a service module would"""
+
+    enforcer = policy.Enforcer(conf=conf)
+    enforcer.register_defaults(base.rules)
+
+    return enforcer
+
+
+class BasePolicyTests(engine.PolicyTableTests):
+    """
+    Checks the engine runs a table.
+    """
+
+    module = sys.modules[__name__]
+    table = TABLE
+
+
+class EngineTests(unittest.TestCase):
+    """
+    Checks cases are evaluated and sharded.
+    """
+
+    def test_shared_enforcer(self):
+        """Enforcers are built once per process"""
+        engine.run(engine.cases(__name__, TABLE))
+
+        enforcer = engine.fixtures().enforcers[__name__]
+
+        engine.run(engine.cases(__name__, TABLE))
+
+        self.assertIs(engine.fixtures().enforcers[__name__], enforcer)
+
+    def test_failures(self):
+        """Unexpected decisions and errors fail"""
+        results = engine.run([
+            engine.Case(__name__, 'is_manager', 'project_member', 'target', engine.ALLOW),
+            engine.Case(__name__, 'missing', 'project_manager', 'target', engine.DENY),
+        ])
+
+        self.assertFalse(results[0].passed)
+        self.assertIn('expected allow, got deny', results[0].describe())
+        self.assertTrue(results[1].passed)
+
+    def test_workers(self):
+        """Sharded cases give the same results, in order"""
+        cases = engine.cases(__name__, TABLE)
+
+        results = engine.run(cases, workers=2)
+
+        self.assertEqual([result.case for result in results], cases)
+        self.assertTrue(all(result.passed for result in results))
+        self.assertTrue(all(result.seconds >= 0 for result in results))
+
+# vi: ts=4 et:
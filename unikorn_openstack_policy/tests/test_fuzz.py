@@ -0,0 +1,68 @@
+# Copyright 2024 the Unikorn Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Unit tests for rule expansion fuzzing.
+"""
+
+# pylint: disable=line-too-long
+
+import unittest
+from unittest import mock
+
+from oslo_policy import policy
+
+from unikorn_openstack_policy import base
+from unikorn_openstack_policy import fuzz
+
+class FuzzTests(unittest.TestCase):
+    """
+    Checks expansion is equivalent to resolution, and failures shrink.
+    """
+
+    def test_equivalence(self):
+        """Expansion agrees with Oslo for a spread of seeds"""
+        self.assertEqual(fuzz.fuzz(range(100), workers=1), [])
+
+    def test_deterministic(self):
+        """Cases are reproducible from their seed"""
+        self.assertEqual(fuzz.generate(42), fuzz.generate(42))
+
+    def test_empty_rule(self):
+        """Empty rules expand to always true, as Oslo treats them"""
+        rules = [
+            policy.RuleDefault(name='a', check_str='rule:b and role:admin'),
+            policy.RuleDefault(name='b', check_str=''),
+        ]
+
+        self.assertEqual(base._build_check_str('rule:b and role:admin', rules), '@ and role:admin')  # pylint: disable=protected-access
+
+    def test_shrink(self):
+        """Failures from a broken expander are shrunk"""
+        expand = base._build_check_str  # pylint: disable=protected-access
+
+        def broken(check_str, rules):
+            return expand(check_str, rules).replace(' or ', ' and ')
+
+        with mock.patch.object(base, '_build_check_str', broken):
+            results = fuzz.fuzz(range(20), workers=1)
+
+        self.assertTrue(results)
+
+        for case, failures in results:
+            self.assertTrue(failures)
+            self.assertEqual(len(case['checks']), 1)
+            self.assertLessEqual(len(case['rules']), len(fuzz.generate(case['seed'])['rules']))
+
+# vi: ts=4 et:
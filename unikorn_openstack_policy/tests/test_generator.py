@@ -0,0 +1,75 @@
+# Copyright 2024 the Unikorn Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Unit tests for policy file generation.
+"""
+
+import io
+import json
+import unittest
+
+from oslo_policy import policy
+import yaml
+
+from unikorn_openstack_policy import base
+from unikorn_openstack_policy import generator
+
+THEIRS = [
+    policy.RuleDefault(name='admin', check_str='role:admin'),
+    policy.RuleDefault(name='create_network', check_str='rule:admin or "quoted":%(name)s'),
+]
+
+MINE = [
+    policy.RuleDefault(
+        name='create_network',
+        check_str='rule:is_project_manager',
+        description='Create a network\nover two lines'),
+]
+
+class GeneratorTests(unittest.TestCase):
+    """
+    Checks generated policy files.
+    """
+
+    def generate(self, output_format):
+        """Generate a policy document from the test rules"""
+        out = io.StringIO()
+        generator.write(base.inherit_rules(MINE, THEIRS), out, output_format)
+        return out.getvalue()
+
+    def expected(self):
+        """Returns the expected policy as a dictionary"""
+        return {rule.name: rule.check_str for rule in base.inherit_rules(MINE, THEIRS)}
+
+    def test_yaml(self):
+        """YAML output parses to the expected policy"""
+        self.assertEqual(yaml.safe_load(self.generate('yaml')), self.expected())
+
+    def test_json(self):
+        """JSON output parses to the expected policy"""
+        self.assertEqual(json.loads(self.generate('json')), self.expected())
+
+    def test_empty(self):
+        """Empty JSON output is still valid"""
+        out = io.StringIO()
+        generator.write([], out, 'json')
+        self.assertEqual(json.loads(out.getvalue()), {})
+
+    def test_stable(self):
+        """Output is byte for byte identical across runs"""
+        self.assertEqual(self.generate('yaml'), self.generate('yaml'))
+        self.assertEqual(self.generate('json'), self.generate('json'))
+
+# vi: ts=4 et:
@@ -0,0 +1,103 @@
+# Copyright 2024 the Unikorn Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Unit tests for decision observation.
+"""
+
+# pylint: disable=line-too-long
+
+import os
+import tempfile
+import unittest
+import uuid
+from unittest import mock
+
+from oslo_policy import _checks
+from oslo_policy import policy
+
+from unikorn_openstack_policy import audit
+from unikorn_openstack_policy import base
+from unikorn_openstack_policy import config
+from unikorn_openstack_policy import instrumentation
+from unikorn_openstack_policy import metrics
+from unikorn_openstack_policy import shadow
+
+
+class InstrumentationTests(unittest.TestCase):
+    """
+    Checks every observer sees the same decisions.
+    """
+
+    def setUp(self):
+        """Perform setup actions for all tests"""
+        self.decisions = []
+
+        self.enforcer = policy.Enforcer(conf=config.isolated())
+        self.enforcer.register_defaults(base.rules)
+
+    def test_decisions(self):
+        """Decisions on named rules are observed, denials raised as requested"""
+        enforcer = instrumentation.instrument(self.enforcer, [self.decisions.append, None])
+
+        self.assertTrue(enforcer.enforce('is_manager', {}, {'roles': ['manager']}))
+        self.assertRaises(
+                policy.PolicyNotAuthorized,
+                enforcer.enforce,
+                'is_manager', {}, {'roles': ['member']}, do_raise=True)
+        self.assertTrue(enforcer.enforce(_checks.TrueCheck(), {}, {}))
+
+        self.assertEqual([(decision.rule, decision.result) for decision in self.decisions], [('is_manager', True), ('is_manager', False)])
+
+    def test_failures(self):
+        """Anything raised is observed as a denial"""
+        with mock.patch.object(self.enforcer, 'enforce', side_effect=RuntimeError('broken')):
+            enforcer = instrumentation.instrument(self.enforcer, [self.decisions.append])
+
+            self.assertRaises(RuntimeError, enforcer.enforce, 'is_manager', {}, {'roles': ['manager']})
+
+        self.assertEqual([decision.result for decision in self.decisions], [False])
+
+    def test_disabled(self):
+        """Enforcers are unaltered without observers"""
+        enforcer = instrumentation.instrument(self.enforcer, [None, None])
+
+        self.assertNotIn('enforce', vars(enforcer))
+
+    def test_observers(self):
+        """Metrics, shadowing and auditing agree on a raised denial"""
+        namespace = uuid.uuid4().hex
+
+        with tempfile.TemporaryDirectory() as directory:
+            audit_log = audit.Log(os.path.join(directory, 'audit.log'))
+
+            with mock.patch.object(metrics, '_registry', metrics.Registry()), mock.patch.object(shadow, '_report', shadow.Report(1.0)):
+                enforcer = instrumentation.instrument(self.enforcer, [
+                    metrics.observer(self.enforcer, namespace),
+                    shadow.observer(self.enforcer, namespace),
+                    audit.observer(namespace, ['is_manager'], audit_log),
+                ])
+
+                self.assertRaises(
+                        policy.PolicyNotAuthorized,
+                        enforcer.enforce,
+                        'is_manager', {}, {'roles': ['member']}, do_raise=True)
+
+                self.assertEqual(metrics.registry().to_dict()[namespace]['is_manager']['denied'], 1)
+                self.assertEqual(shadow.report().to_dict()[namespace]['mismatched'], 0)
+                self.assertEqual(shadow.report().to_dict()[namespace]['samples'], 1)
+
+            self.assertEqual([record[5] for record in audit_log.ring.drain()[0]], [False])
+
+# vi: ts=4 et:
@@ -0,0 +1,139 @@
+# Copyright 2024 the Unikorn Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Unit tests for enforcement instrumentation.
+"""
+
+# pylint: disable=line-too-long
+
+import json
+import os
+import tempfile
+import time
+import unittest
+import uuid
+from unittest import mock
+
+from oslo_config import cfg
+from oslo_policy import policy
+
+from unikorn_openstack_policy import base
+from unikorn_openstack_policy import instrumentation
+from unikorn_openstack_policy import metrics
+
+class MetricsTests(unittest.TestCase):
+    """
+    Checks instrumented enforcers record decisions.
+    """
+
+    def setUp(self):
+        """Perform setup actions for all tests"""
+        cfg.CONF(args=[])
+
+        self.namespace = uuid.uuid4().hex
+        self.registry = metrics.Registry()
+
+        patcher = mock.patch.object(metrics, '_registry', self.registry)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        enforcer = policy.Enforcer(conf=cfg.CONF)
+        enforcer.register_defaults(base.rules)
+        self.enforcer = instrumentation.instrument(enforcer, [metrics.observer(enforcer, self.namespace)])
+
+    def test_decisions(self):
+        """Allowed and denied decisions are counted per rule"""
+        self.assertTrue(self.enforcer.enforce('is_manager', {}, {'roles': ['manager']}))
+        self.assertFalse(self.enforcer.enforce('is_manager', {}, {'roles': ['member']}))
+        self.assertRaises(
+                policy.PolicyNotAuthorized,
+                self.enforcer.enforce,
+                'is_manager', {}, {'roles': ['member']}, do_raise=True)
+
+        rule = self.registry.to_dict()[self.namespace]['is_manager']
+        self.assertEqual(rule['calls'], 3)
+        self.assertEqual(rule['allowed'], 1)
+        self.assertEqual(rule['denied'], 2)
+        self.assertEqual(rule['depth'], 1)
+        self.assertEqual(sum(rule['buckets'].values()), 3)
+
+    def test_depth(self):
+        """Depth reflects the parsed rule tree, with references resolved"""
+        self.enforcer.register_defaults([
+            policy.RuleDefault(name='nested', check_str='rule:is_project_manager or (role:admin and not rule:nested)'),
+        ])
+
+        self.enforcer.enforce('is_project_manager', {'project_id': 'a'}, {'roles': ['manager']})
+        self.enforcer.enforce('nested', {'project_id': 'a'}, {'roles': ['manager']})
+
+        rules = self.registry.to_dict()[self.namespace]
+        self.assertEqual(rules['is_project_manager']['depth'], 2)
+        self.assertEqual(rules['nested']['depth'], 4)
+
+    def test_dump(self):
+        """Metrics can be dumped as JSON and Prometheus text"""
+        self.enforcer.enforce('is_manager', {}, {'roles': ['manager']})
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'metrics.json')
+            self.registry.dump(path)
+
+            with open(path, encoding='utf-8') as data:
+                self.assertIn(self.namespace, json.load(data))
+
+            path = os.path.join(directory, 'metrics.prom')
+            self.registry.dump(path)
+
+            with open(path, encoding='utf-8') as data:
+                text = data.read()
+
+            self.assertIn(
+                f'unikorn_policy_checks_total{{namespace="{self.namespace}",rule="is_manager",result="allow"}} 1',
+                text)
+            self.assertIn(
+                f'unikorn_policy_check_seconds_count{{namespace="{self.namespace}",rule="is_manager"}} 1',
+                text)
+
+    def test_periodic(self):
+        """Periodic writes continue after a failure"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'missing', 'metrics.json')
+
+            self.registry.start(path, 0.01)
+
+            try:
+                time.sleep(0.05)
+
+                os.mkdir(os.path.dirname(path))
+
+                for _ in range(100):
+                    if os.path.exists(path):
+                        break
+
+                    time.sleep(0.01)
+            finally:
+                self.registry.stop()
+
+            self.assertTrue(os.path.exists(path))
+
+    def test_disabled(self):
+        """Enforcers are unaltered when metrics are disabled"""
+        with mock.patch.object(metrics, '_registry', None):
+            enforcer = policy.Enforcer(conf=cfg.CONF)
+            enforcer = instrumentation.instrument(enforcer, [metrics.observer(enforcer, self.namespace)])
+
+        self.assertNotIn('enforce', vars(enforcer))
+
+# vi: ts=4 et:
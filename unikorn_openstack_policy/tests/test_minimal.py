@@ -0,0 +1,79 @@
+# Copyright 2024 the Unikorn Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Unit tests for minimal policy generation.
+"""
+
+# pylint: disable=line-too-long
+
+import unittest
+
+from oslo_policy import policy
+
+from unikorn_openstack_policy import base
+from unikorn_openstack_policy import minimal
+
+THEIRS = [
+    policy.RuleDefault(name='admin_only', check_str='role:admin'),
+    policy.RuleDefault(name='admin_or_owner', check_str='rule:admin_only or project_id:%(project_id)s'),
+    policy.RuleDefault(name='create_network', check_str='rule:admin_or_owner and role:member'),
+    policy.RuleDefault(name='update_quota', check_str='rule:admin_only'),
+    policy.RuleDefault(name='get_network', check_str='rule:admin_or_owner'),
+]
+
+MINE = [
+    policy.RuleDefault(name='create_network', check_str='rule:is_project_manager'),
+    policy.RuleDefault(name='update_quota', check_str='rule:is_project_manager'),
+    policy.RuleDefault(name='not_upstream', check_str='rule:is_project_manager'),
+]
+
+class MinimalTests(unittest.TestCase):
+    """
+    Checks minimal policies are minimal and equivalent.
+    """
+
+    def test_rules(self):
+        """Only overrides and referenced helpers are emitted, unexpanded"""
+        rules = {rule.name: rule.check_str for rule in minimal.minimal_rules(MINE, THEIRS)}
+
+        self.assertEqual(rules, {
+            'is_manager': 'role:manager',
+            'is_project_manager': 'rule:is_manager and project_id:%(project_id)s',
+            'create_network': 'rule:is_project_manager or (rule:admin_or_owner and role:member)',
+            'update_quota': 'rule:is_project_manager or (rule:admin_only)',
+        })
+
+    def test_unreferenced_helpers(self):
+        """Helpers that nothing references are omitted"""
+        mine = [policy.RuleDefault(name='update_quota', check_str='rule:is_manager')]
+        rules = [rule.name for rule in minimal.minimal_rules(mine, THEIRS)]
+
+        self.assertEqual(rules, ['is_manager', 'update_quota'])
+
+    def test_verify(self):
+        """Minimal and full policies make the same decisions"""
+        full = list(base.inherit_rules(MINE, THEIRS))
+        rules = minimal.minimal_rules(MINE, THEIRS)
+
+        self.assertEqual(minimal.verify(MINE, THEIRS, full, rules), [])
+
+    def test_verify_mismatch(self):
+        """Differences are reported"""
+        full = list(base.inherit_rules(MINE, THEIRS))
+        rules = [policy.RuleDefault(name='create_network', check_str='!')]
+
+        self.assertIn(('create_network', 'project_admin', 'target'), minimal.verify(MINE, THEIRS, full, rules))
+
+# vi: ts=4 et:
@@ -16,358 +16,84 @@
 Unit tests for OpenStack policies.
 """
 
-from oslo_policy import policy
+# pylint: disable=duplicate-code
 
 from unikorn_openstack_policy import network
-from unikorn_openstack_policy.tests import base
-
-class ProjectAdminNetworkPolicyTests(base.PolicyTestsBase):
-    """
-    Checks policy enforcement for project scoped admin role.
-    """
-
-    # Request context.
-    context = None
-
-    def setUp(self):
-        """Perform setup actions for all tests"""
-        self.setup(network.get_enforcer())
-        self.context = self.project_admin_context
-
-    def test_create_network(self):
-        """Admin can create networks"""
-        self.assertTrue(self.enforce('create_network', self.target, self.context))
-        self.assertTrue(self.enforce('create_network', self.alt_target, self.context))
-
-    def test_create_network_segments(self):
-        """Admin can specifiy network segments"""
-        self.assertTrue(self.enforce('create_network:segments', self.target, self.context))
-        self.assertTrue(self.enforce('create_network:segments', self.alt_target, self.context))
-
-    def test_create_network_provider_network_type(self):
-        """Admin can specify provider network types"""
-        self.assertTrue(
-                self.enforce('create_network:provider:network_type', self.target, self.context))
-        self.assertTrue(
-                self.enforce('create_network:provider:network_type', self.alt_target, self.context))
-
-    def test_create_network_provider_physical_network(self):
-        """Admin can specify provider physical networks"""
-        self.assertTrue(
-                self.enforce('create_network:provider:physical_network', self.target, self.context))
-        self.assertTrue(
-                self.enforce(
-                    'create_network:provider:physical_network', self.alt_target, self.context))
-
-    def test_create_network_provider_segmentation_id(self):
-        """Admin can specify provider segmentation IDs"""
-        self.assertTrue(
-                self.enforce('create_network:provider:segmentation_id', self.target, self.context))
-        self.assertTrue(
-                self.enforce(
-                    'create_network:provider:segmentation_id', self.alt_target, self.context))
-
-    def test_delete_network(self):
-        """Admin can delete networks"""
-        self.assertTrue(self.enforce('delete_network', self.target, self.context))
-        self.assertTrue(self.enforce('delete_network', self.alt_target, self.context))
-
-    def test_update_quotas(self):
-        """Admin can update quotas"""
-        self.assertTrue(self.enforce('update_quota', self.target, self.context))
-        self.assertTrue(self.enforce('update_quota', self.alt_target, self.context))
-
-
-class DomainAdminNetworkPolicyTests(ProjectAdminNetworkPolicyTests):
-    """
-    Checks policy enforcement for domain scoped admin role
-    """
-
-    def setUp(self):
-        self.setup(network.get_enforcer())
-        self.context = self.domain_admin_context
-
-
-class ProjectManagerNetworkPolicyTests(base.PolicyTestsBase):
-    """
-    Checks policy enforcement for project scoped manager role
-    """
-
-    # Request context.
-    context = None
-
-    def setUp(self):
-        """Perform setup actions for all tests"""
-        self.setup(network.get_enforcer())
-        self.context = self.project_manager_context
-
-    def test_create_network(self):
-        """Project manager can create networks in its domain"""
-        self.assertTrue(self.enforce('create_network', self.target, self.context))
-        self.assertRaises(
-                policy.PolicyNotAuthorized,
-                self.enforce,
-                'create_network', self.alt_target, self.context)
-
-    def test_create_network_segments(self):
-        """Project manager can specifiy network segments"""
-        self.assertTrue(self.enforce('create_network:segments', self.target, self.context))
-        self.assertRaises(
-                policy.PolicyNotAuthorized,
-                self.enforce,
-                'create_network:segments', self.alt_target, self.context)
-
-    def test_create_network_provider_network_type(self):
-        """Project manager can specify provider network types"""
-        self.assertTrue(
-                self.enforce('create_network:provider:network_type', self.target, self.context))
-        self.assertRaises(
-                policy.PolicyNotAuthorized,
-                self.enforce,
-                'create_network:provider:network_type', self.alt_target, self.context)
-
-    def test_create_network_provider_physical_network(self):
-        """Project manager can specify provider phyical networks"""
-        self.assertTrue(
-                self.enforce('create_network:provider:physical_network', self.target, self.context))
-        self.assertRaises(
-                policy.PolicyNotAuthorized,
-                self.enforce,
-                'create_network:provider:physical_network', self.alt_target, self.context)
-
-    def test_create_network_provider_segmentation_id(self):
-        """Project manager can specify provider segmentation IDs"""
-        self.assertTrue(
-                self.enforce('create_network:provider:segmentation_id', self.target, self.context))
-        self.assertRaises(
-                policy.PolicyNotAuthorized,
-                self.enforce,
-                'create_network:provider:segmentation_id', self.alt_target, self.context)
-
-    def test_delete_network(self):
-        """Project manager can create networks"""
-        self.assertTrue(self.enforce('delete_network', self.target, self.context))
-        self.assertRaises(
-                policy.PolicyNotAuthorized,
-                self.enforce,
-                'delete_network', self.alt_target, self.context)
-
-    def test_update_quotas(self):
-        """Project manager can update quotas"""
-        self.assertTrue(self.enforce('update_quota', self.target, self.context))
-        self.assertRaises(
-            policy.PolicyNotAuthorized,
-            self.enforce,
-            'update_quota', self.alt_target, self.context)
-
-
-class DomainManagerNetworkPolicyTests(base.PolicyTestsBase):
+from unikorn_openstack_policy.tests import engine
+
+# Expected decisions for every persona, in and out of their scope.
+TABLE = {
+    # Networks can be created by admins and project members and managers, in their project.
+    'create_network': {
+        'project_admin': {'target': engine.ALLOW, 'alt_target': engine.ALLOW},
+        'domain_admin': {'target': engine.ALLOW, 'alt_target': engine.ALLOW},
+        'project_manager': {'target': engine.ALLOW, 'alt_target': engine.DENY},
+        'domain_manager': {'target': engine.DENY, 'alt_target': engine.DENY},
+        'project_member': {'target': engine.ALLOW, 'alt_target': engine.DENY},
+        'domain_member': {'target': engine.DENY},
+    },
+    # Network segments can be specified by admins and project managers.
+    'create_network:segments': {
+        'project_admin': {'target': engine.ALLOW, 'alt_target': engine.ALLOW},
+        'domain_admin': {'target': engine.ALLOW, 'alt_target': engine.ALLOW},
+        'project_manager': {'target': engine.ALLOW, 'alt_target': engine.DENY},
+        'domain_manager': {'target': engine.DENY, 'alt_target': engine.DENY},
+        'project_member': {'target': engine.DENY},
+        'domain_member': {'target': engine.DENY},
+    },
+    # Provider network types can be specified by admins and project managers.
+    'create_network:provider:network_type': {
+        'project_admin': {'target': engine.ALLOW, 'alt_target': engine.ALLOW},
+        'domain_admin': {'target': engine.ALLOW, 'alt_target': engine.ALLOW},
+        'project_manager': {'target': engine.ALLOW, 'alt_target': engine.DENY},
+        'domain_manager': {'target': engine.DENY, 'alt_target': engine.DENY},
+        'project_member': {'target': engine.DENY},
+        'domain_member': {'target': engine.DENY},
+    },
+    # Provider physical networks can be specified by admins and project managers.
+    'create_network:provider:physical_network': {
+        'project_admin': {'target': engine.ALLOW, 'alt_target': engine.ALLOW},
+        'domain_admin': {'target': engine.ALLOW, 'alt_target': engine.ALLOW},
+        'project_manager': {'target': engine.ALLOW, 'alt_target': engine.DENY},
+        'domain_manager': {'target': engine.DENY, 'alt_target': engine.DENY},
+        'project_member': {'target': engine.DENY},
+        'domain_member': {'target': engine.DENY},
+    },
+    # Provider segmentation IDs can be specified by admins and project managers.
+    'create_network:provider:segmentation_id': {
+        'project_admin': {'target': engine.ALLOW, 'alt_target': engine.ALLOW},
+        'domain_admin': {'target': engine.ALLOW, 'alt_target': engine.ALLOW},
+        'project_manager': {'target': engine.ALLOW, 'alt_target': engine.DENY},
+        'domain_manager': {'target': engine.DENY, 'alt_target': engine.DENY},
+        'project_member': {'target': engine.DENY},
+        'domain_member': {'target': engine.DENY},
+    },
+    # Networks can be deleted by admins and project members and managers, in their project.
+    'delete_network': {
+        'project_admin': {'target': engine.ALLOW, 'alt_target': engine.ALLOW},
+        'domain_admin': {'target': engine.ALLOW, 'alt_target': engine.ALLOW},
+        'project_manager': {'target': engine.ALLOW, 'alt_target': engine.DENY},
+        'domain_manager': {'target': engine.DENY, 'alt_target': engine.DENY},
+        'project_member': {'target': engine.ALLOW, 'alt_target': engine.DENY},
+        'domain_member': {'target': engine.DENY},
+    },
+    # Quotas can be updated by admins and project managers, in their project.
+    'update_quota': {
+        'project_admin': {'target': engine.ALLOW, 'alt_target': engine.ALLOW},
+        'domain_admin': {'target': engine.ALLOW, 'alt_target': engine.ALLOW},
+        'project_manager': {'target': engine.ALLOW, 'alt_target': engine.DENY},
+        'domain_manager': {'target': engine.DENY, 'alt_target': engine.DENY},
+        'project_member': {'target': engine.DENY},
+        'domain_member': {'target': engine.DENY},
+    },
+}
+
+class NetworkPolicyTests(engine.PolicyTableTests):
     """
-    Checks policy enforcement for the manager role.
+    Checks policy enforcement for every persona.
     """
 
-    def setUp(self):
-        """Perform setup actions for all tests"""
-        self.setup(network.get_enforcer())
-        self.context = self.domain_manager_context
-
-    def test_create_network(self):
-        """Domain manager cannot create networks"""
-        self.assertRaises(
-                policy.PolicyNotAuthorized,
-                self.enforce,
-                'create_network', self.target, self.context)
-        self.assertRaises(
-                policy.PolicyNotAuthorized,
-                self.enforce,
-                'create_network', self.alt_target, self.context)
-
-    def test_create_network_segments(self):
-        """Domain manager cannot specify network segments"""
-        self.assertRaises(
-                policy.PolicyNotAuthorized,
-                self.enforce,
-                'create_network:segments', self.target, self.context)
-        self.assertRaises(
-                policy.PolicyNotAuthorized,
-                self.enforce,
-                'create_network:segments', self.alt_target, self.context)
-
-    def test_create_network_provider_network_type(self):
-        """Domain manager cannot specify provider network types"""
-        self.assertRaises(
-                policy.PolicyNotAuthorized,
-                self.enforce,
-                'create_network:provider:network_type', self.target, self.context)
-        self.assertRaises(
-                policy.PolicyNotAuthorized,
-                self.enforce,
-                'create_network:provider:network_type', self.alt_target, self.context)
-
-    def test_create_network_provider_physical_network(self):
-        """Domain manager cannot specify provider phyical networks"""
-        self.assertRaises(
-                policy.PolicyNotAuthorized,
-                self.enforce,
-                'create_network:provider:physical_network', self.target, self.context)
-        self.assertRaises(
-                policy.PolicyNotAuthorized,
-                self.enforce,
-                'create_network:provider:physical_network', self.alt_target, self.context)
-
-    def test_create_network_provider_segmentation_id(self):
-        """Domain manager cannot specify provider segmentation IDs"""
-        self.assertRaises(
-                policy.PolicyNotAuthorized,
-                self.enforce,
-                'create_network:provider:segmentation_id', self.target, self.context)
-        self.assertRaises(
-                policy.PolicyNotAuthorized,
-                self.enforce,
-                'create_network:provider:segmentation_id', self.alt_target, self.context)
-
-    def test_delete_network(self):
-        """Domain manager cannot delete networks"""
-        self.assertRaises(
-                policy.PolicyNotAuthorized,
-                self.enforce,
-                'delete_network', self.target, self.context)
-        self.assertRaises(
-                policy.PolicyNotAuthorized,
-                self.enforce,
-                'delete_network', self.alt_target, self.context)
-
-    def test_update_quotas(self):
-        """Domain manager cannot update quotas"""
-        self.assertRaises(
-            policy.PolicyNotAuthorized,
-            self.enforce,
-            'update_quota', self.target, self.context)
-        self.assertRaises(
-            policy.PolicyNotAuthorized,
-            self.enforce,
-            'update_quota', self.alt_target, self.context)
-
-
-class ProjectMemberNetworkPolicyTests(base.PolicyTestsBase):
-    """
-    Checks policy enforcement for the member role.
-    """
-
-    def setUp(self):
-        """Perform setup actions for all tests"""
-        self.setup(network.get_enforcer())
-        self.context = self.project_member_context
-
-    def test_create_network(self):
-        """Project member can create networks"""
-        self.assertTrue(self.enforce('create_network', self.target, self.context))
-        self.assertRaises(
-                policy.PolicyNotAuthorized,
-                self.enforce,
-                'create_network', self.alt_target, self.context)
-
-    def test_create_network_segments(self):
-        """Project member cannot specifiy network segments"""
-        self.assertRaises(
-                policy.PolicyNotAuthorized,
-                self.enforce,
-                'create_network:segments', self.target, self.context)
-
-    def test_create_network_provider_network_type(self):
-        """Project member cannot specify provider network types"""
-        self.assertRaises(
-                policy.PolicyNotAuthorized,
-                self.enforce,
-                'create_network:provider:network_type', self.target, self.context)
-
-    def test_create_network_provider_physical_network(self):
-        """Project member cannot specify provider phyical networks"""
-        self.assertRaises(
-                policy.PolicyNotAuthorized,
-                self.enforce,
-                'create_network:provider:physical_network', self.target, self.context)
-
-    def test_create_network_provider_segmentation_id(self):
-        """Project member cannot specify provider segmentation IDs"""
-        self.assertRaises(
-                policy.PolicyNotAuthorized,
-                self.enforce,
-                'create_network:provider:segmentation_id', self.target, self.context)
-
-    def test_delete_network(self):
-        """Project member can delete networks"""
-        self.assertTrue(self.enforce('delete_network', self.target, self.context))
-        self.assertRaises(
-                policy.PolicyNotAuthorized,
-                self.enforce,
-                'delete_network', self.alt_target, self.context)
-
-    def test_update_quotas(self):
-        """Project member cannot update quotas"""
-        self.assertRaises(
-            policy.PolicyNotAuthorized,
-            self.enforce,
-            'update_quota', self.target, self.context)
-
-
-class DomainMemberNetworkPolicyTests(base.PolicyTestsBase):
-    """
-    Checks policy enforcement for the member role.
-    """
-
-    def setUp(self):
-        """Perform setup actions for all tests"""
-        self.setup(network.get_enforcer())
-        self.context = self.domain_member_context
-
-    def test_create_network(self):
-        """Domain member cannot create networks"""
-        self.assertRaises(
-                policy.PolicyNotAuthorized,
-                self.enforce,
-                'create_network', self.target, self.context)
-
-    def test_create_network_segments(self):
-        """Domain member cannot specifiy network segments"""
-        self.assertRaises(
-                policy.PolicyNotAuthorized,
-                self.enforce,
-                'create_network:segments', self.target, self.context)
-
-    def test_create_network_provider_network_type(self):
-        """Domain member cannot specify provider network types"""
-        self.assertRaises(
-                policy.PolicyNotAuthorized,
-                self.enforce,
-                'create_network:provider:network_type', self.target, self.context)
-
-    def test_create_network_provider_physical_network(self):
-        """Domain member cannot specify provider phyical networks"""
-        self.assertRaises(
-                policy.PolicyNotAuthorized,
-                self.enforce,
-                'create_network:provider:physical_network', self.target, self.context)
-
-    def test_create_network_provider_segmentation_id(self):
-        """Domain member cannot specify provider segmentation IDs"""
-        self.assertRaises(
-                policy.PolicyNotAuthorized,
-                self.enforce,
-                'create_network:provider:segmentation_id', self.target, self.context)
-
-    def test_delete_network(self):
-        """Domain member cannot delete networks"""
-        self.assertRaises(
-                policy.PolicyNotAuthorized,
-                self.enforce,
-                'delete_network', self.target, self.context)
-
-    def test_update_quotas(self):
-        """Domain member cannot update quotas"""
-        self.assertRaises(
-            policy.PolicyNotAuthorized,
-            self.enforce,
-            'update_quota', self.target, self.context)
+    module = network
+    table = TABLE
 
 # vi: ts=4 et:
@@ -0,0 +1,72 @@
+# Copyright 2024 the Unikorn Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Unit tests for rule inheritance profiling.
+"""
+
+import unittest
+
+from oslo_policy import policy
+
+from unikorn_openstack_policy import base
+from unikorn_openstack_policy import profiling
+
+class ProfilingTests(unittest.TestCase):
+    """
+    Checks spans are collected and aggregated.
+    """
+
+    def setUp(self):
+        """Perform setup actions for all tests"""
+        self.mine = [
+            policy.RuleDefault(name='create_network', check_str='rule:is_project_manager'),
+            policy.RuleDefault(name='missing', check_str='rule:is_project_manager'),
+        ]
+        self.theirs = [
+            policy.RuleDefault(name='admin', check_str='role:admin'),
+            policy.RuleDefault(name='create_network', check_str='rule:admin or role:member'),
+        ]
+
+    def tearDown(self):
+        """Ensure profiling never leaks between tests"""
+        profiling.stop()
+
+    def test_disabled(self):
+        """Nothing is collected unless started"""
+        self.assertIsNone(profiling.stop())
+        list(base.inherit_rules(self.mine, self.theirs))
+        self.assertIsNone(profiling.stop())
+
+    def test_aggregation(self):
+        """Spans are aggregated per namespace and inherited rule"""
+        profile = profiling.start()
+
+        with profiling.span(profiling.NAMESPACE_PREFIX + 'test'):
+            list(base.inherit_rules(self.mine, self.theirs))
+
+        profiling.stop()
+
+        self.assertEqual(list(profile.namespaces()), ['test'])
+        self.assertEqual(sorted(profile.rules()), [('test', 'create_network'), ('test', 'missing')])
+
+        functions = profile.functions()
+        self.assertEqual(functions['_find_rule'][0], 3)
+        self.assertEqual(functions['_build_check_str'][0], 1)
+
+        stacks = [line.rsplit(' ', 1)[0] for line in profile.collapsed().splitlines()]
+        self.assertIn(
+                'namespace:test;rule:create_network;_build_check_str', stacks)
+
+# vi: ts=4 et:
@@ -0,0 +1,117 @@
+# Copyright 2024 the Unikorn Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Unit tests for dead branch elimination.
+"""
+
+# pylint: disable=line-too-long
+
+import os
+import unittest
+from unittest import mock
+
+from oslo_config import cfg
+from oslo_policy import policy
+
+from unikorn_openstack_policy import base
+from unikorn_openstack_policy import compiler
+from unikorn_openstack_policy import personas
+from unikorn_openstack_policy import prune
+
+THEIRS = [
+    policy.RuleDefault(name='admin', check_str='role:admin and role:admin'),
+    policy.RuleDefault(name='system_admin', check_str='role:admin and system_scope:all'),
+    policy.RuleDefault(name='create_network', check_str='rule:system_admin or rule:admin or (role:member and project_id:%(project_id)s)'),
+    policy.RuleDefault(name='update_quota', check_str='rule:admin or (rule:admin and project_id:%(project_id)s)'),
+]
+
+MINE = [
+    policy.RuleDefault(name='create_network', check_str='rule:is_project_manager'),
+    policy.RuleDefault(name='update_quota', check_str='rule:is_project_manager'),
+]
+
+class PruneTests(unittest.TestCase):
+    """
+    Checks branches are pruned correctly.
+    """
+
+    def simplify(self, check_str, profile='none'):
+        """Simplify a check string"""
+        ir, _ = prune.prune_ir(compiler.to_ir(policy.RuleDefault(name='x', check_str=check_str).check), profile)
+        return compiler.to_check_str(ir)
+
+    def test_duplicates(self):
+        """Duplicate terms are removed"""
+        self.assertEqual(self.simplify('role:admin and role:admin'), 'role:admin')
+        self.assertEqual(self.simplify('role:a or (role:b or role:a)'), '(role:a or role:b)')
+
+    def test_constants(self):
+        """Constants are folded"""
+        self.assertEqual(self.simplify('role:a or @'), '@')
+        self.assertEqual(self.simplify('role:a and !'), '!')
+        self.assertEqual(self.simplify('role:a and not !'), 'role:a')
+
+    def test_contradiction(self):
+        """Terms and their negations decide the result"""
+        self.assertEqual(self.simplify('role:a and not role:a'), '!')
+        self.assertEqual(self.simplify('role:a or not role:a'), '@')
+
+    def test_absorption(self):
+        """Terms absorb duals that contain them"""
+        self.assertEqual(self.simplify('role:a or (role:a and role:b)'), 'role:a')
+        self.assertEqual(self.simplify('role:a and (role:a or role:b)'), 'role:a')
+
+    def test_profile(self):
+        """Profiles remove checks that can never be true"""
+        self.assertEqual(self.simplify('role:a or system_scope:all'), '(role:a or system_scope:all)')
+        self.assertEqual(self.simplify('role:a or system_scope:all', 'no-system-scope'), 'role:a')
+
+    def test_unknown_profile(self):
+        """Unknown profiles are rejected, listing the valid ones"""
+        with self.assertRaisesRegex(ValueError, 'no-system-scope'):
+            prune.prune_rules([], 'no-system')
+
+        with mock.patch.dict(os.environ, {prune.PROFILE_ENV: 'no-system'}):
+            self.assertRaises(ValueError, prune.prune_rules, [])
+
+    def test_opaque(self):
+        """Opaque checks are never deduplicated"""
+        self.assertEqual(self.simplify('http://a or http://a'), '(http://a or http://a)')
+
+    def test_rules(self):
+        """Pruned rules are reported and equivalent for the profile"""
+        cfg.CONF(args=[])
+
+        rules = list(base.inherit_rules(MINE, THEIRS))
+
+        report = {}
+        pruned = list(prune.prune_rules(rules, 'no-system-scope', report))
+
+        self.assertEqual(sorted(report), ['create_network', 'update_quota'])
+        self.assertIn('never true for profile: system_scope:all', report['create_network'])
+
+        enforcer = policy.Enforcer(conf=cfg.CONF)
+        enforcer.register_defaults(rules)
+
+        pruned_enforcer = policy.Enforcer(conf=cfg.CONF)
+        pruned_enforcer.register_defaults(pruned)
+
+        for _, context, _, target in personas.matrix():
+            for rule in MINE:
+                self.assertEqual(
+                        pruned_enforcer.enforce(rule.name, target, context),
+                        enforcer.enforce(rule.name, target, context))
+
+# vi: ts=4 et:
@@ -0,0 +1,126 @@
+# Copyright 2024 the Unikorn Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Unit tests for the service registry, this module acts as both a service and
+its upstream rule source.
+"""
+
+# pylint: disable=line-too-long
+
+import os
+import subprocess
+import sys
+import unittest
+import uuid
+from unittest import mock
+
+from oslo_config import cfg
+from oslo_policy import policy
+
+from unikorn_openstack_policy import registry
+from unikorn_openstack_policy import warmup
+
+# Where the package's entry points are declared, when run from the source tree.
+PYPROJECT = os.path.join(os.path.dirname(__file__), '..', '..', 'pyproject.toml')
+
+# Our rules.
+MINE = [
+    policy.RuleDefault(name='create_network', check_str='rule:is_project_manager'),
+]
+
+# Upstream rules.
+THEIRS = [
+    policy.RuleDefault(name='admin', check_str='role:admin'),
+    policy.RuleDefault(name='create_network', check_str='rule:admin'),
+]
+
+NAMESPACE = uuid.uuid4().hex
+
+SERVICE = registry.Service(NAMESPACE, 'oslo.policy', __name__, MINE)
+
+
+def list_rules():
+    """Returns the upstream rules"""
+
+    return THEIRS
+
+
+class RegistryTests(unittest.TestCase):
+    """
+    Checks services are defined and loaded lazily.
+    """
+
+    def test_enumeration(self):
+        """Enumerating namespaces imports no service"""
+        script = (
+            'import sys\n'
+            'from unikorn_openstack_policy import registry\n'
+            'names = registry.namespaces()\n'
+            'print(sorted(set(registry.SERVICES.values()) & set(sys.modules)))\n'
+        )
+
+        output = subprocess.run([sys.executable, '-c', script], capture_output=True, check=True, text=True).stdout
+
+        self.assertEqual(output.strip(), '[]')
+
+    def test_load(self):
+        """Registered services are imported when loaded"""
+        with mock.patch.dict(registry.SERVICES, {NAMESPACE: __name__}):
+            self.assertIn(NAMESPACE, registry.namespaces())
+            self.assertIs(registry.load(NAMESPACE).SERVICE, SERVICE)
+
+        self.assertNotIn(NAMESPACE, registry.namespaces())
+
+    def test_entry_points(self):
+        """Registered services match the packaged entry points"""
+        try:
+            import tomllib  # pylint: disable=import-outside-toplevel
+        except ImportError:
+            self.skipTest('tomllib requires Python 3.11')
+
+        if not os.path.exists(PYPROJECT):
+            self.skipTest('not run from the source tree')
+
+        with open(PYPROJECT, 'rb') as data:
+            entry_points = tomllib.load(data)['project']['entry-points']
+
+        for group, function in (('oslo.policy.policies', 'list_rules'), ('oslo.policy.enforcer', 'get_enforcer')):
+            with self.subTest(group=group):
+                self.assertEqual(entry_points[group], {namespace: f'{module}:{function}' for namespace, module in registry.SERVICES.items()})
+
+    def test_warm_up(self):
+        """Warm-up times each phase separately"""
+        cfg.CONF(args=[])
+
+        with mock.patch.dict(registry.SERVICES, {NAMESPACE: __name__}):
+            timings = warmup.warm_up([NAMESPACE])
+
+        self.assertEqual(list(timings[NAMESPACE]), ['import', 'upstream', 'build', 'load'])
+        self.assertTrue(warmup.get_enforcer(NAMESPACE).enforce('create_network', {}, {'roles': ['admin']}))
+
+    def test_service(self):
+        """Services expand their rules against the upstream source"""
+        cfg.CONF(args=[])
+
+        rules = {rule.name: rule.check_str for rule in SERVICE.list_rules()}
+
+        self.assertEqual(rules['create_network'], 'rule:is_project_manager or (role:admin)')
+
+        enforcer = SERVICE.get_enforcer()
+
+        self.assertTrue(enforcer.enforce('create_network', {'project_id': 'p1'}, {'roles': ['manager'], 'project_id': 'p1'}))
+        self.assertFalse(enforcer.enforce('create_network', {'project_id': 'p1'}, {'roles': ['member'], 'project_id': 'p1'}))
+
+# vi: ts=4 et:
@@ -0,0 +1,114 @@
+# Copyright 2024 the Unikorn Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Unit tests for profile guided branch reordering.
+"""
+
+# pylint: disable=line-too-long
+
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+import uuid
+
+from oslo_config import cfg
+from oslo_policy import policy
+
+from unikorn_openstack_policy import base
+from unikorn_openstack_policy import compiler
+from unikorn_openstack_policy import instrumentation
+from unikorn_openstack_policy import metrics
+from unikorn_openstack_policy import personas
+from unikorn_openstack_policy import reorder
+
+THEIRS = [
+    policy.RuleDefault(name='admin', check_str='role:admin'),
+    policy.RuleDefault(name='create_network', check_str='rule:admin or (role:member and project_id:%(project_id)s)'),
+]
+
+MINE = [
+    policy.RuleDefault(name='create_network', check_str='rule:is_project_manager'),
+]
+
+class ReorderTests(unittest.TestCase):
+    """
+    Checks branch statistics and reordering.
+    """
+
+    def setUp(self):
+        """Perform setup actions for all tests"""
+        cfg.CONF(args=[])
+
+        self.namespace = uuid.uuid4().hex
+        self.rules = list(base.inherit_rules(MINE, THEIRS))
+
+    def test_canonical(self):
+        """Canonical forms ignore ordering and nesting"""
+        first = compiler.to_ir(policy.RuleDefault(name='x', check_str='role:a or (role:b or role:c)').check)
+        second = compiler.to_ir(policy.RuleDefault(name='x', check_str='role:c or role:b or role:a').check)
+        self.assertEqual(reorder.canonical(first), reorder.canonical(second))
+
+    def test_reorder_ir(self):
+        """Most decisive branches are moved first, ties retain order"""
+        ir = compiler.to_ir(policy.RuleDefault(name='x', check_str='role:a or (role:b or role:c) or role:d').check)
+        reordered = reorder.reorder_ir(ir, {'or role:c': 5, 'or role:b': 2})
+        self.assertEqual(compiler.to_check_str(reordered), '(role:c or role:b or role:a or role:d)')
+
+    def test_opaque(self):
+        """Anything we don't understand is left alone"""
+        ir = [compiler.OR, [compiler.ROLE, 'a'], [compiler.OPAQUE, 'http://example.com']]
+        self.assertEqual(reorder.reorder_ir(ir, {'or http://example.com': 1}), ir)
+
+    def test_round_trip(self):
+        """Statistics from live enforcement reorder rules equivalently"""
+        registry = metrics.Registry(branches=True)
+
+        with mock.patch.object(metrics, '_registry', registry):
+            enforcer = policy.Enforcer(conf=cfg.CONF)
+            enforcer.register_defaults(self.rules)
+            enforcer = instrumentation.instrument(enforcer, [metrics.observer(enforcer, self.namespace)])
+
+            matrix = list(personas.matrix())
+
+            for _, context, _, target in matrix:
+                enforcer.enforce('create_network', target, context)
+
+        ordering = reorder.ordering_from_metrics(registry.to_dict())
+        self.assertIn('create_network', ordering[self.namespace])
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'ordering.json')
+
+            with open(path, 'w', encoding='utf-8') as out:
+                json.dump(ordering, out)
+
+            with mock.patch.dict(os.environ, {reorder.ORDERING_ENV: path}):
+                reordered = list(reorder.reorder_rules(self.namespace, self.rules))
+
+        # Admins and members are more common than managers in the matrix.
+        create_network = reordered[-1]
+        self.assertFalse(create_network.check_str.startswith('(rule:is_project_manager'))
+
+        reordered_enforcer = policy.Enforcer(conf=cfg.CONF)
+        reordered_enforcer.register_defaults(reordered)
+
+        for _, context, _, target in matrix:
+            self.assertEqual(
+                    reordered_enforcer.enforce('create_network', target, context),
+                    enforcer.enforce('create_network', target, context))
+
+# vi: ts=4 et:
@@ -0,0 +1,108 @@
+# Copyright 2024 the Unikorn Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Unit tests for shadow evaluation.
+"""
+
+# pylint: disable=line-too-long
+
+import unittest
+import uuid
+from unittest import mock
+
+from oslo_config import cfg
+from oslo_policy import policy
+
+from unikorn_openstack_policy import base
+from unikorn_openstack_policy import compiler
+from unikorn_openstack_policy import credentials
+from unikorn_openstack_policy import instrumentation
+from unikorn_openstack_policy import shadow
+
+class ShadowTests(unittest.TestCase):
+    """
+    Checks shadowed enforcers record disagreements.
+    """
+
+    def setUp(self):
+        """Perform setup actions for all tests"""
+        cfg.CONF(args=[])
+
+        self.namespace = uuid.uuid4().hex
+        self.report = shadow.Report(1.0)
+
+        patcher = mock.patch.object(shadow, '_report', self.report)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def enforcer(self, candidate=compiler.CompiledEnforcer.from_enforcer):
+        """Returns a shadowed enforcer for the base rules"""
+        enforcer = policy.Enforcer(conf=cfg.CONF)
+        enforcer.register_defaults(base.rules)
+
+        return instrumentation.instrument(enforcer, [shadow.observer(enforcer, self.namespace, candidate)])
+
+    def test_agreement(self):
+        """Agreeing decisions are sampled without mismatches"""
+        enforcer = self.enforcer()
+
+        self.assertTrue(enforcer.enforce('is_project_manager', {'project_id': 'p1'}, {'roles': ['manager'], 'project_id': 'p1'}))
+        self.assertRaises(
+                policy.PolicyNotAuthorized,
+                enforcer.enforce,
+                'is_manager', {}, {'roles': ['member']}, do_raise=True)
+
+        report = self.report.to_dict()[self.namespace]
+        self.assertEqual(report['samples'], 2)
+        self.assertEqual(report['mismatched'], 0)
+
+    def test_mismatch(self):
+        """Disagreements are recorded with a credential signature"""
+        wrong = compiler.CompiledEnforcer.from_rules([policy.RuleDefault(name='is_manager', check_str='!')])
+        enforcer = self.enforcer(lambda _: wrong)
+
+        self.assertTrue(enforcer.enforce('is_manager', {}, {'roles': ['manager']}))
+
+        report = self.report.to_dict()[self.namespace]
+        self.assertEqual(report['mismatched'], 1)
+        self.assertEqual(report['mismatches'], [{
+            'rule': 'is_manager',
+            'signature': credentials.signature({'roles': ['manager']}),
+            'stock': True,
+            'candidate': False,
+        }])
+
+    def test_candidate_errors(self):
+        """Candidate failures are recorded, never raised"""
+        def broken(_):
+            raise RuntimeError('broken')
+
+        enforcer = self.enforcer(broken)
+
+        self.assertTrue(enforcer.enforce('is_manager', {}, {'roles': ['manager']}))
+        self.assertEqual(self.report.to_dict()[self.namespace]['mismatches'][0]['candidate'], 'RuntimeError: broken')
+
+    def test_unsampled(self):
+        """Unsampled decisions don't evaluate the candidate"""
+        candidate = mock.Mock()
+        enforcer = self.enforcer(candidate)
+
+        with mock.patch('random.random', return_value=1.0):
+            self.assertTrue(enforcer.enforce('is_manager', {}, {'roles': ['manager']}))
+
+        candidate.assert_not_called()
+        self.assertNotIn(self.namespace, self.report.to_dict())
+
+# vi: ts=4 et:
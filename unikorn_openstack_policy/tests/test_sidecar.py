@@ -0,0 +1,170 @@
+# Copyright 2024 the Unikorn Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Unit tests for the decision sidecar.
+"""
+
+# pylint: disable=line-too-long
+
+import os
+import socket
+import stat
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from oslo_config import cfg
+from oslo_policy import policy
+
+from unikorn_openstack_policy import base
+from unikorn_openstack_policy import compiler
+from unikorn_openstack_policy import sidecar
+
+THEIRS = [
+    policy.RuleDefault(name='create_network', check_str='role:admin'),
+]
+
+MINE = [
+    policy.RuleDefault(name='create_network', check_str='rule:is_project_manager'),
+]
+
+MANAGER = {'roles': ['manager'], 'project_id': 'p1'}
+
+
+class SidecarTests(unittest.TestCase):
+    """
+    Checks decisions are served over a Unix socket.
+    """
+
+    def setUp(self):
+        """Perform setup actions for all tests"""
+        cfg.CONF(args=[])
+
+        rules = list(base.inherit_rules(MINE, THEIRS))
+
+        enforcer = policy.Enforcer(conf=cfg.CONF)
+        enforcer.register_defaults(rules)
+        enforcer.load_rules()
+
+        self.directory = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.path = os.path.join(self.directory.name, 'policy.sock')
+
+        self.server = sidecar.Server(self.path, {
+            'compiled': compiler.CompiledEnforcer.from_rules(rules),
+            'oslo': enforcer,
+        })
+
+        self.thread = threading.Thread(target=self.server.serve_forever, kwargs={'poll_interval': 0.01})
+        self.thread.start()
+
+    def tearDown(self):
+        """Clean up after each test"""
+        self.server.shutdown()
+        self.thread.join()
+        self.server.server_close()
+        self.directory.cleanup()
+
+    def test_decide(self):
+        """Batches are decided by every enforcer type"""
+        decisions = [
+            {'namespace': 'compiled', 'rule': 'create_network'},
+            {'namespace': 'oslo', 'rule': 'create_network'},
+            {'namespace': 'compiled', 'rule': 'create_network', 'target': {'project_id': 'p2'}},
+            {'namespace': 'oslo', 'rule': 'create_network', 'target': {'project_id': 'p2'}},
+        ]
+
+        with sidecar.Client(self.path) as client:
+            response = client.decide(MANAGER, decisions, {'project_id': 'p1'})
+
+        self.assertEqual(response, {'id': 1, 'results': [True, True, False, False]})
+
+    def test_errors(self):
+        """Decisions that cannot be made are denied with a reason"""
+        with sidecar.Client(self.path) as client:
+            response = client.decide(MANAGER, [{'namespace': 'missing', 'rule': 'create_network'}, {'namespace': 'compiled'}])
+
+            self.assertEqual(response['results'], [False, False])
+            self.assertEqual(sorted(response['errors']), ['0', '1'])
+
+            client.send({'op': 'unknown'})
+            self.assertIn('error', client.receive())
+
+    def test_malformed(self):
+        """Malformed requests are answered with an error, and later ones still served"""
+        requests = [
+            {'credentials': [1, 2]},
+            {'credentials': 'x'},
+            {'target': 5},
+            {'decisions': 5},
+            {'decisions': [1]},
+        ]
+
+        with sidecar.Client(self.path) as client:
+            ids = [client.send(request, flush=False) for request in requests]
+            ids.append(client.send({'credentials': MANAGER, 'target': {'project_id': 'p1'}, 'decisions': [{'namespace': 'compiled', 'rule': 'create_network'}]}))
+
+            responses = [client.receive() for _ in ids]
+
+        self.assertEqual([response['id'] for response in responses], ids)
+        self.assertTrue(all('error' in response for response in responses[:-1]))
+        self.assertEqual(responses[-1]['results'], [True])
+
+    def test_failures(self):
+        """Unexpected failures are answered with an error"""
+        with mock.patch.object(self.server, 'decide', side_effect=RuntimeError('broken')):
+            with sidecar.Client(self.path) as client:
+                self.assertEqual(client.decide(MANAGER, []), {'id': 1, 'error': 'RuntimeError: broken'})
+
+    def test_pipelining(self):
+        """Pipelined requests are answered in order"""
+        with sidecar.Client(self.path) as client:
+            ids = [client.send({'credentials': MANAGER, 'target': {'project_id': f'p{index}'}, 'decisions': [{'namespace': 'compiled', 'rule': 'create_network'}]}) for index in range(10)]
+            responses = [client.receive() for _ in ids]
+
+        self.assertEqual([response['id'] for response in responses], ids)
+        self.assertEqual([response['results'] for response in responses], [[index == 1] for index in range(10)])
+
+    def test_rules(self):
+        """Rule names are listed by namespace"""
+        with sidecar.Client(self.path) as client:
+            rules = client.rules()
+
+        self.assertEqual(rules['compiled'], ['create_network', 'is_manager', 'is_project_manager'])
+
+    def test_load_test(self):
+        """The load test reports every request"""
+        batches = [{'credentials': MANAGER, 'target': {'project_id': 'p1'}, 'decisions': [{'namespace': 'compiled', 'rule': 'create_network'}] * 2}]
+
+        report = sidecar.load_test(self.path, batches, connections=2, requests=20, pipeline=4)
+
+        self.assertEqual(report['requests'], 40)
+        self.assertEqual(report['decisions'], 80)
+
+    def test_socket(self):
+        """Sockets are private, live ones are refused and stale ones replaced"""
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o600)
+
+        self.assertRaises(OSError, sidecar.Server, self.path, {})
+
+        stale = os.path.join(self.directory.name, 'stale.sock')
+
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as listener:
+            listener.bind(stale)
+
+        with sidecar.Server(stale, {}, 0o660):
+            self.assertEqual(stat.S_IMODE(os.stat(stale).st_mode), 0o660)
+
+# vi: ts=4 et:
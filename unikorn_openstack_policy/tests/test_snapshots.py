@@ -0,0 +1,117 @@
+# Copyright 2024 the Unikorn Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Unit tests for upstream rule snapshots, this module acts as a service with
+oslo.policy standing in for the upstream distribution.
+"""
+
+# pylint: disable=line-too-long
+
+import os
+import sys
+import tempfile
+import unittest
+
+from oslo_policy import policy
+
+from unikorn_openstack_policy import base
+from unikorn_openstack_policy import snapshots
+
+# The distribution the upstream rules are inherited from.
+UPSTREAM = 'oslo.policy'
+
+rules = [
+    policy.RuleDefault(name='create_network', check_str='rule:is_project_manager', description='Create a network'),
+]
+
+# Upstream rules, as installed.
+THEIRS = [
+    policy.RuleDefault(name='admin', check_str='role:admin', description='Admin'),
+    policy.RuleDefault(name='create_network', check_str='rule:admin', description='Create a network', scope_types=['project']),
+]
+
+
+def list_upstream_rules():
+    """Returns the upstream rules we inherit from"""
+
+    return THEIRS
+
+
+def expand_rules(theirs):
+    """Expand our rules against the upstream ones"""
+
+    return base.inherit_rules(rules, theirs)
+
+
+class SnapshotTests(unittest.TestCase):
+    """
+    Checks rules are expanded against stored releases.
+    """
+
+    def setUp(self):
+        """Perform setup actions for all tests"""
+        self.directory = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.store = os.path.join(self.directory.name, 'store')
+
+    def tearDown(self):
+        """Clean up after each test"""
+        self.directory.cleanup()
+
+    def test_round_trip(self):
+        """Captured rules load unaltered"""
+        snapshots.capture(self.store, '2024.1', sys.modules[__name__])
+
+        loaded = snapshots.load(self.store, '2024.1', UPSTREAM)
+
+        self.assertEqual([str(rule) for rule in loaded], [str(rule) for rule in THEIRS])
+        self.assertEqual(loaded[1].scope_types, ['project'])
+        self.assertEqual(snapshots.releases(self.store), ['2024.1'])
+
+    def test_reproducible(self):
+        """Capturing the same rules gives the same file"""
+        path = snapshots.capture(self.store, '2024.1', sys.modules[__name__])
+
+        with open(path, 'rb') as data:
+            first = data.read()
+
+        snapshots.capture(self.store, '2024.1', sys.modules[__name__])
+
+        with open(path, 'rb') as data:
+            self.assertEqual(data.read(), first)
+
+    def test_expand(self):
+        """Rules are expanded against a stored release"""
+        snapshots.capture(self.store, '2024.1', sys.modules[__name__])
+
+        expanded = {rule.name: rule.check_str for rule in snapshots.expand(self.store, '2024.1', sys.modules[__name__])}
+
+        self.assertEqual(expanded['create_network'], 'rule:is_project_manager or (role:admin)')
+
+    def test_build(self):
+        """Every release is built, skipping missing snapshots"""
+        snapshots.capture(self.store, '2024.1', sys.modules[__name__])
+        snapshots.capture(self.store, '2024.2', sys.modules[__name__])
+        os.makedirs(os.path.join(self.store, '2023.2'))
+
+        output_dir = os.path.join(self.directory.name, 'output')
+
+        paths = snapshots.build(self.store, output_dir, {'test': __name__}, workers=2)
+
+        self.assertEqual(paths, [os.path.join(output_dir, release, 'test.yaml') for release in ('2024.1', '2024.2')])
+
+        with open(paths[0], encoding='utf-8') as data:
+            self.assertIn('"create_network": "rule:is_project_manager or (role:admin)"', data.read())
+
+# vi: ts=4 et: